@@ -4,6 +4,8 @@ import os
 import sys
 import json
 import time
+import queue
+import threading
 from dotenv import load_dotenv
 
 # Load environment variables
@@ -18,6 +20,20 @@ CORS(app)  # Enable CORS for app integration
 # Simple configuration
 app.config['SECRET_KEY'] = os.getenv('SECRET_KEY', 'your-secret-key-here')
 
+# Import and validate every command once at boot, so a broken command stops startup
+# instead of failing mid-request
+from command_registry import load_command_registry
+load_command_registry()
+
+@app.before_request
+def ensure_background_services():
+    """Start per-process background services on the first request a worker handles"""
+    try:
+        from market_refresher import start_market_refresher
+        start_market_refresher()
+    except Exception as e:
+        print(f"Error starting market refresher: {e}")
+
 # ============================================================================
 # ESSENTIAL API ENDPOINTS FOR APP INTEGRATION
 # ============================================================================
@@ -76,6 +92,7 @@ def root():
         "railway": "ready",
         "available_endpoints": [
             "/api/health",
+            "/api/metrics",
             "/api/chat", 
             "/api/chat/stream",
             "/api/asset/<symbol>",
@@ -88,7 +105,7 @@ def root():
             "/api/macros",
             "/api/search/web"
         ],
-        "total_endpoints": 12
+        "total_endpoints": 13
     })
 
 @app.route("/api/railway/status")
@@ -108,6 +125,36 @@ def railway_status():
         "deployment": "successful"
     })
 
+@app.route("/api/metrics")
+def metrics():
+    """Runtime metrics for this worker process"""
+    try:
+        from memory.db_pool import get_pool_stats
+        from market_refresher import get_refresher_status
+        from utils.http_client import get_http_stats
+        from utils.quote_client import get_quote_cache_stats
+        from llm_model import get_llm_cache_stats
+        from memory.summary_queue import get_summary_queue_stats
+        from memory.long_term_db import get_user_facts_cache_stats
+
+        return jsonify({
+            "success": True,
+            "pid": os.getpid(),
+            "db_pool": get_pool_stats(),
+            "market_refresher": get_refresher_status(),
+            "http": get_http_stats(),
+            "quote_cache": get_quote_cache_stats(),
+            "llm_cache": get_llm_cache_stats(),
+            "user_facts_cache": get_user_facts_cache_stats(),
+            "summary_queue": get_summary_queue_stats()
+        })
+
+    except Exception as e:
+        return jsonify({
+            "error": f"Failed to collect metrics: {str(e)}",
+            "success": False
+        }), 500
+
 @app.route("/api/chat", methods=["POST"])
 def chat():
     """Main chat endpoint - handles natural language requests"""
@@ -157,7 +204,12 @@ def chat():
 
 @app.route("/api/chat/stream", methods=["POST"])
 def chat_stream():
-    """True streaming chat endpoint that sends data as it's generated"""
+    """
+    True streaming chat endpoint that sends data as it's generated
+    Chunks are forwarded as the model writes them, so their count isn't known up front:
+    chunk events carry "total_chunks": null and the event closing each phase carries
+    the final count (see "Streaming events" in README.md).
+    """
     try:
         data = request.get_json()
         if not data:
@@ -182,48 +234,67 @@ def chat_stream():
             
             # Import brain here to avoid circular imports
             try:
-                from brain import generate_ai_response_only, execute_command_streaming
-                
-                # STEP 1: Get AI response immediately (without executing commands)
-                ai_response_data = generate_ai_response_only(user_id, message)
+                from brain import stream_ai_response, start_command
                 
-                # Handle the response data
-                if isinstance(ai_response_data, tuple):
-                    # Command detected
-                    ai_response, command_name, args, goal = ai_response_data
-                else:
-                    # No command, just conversation
-                    ai_response = ai_response_data
-                    command_name, args, goal = None, None, None
+                # STEP 1: Stream the AI response as the model writes it. A command starts
+                # as soon as its #COMMAND line has streamed, while the rest of the reply arrives.
+                reply_recorded = threading.Event()
+                output_chunks = queue.Queue()  # command result text, streamed from the command's thread
+                command_future = None
+                command_name, goal = None, None
+                chunk_number = 0
                 
-                # STEP 2: Stream the AI response immediately
-                if ai_response:
-                    sentences = ai_response.split('. ')
-                    for i, sentence in enumerate(sentences):
-                        if sentence.strip():
-                            yield json.dumps({
-                                "type": "initial_response",
-                                "chunk": sentence.strip() + ('.' if i < len(sentences) - 1 else ''),
-                                "chunk_number": i + 1,
-                                "total_chunks": len(sentences),
-                                "timestamp": time.time()
-                            }) + "\n"
-                            time.sleep(0.1)  # Small delay for streaming effect
+                for event in stream_ai_response(user_id, message, reply_recorded):
+                    if event[0] == "delta":
+                        chunk_number += 1
+                        yield json.dumps({
+                            "type": "initial_response",
+                            "chunk": event[1],
+                            "chunk_number": chunk_number,
+                            "total_chunks": None,
+                            "timestamp": time.time()
+                        }) + "\n"
+                    elif event[0] == "command" and command_future is None:
+                        _, command_name, args = event
+                        command_future = start_command(command_name, args, user_id, message,
+                                                       reply_recorded, output_chunks.put)
+                    elif event[0] == "done":
+                        goal = event[4]
                 
-                # STEP 3: If there's a command, execute it and stream progress
-                if command_name:
+                # STEP 2: If there's a command, report it and wait for its result
+                if command_future is not None:
                     # Send command start
                     yield json.dumps({
                         "type": "command_start",
                         "message": f"Executing {command_name}...",
                         "command_name": command_name,
+                        "initial_response_chunks": chunk_number,
                         "timestamp": time.time()
                     }) + "\n"
                     
-                    # Execute the command (this is where the real work happens)
-                    command_result = execute_command_streaming(command_name, args, user_id, message)
+                    # STEP 3: Stream the result summary as it is written. The command has
+                    # been running since its directive streamed.
+                    result_chunk_number = 0
+                    while True:
+                        try:
+                            chunk = output_chunks.get(timeout=0.1)
+                        except queue.Empty:
+                            if command_future.done() and output_chunks.empty():
+                                break
+                            continue
+                        result_chunk_number += 1
+                        yield json.dumps({
+                            "type": "command_result_chunk",
+                            "chunk": chunk,
+                            "chunk_number": result_chunk_number,
+                            "total_chunks": None,
+                            "command_name": command_name,
+                            "timestamp": time.time()
+                        }) + "\n"
+                    
+                    command_result = command_future.result()
                     
-                    # Send command result
+                    # Send command result (carries the full text)
                     yield json.dumps({
                         "type": "command_result",
                         "user_id": user_id,
@@ -235,6 +306,7 @@ def chat_stream():
                         "missing_fields": command_result.get("missing_fields"),
                         "has_more_steps": command_result.get("has_more_steps"),
                         "error": command_result.get("error"),
+                        "total_chunks": result_chunk_number,
                         "timestamp": time.time()
                     }) + "\n"
                 else:
@@ -250,6 +322,8 @@ def chat_stream():
                         "missing_fields": None,
                         "has_more_steps": False,
                         "error": None,
+                        "initial_response_chunks": chunk_number,
+                        "total_chunks": 0,
                         "timestamp": time.time()
                     }) + "\n"
                 
@@ -291,11 +365,12 @@ def chat_stream():
 
 @app.route("/api/asset/<symbol>", methods=["GET"])
 def get_asset_info(symbol: str):
-    """Get detailed information about a specific asset"""
+    """Get detailed information about a specific asset (?fresh=true skips the quote cache)"""
     try:
         from commands.get_asset_info import run
         
-        result = run({"symbol": symbol.upper()})
+        fresh = request.args.get("fresh", "false").lower() == "true"
+        result = run({"symbol": symbol.upper(), "fresh": fresh})
         
         return jsonify({
             "success": True,
@@ -562,6 +637,7 @@ def not_found(error):
         "success": False,
         "available_endpoints": [
             "/api/health",
+            "/api/metrics",
             "/api/chat",
             "/api/asset/<symbol>",
             "/api/screen",
@@ -0,0 +1,111 @@
+#!/usr/bin/env python3
+"""
+Benchmark the knowledge index: exact vs IVF-PQ search
+Builds indexes of synthetic clustered unit vectors (embeddings cluster by topic,
+uniform noise doesn't), then reports recall@k of the ANN search against exact
+search and queries/second for each nprobe and rerank factor. Indexes are kept
+in --dir and reused on reruns, so a size is only generated and trained once.
+
+    python benchmark_knowledge_index.py --entries 1000000 10000000 --nprobe 8 16 32 64
+"""
+
+import os
+import time
+import argparse
+import numpy as np
+from memory.vector_index import VectorIndex, normalize_rows
+
+INSERT_BATCH = 50000
+
+
+def synthetic_vectors(rng, centers, count, spread):
+    """Unit vectors scattered around random cluster centers"""
+    dim = centers.shape[1]
+    picks = rng.integers(0, len(centers), count)
+    noise = rng.standard_normal((count, dim), dtype=np.float32) * (spread / np.sqrt(dim))
+    return normalize_rows(centers[picks] + noise)
+
+
+def build_index(path, entries, centers, spread, seed):
+    index = VectorIndex(path, ann=True)
+    count = index.count()
+    if count >= entries:
+        print(f"  reusing {count:,} entries in {path}")
+        return index
+
+    rng = np.random.default_rng(seed + count)
+    start = time.monotonic()
+    while count < entries:
+        batch = min(INSERT_BATCH, entries - count)
+        vectors = synthetic_vectors(rng, centers, batch, spread)
+        index.add([{"doc_id": f"doc-{count + i}", "text": f"synthetic document {count + i}", "vector": vector}
+                   for i, vector in enumerate(vectors)])
+        count += batch
+        if count % 1000000 == 0 or count == entries:
+            print(f"  inserted {count:,} entries ({time.monotonic() - start:.0f}s)")
+    return index
+
+
+def timed_search(index, queries, k, **kwargs):
+    results = []
+    start = time.perf_counter()
+    for query in queries:
+        results.append([match["doc_id"] for match in index.search(query, k=k, **kwargs)])
+    return results, len(queries) / (time.perf_counter() - start)
+
+
+def recall(results, truth, k):
+    return float(np.mean([len(set(found) & set(expected)) / k for found, expected in zip(results, truth)]))
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--entries", type=int, nargs="+", default=[1000000, 10000000])
+    parser.add_argument("--dim", type=int, default=512)
+    parser.add_argument("--clusters", type=int, default=5000, help="topic clusters in the synthetic data")
+    parser.add_argument("--spread", type=float, default=1.0, help="noise around each cluster center")
+    parser.add_argument("--queries", type=int, default=200)
+    parser.add_argument("--k", type=int, default=10)
+    parser.add_argument("--nprobe", type=int, nargs="+", default=[4, 8, 16, 32, 64])
+    parser.add_argument("--rerank", type=int, nargs="+", default=[10, 50, 100],
+                        help="candidates scored exactly per result wanted (ANN_RERANK_FACTOR)")
+    parser.add_argument("--dir", default="data/benchmark")
+    parser.add_argument("--retrain", action="store_true", help="train a new ANN model even if one exists")
+    parser.add_argument("--seed", type=int, default=0)
+    args = parser.parse_args()
+
+    rng = np.random.default_rng(args.seed)
+    centers = normalize_rows(rng.standard_normal((args.clusters, args.dim), dtype=np.float32))
+    queries = synthetic_vectors(np.random.default_rng(args.seed + 1), centers, args.queries, args.spread)
+
+    rows = []
+    for entries in args.entries:
+        print(f"{entries:,} x {args.dim}")
+        index = build_index(os.path.join(args.dir, f"{entries}x{args.dim}"), entries, centers, args.spread, args.seed)
+
+        truth, exact_qps = timed_search(index, queries, args.k, exact=True)
+        print(f"  exact: {exact_qps:.1f} q/s")
+        rows.append((entries, "exact", "-", 1.0, exact_qps))
+
+        if args.retrain or not index._ann.load():
+            start = time.monotonic()
+            index.train_ann()
+            print(f"  trained in {time.monotonic() - start:.0f}s")
+        print(f"  nlist {index._ann.nlist}, {index._ann.codebooks.shape[0]} byte codes")
+
+        # Untimed pass so the codes are paged in before the first measurement
+        timed_search(index, queries, args.k, nprobe=max(args.nprobe))
+        for rerank in args.rerank:
+            for nprobe in args.nprobe:
+                results, qps = timed_search(index, queries, args.k, nprobe=nprobe, rerank_factor=rerank)
+                rows.append((entries, "ivfpq", f"{nprobe} / {rerank}", recall(results, truth, args.k), qps))
+                print(f"  nprobe {nprobe}, rerank {rerank}: recall@{args.k} {rows[-1][3]:.3f}, {qps:.1f} q/s")
+
+    print(f"\n| Entries | Search | nprobe / rerank | Recall@{args.k} | Queries/s |")
+    print("|---------|--------|-----------------|-----------|-----------|")
+    for entries, mode, setting, hit_rate, qps in rows:
+        print(f"| {entries:,} | {mode} | {setting} | {hit_rate:.3f} | {qps:.1f} |")
+
+
+if __name__ == "__main__":
+    main()
@@ -1,23 +1,72 @@
+import os
+import threading
+import contextvars
+from concurrent.futures import ThreadPoolExecutor, Future
+from dotenv import load_dotenv
 from prompt import get_system_prompt
-from memory.short_term_cache import get_recent_conversation, add_to_recent_conversation, get_current_market_data
+from memory.short_term_cache import (
+    get_recent_conversation, add_to_recent_conversation, add_messages_to_recent_conversation,
+    get_current_market_data, with_user_session, user_session
+)
 from memory.command_stack import (
     peek_stack, has_pending_steps,
     build_command_stack_with_dependencies, execute_complete_stack,
     resume_stack_execution
 )
 from command_engine import run_command
-from memory.long_term_db import save_result, get_user_facts
+from command_registry import get_required_fields
+from memory.long_term_db import get_user_facts
 from memory.knowledge_memory import get_vector_matches
-from llm_model import call_gpt
-from command_checker import extract_command_from_text
+from llm_model import call_gpt, stream_gpt
+from command_checker import extract_command_from_text, CommandDetector
 from memory.data_collector import (
     needs_more_input, receive_input, start_data_collection
 )
-from utils.storage_summariser import summarise_result
-from utils.output_summariser import summarise_output
+from memory.summary_queue import enqueue_summary
+from utils.deadline import with_deadline, REQUEST_DEADLINE_SECONDS
+from utils.output_summariser import summarise_output, stream_output
+
+load_dotenv()
+
+# Commands started early from a streamed reply run on this pool
+COMMAND_WORKERS = int(os.getenv("COMMAND_WORKERS", "8"))
+# Longest a finished command waits for the streamed reply to be recorded (seconds)
+REPLY_RECORD_WAIT = float(os.getenv("REPLY_RECORD_WAIT", "60"))
+
+_executor_lock = threading.Lock()
+_executor_state = {"pid": None, "executor": None}
+
+
+def summarise_and_save(user_id: str, command_name: str, message: str, result, on_output=None) -> str:
+    """Queue the storage summary for the background writer and return the user-facing summary"""
+    enqueue_summary(user_id, command_name, result)
+    return summarise_result_for_user(command_name, message, result, user_id, on_output)
 
 
+def summarise_result_for_user(command_name: str, message: str, result, user_id: str, on_output=None) -> str:
+    """
+    User-facing summary of a command result
+    With on_output, the summary is streamed and each piece of text is passed to it as generated.
+    """
+    if on_output is None:
+        return summarise_output(command_name, message, result, user_id)
 
+    parts = []
+    for delta in stream_output(command_name, message, result, user_id):
+        parts.append(delta)
+        on_output(delta)
+    return "".join(parts)
+
+def describe_partial_stack(command_name: str, execution_result: dict) -> str:
+    """Reply for a command stack that ran out of time before finishing"""
+    completed = [entry["command"] for entry in execution_result.get("results", [])]
+    cancelled = execution_result.get("cancelled_commands", [])
+    return (f"[Partial Result] {command_name} ran out of time before it could finish.\n"
+            f"Completed: {', '.join(completed) or 'none'}\n"
+            f"Not completed: {', '.join(cancelled)}")
+
+@with_user_session
+@with_deadline(REQUEST_DEADLINE_SECONDS)
 def handle_user_message(user_id: str, message: str) -> dict:
     # STEP 1: Handle pending input collection
     if needs_more_input(user_id):
@@ -28,7 +77,7 @@ def handle_user_message(user_id: str, message: str) -> dict:
             
             if has_pending_steps(user_id):
                 # Resume stack execution
-                execution_result = resume_stack_execution(user_id, run_command)
+                execution_result = resume_stack_execution(user_id, run_command, filled)
                 
                 if execution_result.get("needs_input"):
                     # Still need more input
@@ -37,6 +86,8 @@ def handle_user_message(user_id: str, message: str) -> dict:
                     prompts = [f"Please provide: {field}" for field in missing_fields]
                     combined_prompt = "\n".join(prompts)
                     reply = f"Thanks! Now I need a few more things for {current_command}:\n{combined_prompt}"
+                elif execution_result.get("deadline_exceeded"):
+                    reply = describe_partial_stack(filled["command"], execution_result)
                 else:
                     # Stack execution complete
                     main_result = execution_result.get("main_command_result")
@@ -49,17 +100,14 @@ def handle_user_message(user_id: str, message: str) -> dict:
                 # Regular single command execution
                 try:
                     result = run_command(filled["command"], filled["args"])
-                    summary = summarise_result(filled["command"], result)
-                    save_result(user_id, summary)
-                    output = summarise_output(filled["command"], message, result, user_id)
+                    output = summarise_and_save(user_id, filled["command"], message, result)
                     reply = f"Thanks! I've got everything I need.\n\n{output}"
                 except Exception as e:
                     reply = f"[Error running command]: {str(e)}"
         else:
             reply = f"Got it. What's the next input I need?"
 
-        add_to_recent_conversation(user_id, f"User: {message}")
-        add_to_recent_conversation(user_id, f"Assistant: {reply}")
+        add_messages_to_recent_conversation(user_id, [f"User: {message}", f"Assistant: {reply}"])
         return {
             "initial_response": reply,
             "command_result": None,
@@ -67,62 +115,24 @@ def handle_user_message(user_id: str, message: str) -> dict:
             "status": "input_collection"
         }
 
-    # STEP 2: Task reminder if stack exists
-    task_reminder = ""
-    if has_pending_steps(user_id):
-        current = peek_stack(user_id)
-        task_reminder = f"(You're currently in a multi-step task — next step is {current['command']}.)"
-
-    # STEP 3: Build full GPT context with comprehensive stateful data
-    system_prompt = get_system_prompt(user_id)
-    recent_chat = get_recent_conversation(user_id)
-    user_facts = get_user_facts(user_id)
-    vector_recall = get_vector_matches(message)
-    market_data = get_current_market_data(user_id)
-
-    context = f"""
-[User Facts & Profile]
-{user_facts}
-
-[Current Market Data]
-{market_data if market_data else "No current market data available"}
-
-[Relevant Knowledge]
-{vector_recall}
-
-[Conversation So Far]
-{recent_chat}
-
-User: {message}
-{task_reminder}
-"""
+    # STEP 2: Build the prompt (same as the streaming path) and call GPT
+    system_prompt, context = _build_reply_prompt(user_id, message)
     reply = call_gpt(system_prompt, context)
 
-    # STEP 4: Extract goal from reply
-    goal = None
-    for line in reply.splitlines():
-        if line.lower().startswith("goal:") or line.lower().startswith("task:"):
-            goal = line.split(":", 1)[1].strip()
-            break
+    # STEP 3: Extract goal from reply
+    goal = _extract_goal(reply)
 
     # STEP 4: Command detection + execution logic
     command_name, args = extract_command_from_text(reply)
     if command_name:
         # Send the initial AI response immediately
-        add_to_recent_conversation(user_id, f"User: {message}")
-        add_to_recent_conversation(user_id, f"Assistant: {reply}")
+        add_messages_to_recent_conversation(user_id, [f"User: {message}", f"Assistant: {reply}"])
         
         try:
             # Check for structured field metadata
             try:
-                module = __import__(f"commands.{command_name}", fromlist=["get_required_fields"])
-                required_fields = module.get_required_fields()
-
-                if isinstance(required_fields, dict):
-                    missing_fields = [field for field in required_fields if field not in args]
-                else:
-                    missing_fields = [field for field in required_fields if field not in args]
-                    required_fields = {field: {"prompt": f"Please provide: {field}"} for field in required_fields}
+                required_fields = get_required_fields(command_name)
+                missing_fields = [field for field in required_fields if field not in args]
 
                 if missing_fields:
                     prompts = [
@@ -179,6 +189,20 @@ User: {message}
                         "stack_executed": True
                     }
                 
+                if execution_result.get("deadline_exceeded"):
+                    follow_up = describe_partial_stack(command_name, execution_result)
+                    add_to_recent_conversation(user_id, f"Assistant: {follow_up}")
+                    return {
+                        "initial_response": reply,
+                        "command_result": follow_up,
+                        "command_executed": False,
+                        "status": "partial",
+                        "command_name": command_name,
+                        "goal": goal,
+                        "stack_executed": True,
+                        "cancelled_commands": execution_result.get("cancelled_commands", [])
+                    }
+                
                 # Get the main command result (not the required commands)
                 main_result = execution_result["main_command_result"]
                 
@@ -201,9 +225,7 @@ User: {message}
             else:
                 # Simple command without dependencies - execute normally
                 result = run_command(command_name, args)
-                summary = summarise_result(command_name, result)
-                save_result(user_id, summary)
-                output = summarise_output(command_name, message, result, user_id)
+                output = summarise_and_save(user_id, command_name, message, result)
 
                 follow_up = f"[Task Complete]\n{output}"
                 add_to_recent_conversation(user_id, f"Assistant: {follow_up}")
@@ -230,8 +252,7 @@ User: {message}
             }
 
     # STEP 5: Regular response (no command)
-    add_to_recent_conversation(user_id, f"User: {message}")
-    add_to_recent_conversation(user_id, f"Assistant: {reply}")
+    add_messages_to_recent_conversation(user_id, [f"User: {message}", f"Assistant: {reply}"])
     return {
         "initial_response": reply,
         "command_result": None,
@@ -239,19 +260,15 @@ User: {message}
         "status": "conversation_only"
     }
 
-def generate_ai_response_only(user_id: str, message: str) -> str:
-    """Generate only the AI's initial response without executing commands"""
-    # STEP 1: Handle pending input collection
-    if needs_more_input(user_id):
-        return "I need more information to proceed. What would you like me to do?"
-    
-    # STEP 2: Task reminder if stack exists
+def _build_reply_prompt(user_id: str, message: str):
+    """System prompt and context for the AI's initial reply to a message"""
+    # Task reminder if stack exists
     task_reminder = ""
     if has_pending_steps(user_id):
         current = peek_stack(user_id)
         task_reminder = f"(You're currently in a multi-step task — next step is {current['command']}.)"
     
-    # STEP 3: Build full GPT context with comprehensive stateful data
+    # Build full GPT context with comprehensive stateful data
     system_prompt = get_system_prompt(user_id)
     recent_chat = get_recent_conversation(user_id)
     user_facts = get_user_facts(user_id)
@@ -274,46 +291,109 @@ def generate_ai_response_only(user_id: str, message: str) -> str:
 You are replying directly to the user's message, which is - User: {message}
 {task_reminder}
 """
-    reply = call_gpt(system_prompt, context)
-    
-    # STEP 4: Extract goal from reply
-    goal = None
+    return system_prompt, context
+
+
+def _extract_goal(reply: str):
     for line in reply.splitlines():
         if line.lower().startswith("goal:") or line.lower().startswith("task:"):
-            goal = line.split(":", 1)[1].strip()
-            break
-    
-    # STEP 5: Command detection (but don't execute)
-    command_name, args = extract_command_from_text(reply)
-    
-    if command_name:
-        # Add conversation to memory
-        add_to_recent_conversation(user_id, f"User: {message}")
-        add_to_recent_conversation(user_id, f"Assistant: {reply}")
-        
-        # Return the AI's response and detected command info
-        return reply, command_name, args, goal
-    else:
-        # No command, just conversation
-        add_to_recent_conversation(user_id, f"User: {message}")
-        add_to_recent_conversation(user_id, f"Assistant: {reply}")
-        return reply, None, None, None
-
-def execute_command_streaming(command_name: str, args: dict, user_id: str, message: str) -> dict:
-    """Execute a command and return results for streaming"""
+            return line.split(":", 1)[1].strip()
+    return None
+
+
+def stream_ai_response(user_id: str, message: str, reply_recorded: threading.Event = None):
+    """
+    Stream the AI's initial response as it is generated
+    Yields ("delta", text) for each piece of the reply, ("command", name, args) as soon
+    as a #COMMAND directive has fully streamed (the rest of the reply may still be
+    coming), and finally ("done", reply, command_name, args, goal).
+    reply_recorded is set once the reply is in the conversation history, including
+    when the stream fails or is abandoned.
+    """
+    try:
+        # The session only spans the reads; it isn't held open across yields
+        with user_session(user_id):
+            pending_input = needs_more_input(user_id)
+            if not pending_input:
+                system_prompt, context = _build_reply_prompt(user_id, message)
+
+        if pending_input:
+            reply = "I need more information to proceed. What would you like me to do?"
+            yield ("delta", reply)
+            yield ("done", reply, None, None, None)
+            return
+
+        detector = CommandDetector()
+        for delta in stream_gpt(system_prompt, context):
+            yield ("delta", delta)
+            detected = detector.feed(delta)
+            if detected:
+                yield ("command",) + detected
+        detected = detector.finish()
+        if detected:
+            yield ("command",) + detected
+
+        reply = detector.text
+        add_messages_to_recent_conversation(user_id, [f"User: {message}", f"Assistant: {reply}"])
+        if reply_recorded is not None:
+            reply_recorded.set()
+
+        command_name, args = extract_command_from_text(reply)
+        if command_name:
+            yield ("done", reply, command_name, args, _extract_goal(reply))
+        else:
+            yield ("done", reply, None, None, None)
+    finally:
+        if reply_recorded is not None:
+            reply_recorded.set()
+
+
+def _get_command_executor() -> ThreadPoolExecutor:
+    with _executor_lock:
+        if _executor_state["pid"] != os.getpid():
+            # Worker threads don't survive a fork, so each process gets its own pool
+            _executor_state.update({
+                "pid": os.getpid(),
+                "executor": ThreadPoolExecutor(max_workers=COMMAND_WORKERS, thread_name_prefix="command")
+            })
+        return _executor_state["executor"]
+
+
+def start_command(command_name: str, args: dict, user_id: str, message: str,
+                  reply_recorded: threading.Event = None, on_output=None) -> Future:
+    """
+    Start execute_command_streaming in the background and return its Future
+    Lets a command begin while the rest of the AI's reply is still streaming. Its
+    conversation writes are held in its session until reply_recorded is set, so the
+    history keeps the reply ahead of the command's result. on_output is called from
+    the worker thread with the result text as it streams.
+    """
+    def run():
+        with user_session(user_id):
+            result = execute_command_streaming(command_name, args, user_id, message, on_output)
+            if reply_recorded is not None:
+                reply_recorded.wait(REPLY_RECORD_WAIT)
+        return result
+
+    # Carry the caller's context (request-scoped state) into the worker thread
+    return _get_command_executor().submit(contextvars.copy_context().run, run)
+
+
+@with_user_session
+@with_deadline(REQUEST_DEADLINE_SECONDS)
+def execute_command_streaming(command_name: str, args: dict, user_id: str, message: str, on_output=None) -> dict:
+    """
+    Execute a command and return results for streaming
+    on_output, if given, receives the result text as it is generated; the pieces add up
+    to the returned command_result.
+    """
     try:
         # Add user_id to args for command stack
         args["user_id"] = user_id
         # Check for structured field metadata
         try:
-            module = __import__(f"commands.{command_name}", fromlist=["get_required_fields"])
-            required_fields = module.get_required_fields()
-            
-            if isinstance(required_fields, dict):
-                missing_fields = [field for field in required_fields if field not in args]
-            else:
-                missing_fields = [field for field in required_fields if field not in args]
-                required_fields = {field: {"prompt": f"Please provide: {field}"} for field in required_fields}
+            required_fields = get_required_fields(command_name)
+            missing_fields = [field for field in required_fields if field not in args]
             
             if missing_fields:
                 prompts = [
@@ -345,11 +425,25 @@ def execute_command_streaming(command_name: str, args: dict, user_id: str, messa
             # Execute the complete stack
             execution_result = execute_complete_stack(user_id, run_command)
             
+            if execution_result.get("deadline_exceeded"):
+                follow_up = describe_partial_stack(command_name, execution_result)
+                add_to_recent_conversation(user_id, f"Assistant: {follow_up}")
+                return {
+                    "command_result": follow_up,
+                    "command_executed": False,
+                    "status": "partial",
+                    "command_name": command_name,
+                    "stack_executed": True,
+                    "cancelled_commands": execution_result.get("cancelled_commands", [])
+                }
+            
             # Get the main command result (not the required commands)
             main_result = execution_result["main_command_result"]
             
             if main_result:
-                output = summarise_output(command_name, message, main_result, user_id)
+                if on_output:
+                    on_output("[Task Complete]\n")
+                output = summarise_result_for_user(command_name, message, main_result, user_id, on_output)
                 follow_up = f"[Task Complete]\n{output}"
             else:
                 follow_up = f"[Task Complete] Command executed successfully."
@@ -365,9 +459,9 @@ def execute_command_streaming(command_name: str, args: dict, user_id: str, messa
         else:
             # Simple command without dependencies - execute normally
             result = run_command(command_name, args)
-            summary = summarise_result(command_name, result)
-            save_result(user_id, summary)
-            output = summarise_output(command_name, message, result, user_id)
+            if on_output:
+                on_output("[Task Complete]\n")
+            output = summarise_and_save(user_id, command_name, message, result, on_output)
             
             follow_up = f"[Task Complete]\n{output}"
             add_to_recent_conversation(user_id, f"Assistant: {follow_up}")
@@ -15,3 +15,74 @@ def extract_command_from_text(text: str):
         args = {}
 
     return command_name, args
+
+
+class CommandDetector:
+    """
+    Spots a #COMMAND directive in text that arrives in pieces (a streamed reply)
+    feed() returns (command_name, args) as soon as the directive is complete: once
+    its JSON arguments close, or at the end of the line for argument-less commands.
+    Only the first directive is reported, matching extract_command_from_text.
+    """
+
+    def __init__(self):
+        self.text = ""
+        self.detected = False
+
+    def feed(self, delta: str):
+        if self.detected or not delta:
+            self.text += delta or ""
+            return None
+        self.text += delta
+        return self._check(final=False)
+
+    def finish(self):
+        """Call once the text is complete; reports a directive on the unterminated last line"""
+        if self.detected:
+            return None
+        return self._check(final=True)
+
+    def _check(self, final: bool):
+        match = re.search(r"#COMMAND\s+(\w+)", self.text)
+        if not match:
+            return None
+
+        rest = self.text[match.end():]
+        line_end = rest.find("\n")
+        if line_end == -1 and not final:
+            # The name may still be growing, or JSON arguments may be on their way
+            if not rest.strip():
+                return None
+            if not rest.lstrip().startswith("{") or _json_end(rest.lstrip()) is None:
+                return None
+            line = rest
+        else:
+            line = rest if line_end == -1 else rest[:line_end]
+
+        command_name, args = extract_command_from_text(f"#COMMAND {match.group(1)}{line}")
+        self.detected = True
+        return command_name, args
+
+
+def _json_end(text: str):
+    """Index just past a complete JSON object at the start of text, or None if it isn't closed yet"""
+    depth = 0
+    in_string = False
+    escaped = False
+    for index, char in enumerate(text):
+        if in_string:
+            if escaped:
+                escaped = False
+            elif char == "\\":
+                escaped = True
+            elif char == '"':
+                in_string = False
+        elif char == '"':
+            in_string = True
+        elif char == "{":
+            depth += 1
+        elif char == "}":
+            depth -= 1
+            if depth == 0:
+                return index + 1
+    return None
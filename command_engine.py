@@ -1,10 +1,20 @@
 import json
+from command_registry import get_command
+from memory.result_store import save_command_result
+from utils.deadline import deadline_scope, check_deadline
 
 def run_command(command_name: str, args: dict = {}):
+    # Commands are imported and validated once by the registry, so dispatch is a lookup
+    command = get_command(command_name)
+    if command is None:
+        return f"[Command Error: Unknown command {command_name}]"
     try:
-        # Dynamically import from commands folder
-        module = __import__(f"commands.{command_name}", fromlist=["run"])
-        result = module.run(args)
+        # Bounded by the command's own budget and by any deadline the caller is under
+        with deadline_scope(command["budget_seconds"]):
+            check_deadline(command_name)
+            result = command["run"](args)
+        # Keep it for reuse by later stacks, if the command declares a freshness window
+        save_command_result(command_name, args, result)
         return result
     except Exception as e:
         return f"[Command Error: {str(e)}]"
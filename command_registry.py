@@ -0,0 +1,179 @@
+# command_registry.py
+# Every command module under commands/ is imported and validated once, at boot.
+# A module provides run(args) and get_required_fields(), and may declare COMMAND_META:
+#
+#   COMMAND_META = {
+#       "dependencies": [...],      # commands whose results it reads, run first in a stack
+#       "inherit_args": [...],      # args it takes from the main command when run as a dependency
+#       "freshness_seconds": 0,     # how long a result may be reused (0 = never); such commands
+#                                   # must raise on failure so an error is never stored and reused
+#       "shared_results": False,    # result doesn't depend on the user, so reuse it across users
+#       "cost": "light",            # light (cached/data fetch), medium (API + LLM), heavy (several LLM/search calls)
+#       "budget_seconds": None      # time budget per run; defaults to its cost class's budget
+#   }
+#
+# Budgets can be overridden per command with COMMAND_BUDGET_<NAME> (e.g. COMMAND_BUDGET_SCREEN_ASSETS=240).
+
+import os
+import pkgutil
+import importlib
+import threading
+from typing import Dict, Any, Optional
+from dotenv import load_dotenv
+
+load_dotenv()
+
+COST_CLASSES = ("light", "medium", "heavy")
+
+# Default time budget for one run of a command, by cost class (seconds)
+COST_CLASS_BUDGETS = {
+    "light": float(os.getenv("COMMAND_BUDGET_LIGHT", "30")),
+    "medium": float(os.getenv("COMMAND_BUDGET_MEDIUM", "90")),
+    "heavy": float(os.getenv("COMMAND_BUDGET_HEAVY", "180"))
+}
+
+META_DEFAULTS = {
+    "dependencies": [],
+    "inherit_args": [],
+    "freshness_seconds": 0,
+    "shared_results": False,
+    "cost": "light",
+    "budget_seconds": None
+}
+
+_registry_lock = threading.Lock()
+_registry = None  # command name → entry; built once, read-only afterwards
+
+
+class CommandRegistryError(Exception):
+    """Raised at boot when one or more command modules are broken"""
+
+
+def _normalize_required_fields(required_fields) -> Dict[str, Dict[str, Any]]:
+    # Modules use either {"field": {"prompt": ...}} or ["field", ...]
+    if isinstance(required_fields, dict):
+        return required_fields
+    return {field: {"prompt": f"Please provide: {field}"} for field in required_fields}
+
+
+def _load_entry(name: str, module) -> Dict[str, Any]:
+    run = getattr(module, "run", None)
+    if not callable(run):
+        raise CommandRegistryError("no run(args) function")
+
+    get_required_fields = getattr(module, "get_required_fields", None)
+    required_fields = get_required_fields() if callable(get_required_fields) else {}
+    if not isinstance(required_fields, (dict, list)):
+        raise CommandRegistryError("get_required_fields() must return a dict or list")
+
+    meta = getattr(module, "COMMAND_META", {})
+    unknown = set(meta) - set(META_DEFAULTS)
+    if unknown:
+        raise CommandRegistryError(f"unknown COMMAND_META keys {sorted(unknown)}")
+    meta = {**META_DEFAULTS, **meta}
+    if meta["cost"] not in COST_CLASSES:
+        raise CommandRegistryError(f"cost must be one of {COST_CLASSES}")
+
+    budget = os.getenv(f"COMMAND_BUDGET_{name.upper()}") or meta["budget_seconds"]
+    budget = float(budget) if budget else COST_CLASS_BUDGETS[meta["cost"]]
+
+    return {
+        "name": name,
+        "run": run,
+        "required_fields": _normalize_required_fields(required_fields),
+        "dependencies": list(meta["dependencies"]),
+        "inherit_args": list(meta["inherit_args"]),
+        "freshness_seconds": meta["freshness_seconds"],
+        "shared_results": bool(meta["shared_results"]),
+        "cost": meta["cost"],
+        "budget_seconds": budget
+    }
+
+
+def _find_cycle(registry) -> Optional[list]:
+    visiting, visited = set(), set()
+
+    def visit(name, path):
+        if name in visiting:
+            return path[path.index(name):] + [name]
+        if name in visited:
+            return None
+        visiting.add(name)
+        for dep in registry[name]["dependencies"]:
+            cycle = visit(dep, path + [name])
+            if cycle:
+                return cycle
+        visiting.discard(name)
+        visited.add(name)
+        return None
+
+    for name in registry:
+        cycle = visit(name, [])
+        if cycle:
+            return cycle
+    return None
+
+
+def _build_registry() -> Dict[str, Dict[str, Any]]:
+    import commands
+
+    registry = {}
+    errors = []
+    for module_info in pkgutil.iter_modules(commands.__path__):
+        name = module_info.name
+        try:
+            module = importlib.import_module(f"commands.{name}")
+            registry[name] = _load_entry(name, module)
+        except Exception as e:
+            errors.append(f"{name}: {e}")
+
+    if errors:
+        raise CommandRegistryError("Broken commands: " + "; ".join(errors))
+
+    for entry in registry.values():
+        unknown = [dep for dep in entry["dependencies"] if dep not in registry]
+        if unknown:
+            print(f"⚠️ {entry['name']} depends on unknown commands {unknown}, ignoring them")
+            entry["dependencies"] = [dep for dep in entry["dependencies"] if dep in registry]
+
+    cycle = _find_cycle(registry)
+    if cycle:
+        raise CommandRegistryError(f"Command dependency cycle: {' -> '.join(cycle)}")
+
+    return registry
+
+
+def load_command_registry() -> Dict[str, Dict[str, Any]]:
+    """Build the registry (once per process) and return it; raises CommandRegistryError if a command is broken"""
+    global _registry
+    if _registry is None:
+        with _registry_lock:
+            if _registry is None:
+                _registry = _build_registry()
+    return _registry
+
+
+def get_command(name: str) -> Optional[Dict[str, Any]]:
+    """Registry entry for a command, or None if there is no such command"""
+    return load_command_registry().get(name)
+
+
+def get_command_names() -> list:
+    return sorted(load_command_registry())
+
+
+def get_required_fields(name: str) -> Dict[str, Dict[str, Any]]:
+    """{field: {"prompt": ...}} the command needs before it can run"""
+    command = get_command(name)
+    return command["required_fields"] if command else {}
+
+
+def get_dependencies(name: str) -> list:
+    command = get_command(name)
+    return command["dependencies"] if command else []
+
+
+def get_command_budget(name: str) -> float:
+    """Seconds one run of the command may take"""
+    command = get_command(name)
+    return command["budget_seconds"] if command else COST_CLASS_BUDGETS["light"]
@@ -1,12 +1,18 @@
-import requests
 import os
 import json
 from datetime import datetime, timezone
 from llm_model import call_gpt
 from memory.long_term_db import get_latest_result
-from memory.short_term_cache import get_recent_conversation, get_current_market_data, get_current_cache
+from memory.short_term_cache import get_recent_conversation, get_current_cache
 from command_engine import run_command
 from prompt import get_plugin_system_prompt
+from market_refresher import is_usable_snapshot, market_data_refreshing
+
+COMMAND_META = {
+    "dependencies": ["get_asset_info"],
+    "inherit_args": ["symbol", "user_id"],
+    "cost": "medium"
+}
 
 def get_required_fields():
     return {
@@ -18,9 +24,6 @@ def run(args: dict):
     symbol = args["symbol"]
     user_id = args.get("user_id")  # Fallback to default if not provided
     
-    current_time = datetime.now(timezone.utc)
-    current_date = current_time.strftime("%Y-%m-%d")
-    
     # Get asset_info from current command stack execution results
     current_cache = get_current_cache(user_id)
     execution_results = current_cache.get("execution_results", [])
@@ -37,13 +40,10 @@ def run(args: dict):
         if not asset_info:
             asset_info = f"Asset info for {symbol} not available from previous commands. Please run get_asset_info first."
     
-    # Get market data from database market_data field (like market_assess does)
-    market_data = get_current_market_data(user_id) if user_id else {}
-    
-    # If no market data from today, collect it
-    if not market_data or market_data.get("date") != current_date:
-        # Run get_market_data to collect fresh data
-        market_data = run_command("get_market_data", {"user_id": user_id})
+    # Get today's shared market snapshot (like market_assess does)
+    market_data = run_command("get_market_data", {"user_id": user_id})
+    if not is_usable_snapshot(market_data):
+        return market_data_refreshing()
 
     # Analyze the asset using GPT
     plugin_system_prompt = get_plugin_system_prompt()
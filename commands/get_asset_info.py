@@ -1,7 +1,13 @@
 # commands/get_asset_info.py
 
-import requests
-import os
+from utils.quote_client import get_quotes
+
+COMMAND_META = {
+    "inherit_args": ["symbol"],
+    "freshness_seconds": 60,  # prices move
+    "shared_results": True,
+    "cost": "light"
+}
 
 def get_required_fields():
     return {
@@ -10,30 +16,14 @@ def get_required_fields():
 
 def run(args: dict):
     symbol = args["symbol"].upper()
+    fresh = bool(args.get("fresh", False))  # bypass the quote cache
     
-    url = "https://yahoo-finance166.p.rapidapi.com/api/market/get-quote-v2"
-    querystring = {"symbols": symbol, "fields": "quoteSummary"}
+    quote = get_quotes([symbol], fresh=fresh)[symbol]
+    if "error" in quote:
+        raise Exception(f"Could not get asset info for {symbol}: {quote['error']}")
 
-    headers = {
-        "x-rapidapi-key": os.getenv("RAPIDAPI_KEY"),
-        "x-rapidapi-host": "yahoo-finance166.p.rapidapi.com"
+    # Return the full quoteResponse data for AI processing
+    return {
+        "symbol": symbol,
+        "quoteResponse": quote
     }
-
-    response = requests.get(url, headers=headers, params=querystring)
-
-    if response.status_code != 200:
-        raise Exception(f"API Error: {response.status_code} — {response.text}")
-
-    data = response.json()
-    try:
-        # Return the full quoteResponse data for AI processing
-        if 'quoteResponse' not in data or 'result' not in data['quoteResponse']:
-            raise Exception("No quoteResponse data available for this symbol.")
-        
-        return {
-            "symbol": symbol,
-            "quoteResponse": data['quoteResponse']['result'][0]
-        }
-
-    except (KeyError, IndexError):
-        raise Exception("Could not parse asset info from response.")
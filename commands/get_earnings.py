@@ -1,6 +1,15 @@
 import requests
+from utils import http_client
 import json
 from llm_model import call_gpt
+from memory.fundamentals_cache import get_cached_fundamentals, save_fundamentals, extract_next_earnings_date
+
+COMMAND_META = {
+    "inherit_args": ["symbol"],
+    "freshness_seconds": 3600,
+    "shared_results": True,
+    "cost": "medium"
+}
 
 def get_required_fields():
     return {
@@ -10,6 +19,25 @@ def get_required_fields():
 def run(args: dict):
     symbol = args["symbol"].upper()
     
+    # Earnings charts only change when a company reports, so serve them from the persistent cache
+    earnings = get_cached_fundamentals(symbol, "earnings")
+    if earnings is None:
+        earnings = fetch_earnings(symbol)
+    
+    quarterly_data = earnings.get("earningsChart", {}).get("quarterly", [])
+    
+    if quarterly_data:
+        # Format the earnings data for display
+        formatted_earnings = format_earnings_data(quarterly_data, symbol)
+        return formatted_earnings
+    else:
+        return f"No quarterly earnings data found for {symbol}. This might be because the company doesn't have recent earnings reports or the data is not available."
+
+def fetch_earnings(symbol):
+    """
+    Fetch the earnings module for a symbol and cache it
+    Raises on failure, so run_command reports it as a command error and never stores it for reuse.
+    """
     # Yahoo Finance API endpoint for earnings
     url = "https://yahoo-finance166.p.rapidapi.com/api/stock/get-earnings"
     
@@ -27,44 +55,33 @@ def run(args: dict):
     
     try:
         # Make the API call
-        response = requests.get(url, headers=headers, params=querystring, timeout=10)
-        
-        if response.status_code == 200:
-            data = response.json()
-            
-            # Navigate to the correct path in the JSON structure
-            try:
-                quote_summary = data.get("quoteSummary", {})
-                result = quote_summary.get("result", [])
-                
-                if result and len(result) > 0:
-                    earnings = result[0].get("earnings", {})
-                    earnings_chart = earnings.get("earningsChart", {})
-                    quarterly_data = earnings_chart.get("quarterly", [])
-                    
-                    if quarterly_data:
-                        # Format the earnings data for display
-                        formatted_earnings = format_earnings_data(quarterly_data, symbol)
-                        return formatted_earnings
-                    else:
-                        return f"No quarterly earnings data found for {symbol}. This might be because the company doesn't have recent earnings reports or the data is not available."
-                else:
-                    return f"No earnings data found for {symbol}. This might be because the company doesn't have recent earnings reports or the data is not available."
-                    
-            except (KeyError, IndexError) as e:
-                return f"Error parsing earnings data structure for {symbol}: {str(e)}"
-        
-        else:
-            return f"Error fetching earnings data for {symbol}. API returned status code: {response.status_code}"
-    
+        response = http_client.get(url, headers=headers, params=querystring, timeout=10)
     except requests.exceptions.Timeout:
-        return f"Timeout error while fetching earnings data for {symbol}. Please try again."
+        raise Exception(f"Timeout error while fetching earnings data for {symbol}. Please try again.")
     except requests.exceptions.RequestException as e:
-        return f"Network error while fetching earnings data for {symbol}: {str(e)}"
+        raise Exception(f"Network error while fetching earnings data for {symbol}: {str(e)}")
+    
+    if response.status_code != 200:
+        raise Exception(f"Error fetching earnings data for {symbol}. API returned status code: {response.status_code}")
+    
+    try:
+        data = response.json()
     except json.JSONDecodeError:
-        return f"Error parsing earnings data for {symbol}. The API response was not valid JSON."
-    except Exception as e:
-        return f"Unexpected error while fetching earnings data for {symbol}: {str(e)}"
+        raise Exception(f"Error parsing earnings data for {symbol}. The API response was not valid JSON.")
+    
+    # Navigate to the correct path in the JSON structure
+    try:
+        result = data.get("quoteSummary", {}).get("result", [])
+    except (AttributeError, KeyError, IndexError) as e:
+        raise Exception(f"Error parsing earnings data structure for {symbol}: {str(e)}")
+    
+    if not result:
+        raise Exception(f"No earnings data found for {symbol}. This might be because the company doesn't have recent earnings reports or the data is not available.")
+    
+    earnings = result[0].get("earnings", {})
+    save_fundamentals(symbol, "earnings", earnings,
+                      next_earnings_date=extract_next_earnings_date(result[0]))
+    return earnings
 
 def format_earnings_data(quarterly_data, symbol):
     """Format earnings data into a readable string"""
@@ -1,8 +1,16 @@
 # commands/get_financials.py
 
-import requests
+from utils import http_client
+from memory.fundamentals_cache import get_cached_fundamentals, save_fundamentals
 import os
 
+COMMAND_META = {
+    "inherit_args": ["symbol"],
+    "freshness_seconds": 3600,
+    "shared_results": True,
+    "cost": "light"
+}
+
 def get_required_fields():
     return {
         "symbol": {"prompt": "Which stock symbol would you like financial data for? (e.g. AAPL, TSLA)"}
@@ -11,6 +19,14 @@ def get_required_fields():
 def run(args: dict):
     symbol = args["symbol"].upper()
     
+    # Fundamentals only change around earnings, so serve them from the persistent cache
+    cached = get_cached_fundamentals(symbol, "financials")
+    if cached is not None:
+        return {
+            "symbol": symbol,
+            "quoteSummary": cached
+        }
+    
     url = "https://yahoo-finance166.p.rapidapi.com/api/stock/get-financial-data"
     querystring = {"symbols": symbol, "fields": "quoteSummary"}
 
@@ -19,7 +35,7 @@ def run(args: dict):
         "x-rapidapi-host": "yahoo-finance166.p.rapidapi.com"
     }
 
-    response = requests.get(url, headers=headers, params=querystring)
+    response = http_client.get(url, headers=headers, params=querystring)
 
     if response.status_code != 200:
         raise Exception(f"API Error: {response.status_code} — {response.text}")
@@ -31,9 +47,12 @@ def run(args: dict):
         if 'quoteSummary' not in data or 'result' not in data['quoteSummary']:
             raise Exception("No quoteSummary data available for this symbol.")
         
+        quote_summary = data['quoteSummary']['result'][0]
+        save_fundamentals(symbol, "financials", quote_summary)
+        
         return {
             "symbol": symbol,
-            "quoteSummary": data['quoteSummary']['result'][0]
+            "quoteSummary": quote_summary
         }
 
     except (KeyError, IndexError) as e:
@@ -1,8 +1,16 @@
-import requests
+from utils import http_client
 import os
 import json
+import time
 from datetime import datetime, timezone
-from memory.short_term_cache import update_market_data
+from concurrent.futures import ThreadPoolExecutor, TimeoutError as FuturesTimeout
+from market_refresher import read_market_snapshot
+from utils.quote_client import get_quote_summaries
+
+# Per-source time budgets for collecting a snapshot (seconds)
+MARKET_NEWS_TIMEOUT = float(os.getenv("MARKET_NEWS_TIMEOUT", "45"))
+RISK_PROXY_TIMEOUT = float(os.getenv("RISK_PROXY_TIMEOUT", "20"))
+MACRO_DATA_TIMEOUT = float(os.getenv("MACRO_DATA_TIMEOUT", "60"))
 
 def get_required_fields():
     return {}  # No required fields - runs automatically
@@ -31,7 +39,7 @@ IMPORTANT: Only include news from today ({current_date}) or very recent breaking
 
 Return only the headlines and brief context, no analysis yet."""
 
-    response = requests.post(
+    response = http_client.post(
         "https://openrouter.ai/api/v1/chat/completions",
         headers=headers,
         json={
@@ -50,33 +58,7 @@ Return only the headlines and brief context, no analysis yet."""
 def get_risk_proxy_data():
     """Fetch current prices for key risk proxy assets"""
     symbols = ["DX-Y.NYB", "^VIX", "^TNX", "^UST2YR", "GC=F", "^GSPC", "CL=F", "HG=F", "BTC-USD"]
-    
-    url = "https://yahoo-finance166.p.rapidapi.com/api/market/get-quote-v2"
-    headers = {
-        "x-rapidapi-key": os.getenv("RAPIDAPI_KEY"),
-        "x-rapidapi-host": "yahoo-finance166.p.rapidapi.com"
-    }
-
-    all_data = {}
-    for symbol in symbols:
-        querystring = {"symbols": symbol, "fields": "quoteSummary"}
-        response = requests.get(url, headers=headers, params=querystring)
-        
-        if response.status_code == 200:
-            data = response.json()
-            try:
-                result = data['quoteResponse']['result'][0]
-                all_data[symbol] = {
-                    "price": result.get("regularMarketPrice"),
-                    "change": result.get("regularMarketChangePercent"),
-                    "volume": result.get("regularMarketVolume")
-                }
-            except (KeyError, IndexError):
-                all_data[symbol] = {"error": "Data unavailable"}
-        else:
-            all_data[symbol] = {"error": f"API Error: {response.status_code}"}
-
-    return all_data
+    return get_quote_summaries(symbols)
 
 def get_macro_data():
     """Fetch current macroeconomic data using Perplexity"""
@@ -117,7 +99,7 @@ Format your response clearly with the most important data points highlighted.
         "Content-Type": "application/json",
     }
 
-    response = requests.post(
+    response = http_client.post(
         "https://openrouter.ai/api/v1/chat/completions",
         headers=headers,
         json={
@@ -135,35 +117,61 @@ Format your response clearly with the most important data points highlighted.
     data = response.json()
     return data['choices'][0]['message']['content']
 
-def run(args: dict):
-    """Main market data collection function"""
-    user_id = args.get("user_id")
-    
+# Snapshot key → (fetch function, source name, timeout in seconds)
+MARKET_DATA_SOURCES = {
+    "market_news": (get_market_news, "perplexity_news", MARKET_NEWS_TIMEOUT),
+    "risk_proxy_data": (get_risk_proxy_data, "yahoo_finance", RISK_PROXY_TIMEOUT),
+    "macro_data": (get_macro_data, "perplexity_macro", MACRO_DATA_TIMEOUT)
+}
+
+def collect_market_data():
+    """Collect a fresh market data snapshot, fetching all sources concurrently"""
     # Get current datetime for logging
     current_time = datetime.now(timezone.utc)
     current_time_str = current_time.strftime("%Y-%m-%d %H:%M:%S UTC")
     
-    # Step 1: Get current market news
-    market_news = get_market_news()
+    # Steps 1-3: News, risk proxy assets and macro data are independent, so fetch them in parallel
+    results = {}
+    missing_sources = {}
+    executor = ThreadPoolExecutor(max_workers=len(MARKET_DATA_SOURCES), thread_name_prefix="market-data")
+    try:
+        futures = {
+            key: executor.submit(fetch) for key, (fetch, _, _) in MARKET_DATA_SOURCES.items()
+        }
+        start = time.monotonic()
+        for key, future in futures.items():
+            timeout = MARKET_DATA_SOURCES[key][2]
+            try:
+                results[key] = future.result(timeout=max(0, timeout - (time.monotonic() - start)))
+            except FuturesTimeout:
+                missing_sources[key] = f"Timed out after {timeout:.0f}s"
+            except Exception as e:
+                missing_sources[key] = str(e)
+    finally:
+        # Don't wait on sources that timed out; their threads finish in the background
+        executor.shutdown(wait=False)
     
-    # Step 2: Get risk proxy asset data
-    risk_data = get_risk_proxy_data()
+    if not results:
+        raise Exception(f"All market data sources failed: {missing_sources}")
     
-    # Step 3: Get macroeconomic data
-    macro_data = get_macro_data()
+    for key, reason in missing_sources.items():
+        print(f"Market data source {key} missing: {reason}")
     
     # Step 4: Combine all data into comprehensive market data
-    market_data = {
+    return {
         "timestamp": current_time_str,
         "date": current_time.strftime("%Y-%m-%d"),
-        "market_news": market_news,
-        "risk_proxy_data": risk_data,
-        "macro_data": macro_data,
-        "data_sources": ["perplexity_news", "yahoo_finance", "perplexity_macro"]
+        "market_news": results.get("market_news"),
+        "risk_proxy_data": results.get("risk_proxy_data"),
+        "macro_data": results.get("macro_data"),
+        "data_sources": [MARKET_DATA_SOURCES[key][1] for key in results],
+        "missing_sources": missing_sources
     }
-    
-    # Step 5: Save to short_term_memory
-    if user_id:
-        update_market_data(user_id, market_data)
-    
-    return market_data
+
+def run(args: dict):
+    """
+    Main market data function
+    Market data is the same for every user: the background market refresher keeps
+    a shared snapshot fresh and requests only read it, never waiting on collection.
+    """
+    return read_market_snapshot()
@@ -2,11 +2,16 @@ import json
 from memory.long_term_db import get_portfolio_data, get_user_transactions
 from memory.short_term_cache import get_current_cache
 
+COMMAND_META = {
+    "inherit_args": ["user_id"],
+    "cost": "light"
+}
+
 def get_required_fields():
     """No required fields - uses current user context"""
     return {}
 
-def run_command(args):
+def run(args):
     """
     Get user's portfolio information including holdings, performance, and recent transactions
     """
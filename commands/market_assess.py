@@ -1,11 +1,17 @@
-import requests
 import os
 import json
 from datetime import datetime, timezone
 from llm_model import call_gpt
 from prompt import get_plugin_system_prompt
-from memory.short_term_cache import get_current_market_data
 from command_engine import run_command
+from market_refresher import is_usable_snapshot, market_data_refreshing
+
+COMMAND_META = {
+    "inherit_args": ["user_id"],
+    "freshness_seconds": 900,  # in step with its LLM cache window
+    "shared_results": True,
+    "cost": "medium"
+}
 
 def get_required_fields():
     return {}  # No required fields - runs automatically
@@ -37,7 +43,8 @@ Provide a concise 5-7 sentence analysis covering:
 Be strategic and actionable. Focus on the most important insights from today's data. But read between the lines and try and decipher what's really going on.
 """
 
-    return call_gpt(system_prompt, user_prompt)
+    # Same snapshot within the same 15 minutes → same analysis
+    return call_gpt(system_prompt, user_prompt, cache_ttl=900, time_granularity=900)
 
 def run(args: dict):
     """Main market assessment function"""
@@ -46,17 +53,14 @@ def run(args: dict):
     # Get current datetime for logging
     current_time = datetime.now(timezone.utc)
     current_time_str = current_time.strftime("%Y-%m-%d %H:%M:%S UTC")
-    current_date = current_time.strftime("%Y-%m-%d")
-    
-    # Step 1: Check if we have market data from today
-    market_data = get_current_market_data(user_id) if user_id else {}
     
-    # Step 2: If no market data from today, collect it
-    if not market_data or market_data.get("date") != current_date:
-        # Run get_market_data to collect fresh data
-        market_data = run_command("get_market_data", {"user_id": user_id})
+    # Step 1: Get today's shared market snapshot (collected once for all users)
+    market_data = run_command("get_market_data", {"user_id": user_id})
+    if not is_usable_snapshot(market_data):
+        # Not stored or cached: the next request after the refresh analyses real data
+        return market_data_refreshing()
     
-    # Step 3: Analyze and synthesize using the complete market_data object
+    # Step 2: Analyze and synthesize using the complete market_data object
     market_analysis = analyze_market_sentiment(market_data)
     
     # Add timestamp to the analysis
@@ -1,13 +1,18 @@
-import requests
 import os
 import json
 from datetime import datetime, timezone
 from llm_model import call_gpt
 from memory.long_term_db import get_user_facts
-from memory.short_term_cache import get_recent_conversation, get_current_market_data
+from memory.short_term_cache import get_recent_conversation
 from command_engine import run_command
+from market_refresher import is_usable_snapshot, market_data_refreshing
 from prompt import get_plugin_system_prompt
 
+COMMAND_META = {
+    "inherit_args": ["user_id"],
+    "cost": "medium"
+}
+
 def get_required_fields():
     return {}  # No required fields - runs automatically
 
@@ -20,21 +25,17 @@ def run(args: dict):
     # Get current datetime for logging
     current_time = datetime.now(timezone.utc)
     current_time_str = current_time.strftime("%Y-%m-%d %H:%M:%S UTC")
-    current_date = current_time.strftime("%Y-%m-%d")
-    
-    # Step 1: Check if we have market data from today
-    market_data = get_current_market_data(user_id) if user_id else {}
     
-    # Step 2: If no market data from today, collect it
-    if not market_data or market_data.get("date") != current_date:
-        # Run get_market_data to collect fresh data
-        market_data = run_command("get_market_data", {"user_id": user_id})
+    # Step 1: Get today's shared market snapshot (collected once for all users)
+    market_data = run_command("get_market_data", {"user_id": user_id})
+    if not is_usable_snapshot(market_data):
+        return market_data_refreshing()
     
-    # Step 3: Get user data and recent conversation
+    # Step 2: Get user data and recent conversation
     user_facts = get_user_facts(user_id) if user_id else "No user data available"
     recent_chat = get_recent_conversation(user_id) if user_id else "No recent conversation"
     
-    # Step 4: Analyze and provide recommendations using GPT
+    # Step 3: Analyze and provide recommendations using GPT
     plugin_system_prompt = get_plugin_system_prompt()
     system_prompt = f"{plugin_system_prompt}\n\nYou are Portfolio AI's market recommendation specialist. Your role is to provide strategic asset and trend recommendations based on market conditions and user profile."
     
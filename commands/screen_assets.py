@@ -1,12 +1,17 @@
-import requests
+from utils import http_client
 import os
 from llm_model import call_gpt
 import json
 from datetime import datetime, timezone
 from prompt import get_plugin_system_prompt
-from memory.short_term_cache import get_current_market_data
 from command_engine import run_command
-from commands.get_user_info import run_command as get_user_info
+from market_refresher import is_usable_snapshot, market_data_refreshing
+from commands.get_user_info import run as get_user_info
+
+COMMAND_META = {
+    "inherit_args": ["filters", "user_id"],
+    "cost": "heavy"
+}
 
 def create_perplexity_search_query(user_request, user_info, market_data):
     """Create an optimized Perplexity search query using AI, incorporating user context and market data"""
@@ -47,7 +52,7 @@ Return ONLY the search query text, no explanations or additional text.
 Example format: "Best technology stocks to buy December 2024 with strong earnings growth and low volatility for conservative investors"
 """
     
-    result = call_gpt(system_prompt, prompt)
+    result = call_gpt(system_prompt, prompt, cache_ttl=900, time_granularity=900)
     return result.strip()
 
 def search_assets_with_perplexity(search_query):
@@ -89,7 +94,7 @@ Focus on actionable, current opportunities with concrete reasoning. Provide dive
 Format your response clearly with specific company names, ticker symbols, and current data.
 """
 
-    response = requests.post(
+    response = http_client.post(
         "https://openrouter.ai/api/v1/chat/completions",
         headers=headers,
         json={
@@ -143,7 +148,7 @@ The search found multiple investment opportunities. Please provide a structured
 Focus on actionable insights and provide clear reasoning for why certain assets are prioritized over others.
 """
     
-    analysis = call_gpt(system_prompt, prompt)
+    analysis = call_gpt(system_prompt, prompt, cache_ttl=900, time_granularity=900)
     
     # Format the final result
     screening_results = f"ASSET SCREENING RESULTS\n{'='*50}\n\n{analysis}"
@@ -165,18 +170,12 @@ def run(args: dict):
     # Get current datetime for logging
     current_time = datetime.now(timezone.utc)
     current_time_str = current_time.strftime("%Y-%m-%d %H:%M:%S UTC")
-    current_date = current_time.strftime("%Y-%m-%d")
     
     try:
-        # Step 1: Get or collect market data (similar to market_assess)
-        if user_id:
-            market_data = get_current_market_data(user_id)
-            # If no market data from today, collect it
-            if not market_data or market_data.get("date") != current_date:
-                market_data = run_command("get_market_data", {"user_id": user_id})
-        else:
-            # For users without ID, collect fresh market data
-            market_data = run_command("get_market_data", {"user_id": None})
+        # Step 1: Get today's shared market snapshot (similar to market_assess)
+        market_data = run_command("get_market_data", {"user_id": user_id})
+        if not is_usable_snapshot(market_data):
+            return market_data_refreshing()
         
         # Step 2: Get user information
         user_info = get_user_info({"user_id": user_id}) if user_id else {}
@@ -1,8 +1,15 @@
-import requests
+from utils import http_client
 import json
 from datetime import datetime
 import os
 
+COMMAND_META = {
+    "inherit_args": ["query"],
+    "freshness_seconds": 1800,
+    "shared_results": True,
+    "cost": "medium"
+}
+
 def get_required_fields():
     return {
         "query": {"prompt": "What would you like to search the internet for?"}
@@ -23,7 +30,7 @@ Use the internet to find the most relevant, up-to-date answer to the following q
         "Content-Type": "application/json",
     }
 
-    response = requests.post(
+    response = http_client.post(
         "https://openrouter.ai/api/v1/chat/completions",
         headers=headers,
         json={
@@ -1,8 +1,16 @@
-import requests
+from utils import http_client
 import os
 import json
 from llm_model import call_gpt
 from prompt import get_plugin_system_prompt
+from utils.quote_client import get_quote_summaries
+
+COMMAND_META = {
+    "inherit_args": ["sector"],
+    "freshness_seconds": 900,  # in step with its LLM cache window
+    "shared_results": True,
+    "cost": "medium"
+}
 
 def get_required_fields():
     return {
@@ -26,7 +34,7 @@ def get_sector_news(sector):
 
 Return only the headlines and brief context, no analysis yet."""
 
-    response = requests.post(
+    response = http_client.post(
         "https://openrouter.ai/api/v1/chat/completions",
         headers=headers,
         json={
@@ -68,33 +76,7 @@ def get_sector_etf_data(sector):
     
     # Combine sector symbols with risk assets
     all_symbols = sector_symbols + risk_assets
-    
-    url = "https://yahoo-finance166.p.rapidapi.com/api/market/get-quote-v2"
-    headers = {
-        "x-rapidapi-key": os.getenv("RAPIDAPI_KEY"),
-        "x-rapidapi-host": "yahoo-finance166.p.rapidapi.com"
-    }
-
-    all_data = {}
-    for symbol in all_symbols:
-        querystring = {"symbols": symbol, "fields": "quoteSummary"}
-        response = requests.get(url, headers=headers, params=querystring)
-        
-        if response.status_code == 200:
-            data = response.json()
-            try:
-                result = data['quoteResponse']['result'][0]
-                all_data[symbol] = {
-                    "price": result.get("regularMarketPrice"),
-                    "change": result.get("regularMarketChangePercent"),
-                    "volume": result.get("regularMarketVolume")
-                }
-            except (KeyError, IndexError):
-                all_data[symbol] = {"error": "Data unavailable"}
-        else:
-            all_data[symbol] = {"error": f"API Error: {response.status_code}"}
-
-    return all_data
+    return get_quote_summaries(all_symbols)
 
 def analyze_sector_sentiment(sector, news_data, sector_data):
     """Analyze sector sentiment using GPT"""
@@ -141,7 +123,7 @@ Provide a comprehensive 6-8 sentence analysis covering:
 Be strategic and actionable. Focus on the most important {sector}-specific insights while considering the broader market risk context. Read between the lines and try to decipher what's really going on in this sector.
 """
 
-    return call_gpt(system_prompt, user_prompt)
+    return call_gpt(system_prompt, user_prompt, cache_ttl=900, time_granularity=900)
 
 def run(args: dict):
     """Main sector assessment function"""
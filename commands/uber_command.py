@@ -6,6 +6,11 @@ from memory.short_term_cache import get_recent_conversation, get_current_market_
 from memory.knowledge_memory import get_vector_matches
 from prompt import get_plugin_system_prompt
 
+COMMAND_META = {
+    "inherit_args": ["user_id"],
+    "cost": "medium"
+}
+
 def get_required_fields():
     return {
         "question": {"prompt": "What complex question are you synthesizing data for?"}
@@ -0,0 +1,52 @@
+# gunicorn.conf.py
+# Production serving config for api_server (gunicorn -c gunicorn.conf.py api_server:app).
+# Chat requests are long-lived and I/O-bound (LLM streams, market APIs, Postgres), so
+# each worker runs a thread pool: a thread parked on a stream costs little, and a few
+# processes are enough to use the CPUs and survive a crashed worker.
+
+import os
+from dotenv import load_dotenv
+
+load_dotenv()
+
+bind = f"0.0.0.0:{os.getenv('PORT', '5000')}"
+
+# WEB_CONCURRENCY is the conventional worker-count variable on Railway/Heroku
+workers = int(os.getenv("WEB_CONCURRENCY", "2"))
+worker_class = "gthread"
+# Concurrent requests per worker; keep DB_POOL_MAX_SIZE and LLM_MAX_CONCURRENCY in step,
+# as each worker process has its own pool and LLM limiter
+threads = int(os.getenv("GUNICORN_THREADS", "16"))
+
+# Import the app once in the master so workers fork warm. Per-process state (DB pool,
+# HTTP sessions, LLM loop, background threads) is created lazily after the fork.
+preload_app = os.getenv("GUNICORN_PRELOAD", "true").lower() == "true"
+
+# With gthread this is the worker heartbeat, not a per-request limit, so long streams are fine
+timeout = int(os.getenv("GUNICORN_TIMEOUT", "120"))
+# On shutdown/redeploy, workers stop accepting and get this long to finish in-flight streams
+graceful_timeout = int(os.getenv("GUNICORN_GRACEFUL_TIMEOUT", "120"))
+keepalive = int(os.getenv("GUNICORN_KEEPALIVE", "5"))
+
+# Recycle workers after this many requests (0 = never), with jitter so they don't restart together
+max_requests = int(os.getenv("GUNICORN_MAX_REQUESTS", "0"))
+max_requests_jitter = int(os.getenv("GUNICORN_MAX_REQUESTS_JITTER", "0"))
+
+accesslog = "-"
+errorlog = "-"
+loglevel = os.getenv("GUNICORN_LOG_LEVEL", "info")
+
+
+def worker_exit(server, worker):
+    """Stop the worker's background services and flush queued work before it exits"""
+    try:
+        from market_refresher import stop_market_refresher
+        stop_market_refresher()
+    except Exception as e:
+        print(f"Error stopping market refresher: {e}")
+
+    try:
+        from memory.summary_queue import drain_summary_queue
+        drain_summary_queue()
+    except Exception as e:
+        print(f"Error draining summary queue: {e}")
@@ -1,19 +1,336 @@
-from openai import OpenAI
+from openai import OpenAI, AsyncOpenAI
 import os
+import re
+import json
+import time
+import asyncio
+import hashlib
+import threading
+import weakref
+from collections import OrderedDict
+from datetime import datetime, timezone
 from dotenv import load_dotenv
+from utils.deadline import clamp_timeout, remaining, DeadlineExceeded
 
 load_dotenv()
 
 client = OpenAI(api_key=os.getenv("OPENAI_API_KEY"))
 
-def call_gpt(system_prompt, user_prompt):
-    response = client.chat.completions.create(
-        model="gpt-4o-mini",
-        messages=[
-            {"role": "system", "content": system_prompt},
-            {"role": "user", "content": user_prompt}
-        ],
-        max_tokens=4000,
-        temperature=0.5
-    )
-    return response.choices[0].message.content 
\ No newline at end of file
+MODEL = "gpt-4o-mini"
+MAX_TOKENS = 4000
+TEMPERATURE = 0.5
+
+# Response cache (per process); call sites opt in with cache_ttl
+LLM_CACHE_MAX_ENTRIES = int(os.getenv("LLM_CACHE_MAX_ENTRIES", "500"))
+# Most LLM requests in flight at once across this process (sync and async)
+LLM_MAX_CONCURRENCY = int(os.getenv("LLM_MAX_CONCURRENCY", "8"))
+# Per-request timeout (seconds); shortened further by any request deadline
+LLM_REQUEST_TIMEOUT = float(os.getenv("LLM_REQUEST_TIMEOUT", "120"))
+
+# Embeddings for the knowledge index (text-embedding-3 models can be shortened)
+EMBEDDING_MODEL = os.getenv("EMBEDDING_MODEL", "text-embedding-3-small")
+EMBEDDING_DIMENSIONS = int(os.getenv("EMBEDDING_DIMENSIONS", "512"))
+
+# Timestamps as they appear in prompts: ISO-style ("2025-08-24 14:03:07 UTC",
+# "2025-08-24T14:03:07.123+00:00") and long form ("Sunday, August 24, 2025 at 14:03 PM")
+_ISO_TIMESTAMP = re.compile(
+    r"\d{4}-\d{2}-\d{2}[ T]\d{2}:\d{2}(?::\d{2}(?:\.\d+)?)?(?:Z|[+-]\d{2}:?\d{2})?"
+)
+_LONG_TIMESTAMP = re.compile(
+    r"[A-Z][a-z]+day, [A-Z][a-z]+ \d{1,2}, \d{4} at \d{1,2}:\d{2} [AP]M"
+)
+
+_cache_lock = threading.Lock()
+_response_cache = OrderedDict()  # key → (reply, expires_at monotonic, usage)
+_cache_stats = {
+    "hits": 0,
+    "misses": 0,
+    "saved_prompt_tokens": 0,
+    "saved_completion_tokens": 0
+}
+
+# Process-wide limiter shared by call_gpt and call_gpt_async
+_llm_slots = threading.BoundedSemaphore(max(1, LLM_MAX_CONCURRENCY))
+_slot_lock = threading.Lock()
+_slot_stats = {"in_flight": 0, "max_in_flight": 0, "waits": 0}
+
+# Async calls run on one background event loop per process, with one client per loop
+_async_lock = threading.Lock()
+_async_state = {"pid": None, "loop": None}
+_async_clients = weakref.WeakKeyDictionary()  # event loop → AsyncOpenAI
+
+
+def _bucket(moment: datetime, granularity: int) -> str:
+    if moment.tzinfo is None:
+        moment = moment.replace(tzinfo=timezone.utc)
+    return str(int(moment.timestamp()) // granularity * granularity)
+
+
+def canonicalize_timestamps(text: str, granularity: int) -> str:
+    """Replace timestamps with the start of their time bucket so prompts in the same bucket hash alike"""
+    def iso(match):
+        value = match.group(0).replace(" ", "T", 1)
+        try:
+            return f"<t:{_bucket(datetime.fromisoformat(value.replace('Z', '+00:00')), granularity)}>"
+        except ValueError:
+            return match.group(0)
+
+    def long_form(match):
+        try:
+            # %I rejects 24-hour values that some prompts pair with AM/PM, so parse the clock as %H
+            moment = datetime.strptime(match.group(0)[:-3], "%A, %B %d, %Y at %H:%M")
+            return f"<t:{_bucket(moment, granularity)}>"
+        except ValueError:
+            return match.group(0)
+
+    text = _ISO_TIMESTAMP.sub(iso, text)
+    return _LONG_TIMESTAMP.sub(long_form, text)
+
+
+def _cache_key(system_prompt, user_prompt, time_granularity=None) -> str:
+    if time_granularity:
+        system_prompt = canonicalize_timestamps(system_prompt, time_granularity)
+        user_prompt = canonicalize_timestamps(user_prompt, time_granularity)
+    payload = json.dumps({
+        "model": MODEL,
+        "system": system_prompt,
+        "user": user_prompt,
+        "max_tokens": MAX_TOKENS,
+        "temperature": TEMPERATURE
+    }, sort_keys=True)
+    return hashlib.sha256(payload.encode("utf-8")).hexdigest()
+
+
+def _cache_get(key):
+    with _cache_lock:
+        entry = _response_cache.get(key)
+        if entry is not None and entry[1] <= time.monotonic():
+            del _response_cache[key]
+            entry = None
+        if entry is None:
+            _cache_stats["misses"] += 1
+            return None
+        _response_cache.move_to_end(key)
+        _cache_stats["hits"] += 1
+        _cache_stats["saved_prompt_tokens"] += entry[2][0]
+        _cache_stats["saved_completion_tokens"] += entry[2][1]
+        return entry[0]
+
+
+def _cache_set(key, reply, ttl, usage):
+    with _cache_lock:
+        _response_cache[key] = (reply, time.monotonic() + ttl, usage)
+        _response_cache.move_to_end(key)
+        while len(_response_cache) > LLM_CACHE_MAX_ENTRIES:
+            _response_cache.popitem(last=False)
+
+
+def _slot_acquired(waited: bool):
+    with _slot_lock:
+        _slot_stats["in_flight"] += 1
+        _slot_stats["max_in_flight"] = max(_slot_stats["max_in_flight"], _slot_stats["in_flight"])
+        if waited:
+            _slot_stats["waits"] += 1
+
+
+def _release_slot():
+    with _slot_lock:
+        _slot_stats["in_flight"] -= 1
+    _llm_slots.release()
+
+
+def _acquire_slot():
+    waited = not _llm_slots.acquire(blocking=False)
+    if waited:
+        # Wait no longer than the current deadline allows
+        left = remaining()
+        if left is None:
+            # No deadline: block until a slot frees up (acquire(timeout=-1) would return at once)
+            _llm_slots.acquire()
+        elif not _llm_slots.acquire(timeout=left):
+            raise DeadlineExceeded("Deadline exceeded waiting for an LLM slot")
+    _slot_acquired(waited)
+
+
+async def _acquire_slot_async():
+    # Poll rather than block so the event loop keeps serving other calls while waiting
+    waited = False
+    delay = 0.005
+    while not _llm_slots.acquire(blocking=False):
+        waited = True
+        left = remaining()
+        if left is not None and left <= 0:
+            raise DeadlineExceeded("Deadline exceeded waiting for an LLM slot")
+        await asyncio.sleep(delay)
+        delay = min(delay * 2, 0.1)
+    _slot_acquired(waited)
+
+
+def get_llm_cache_stats():
+    """Hit/miss counters and tokens saved by the response cache, plus concurrency, for this process"""
+    with _cache_lock:
+        stats = dict(_cache_stats)
+        stats["entries"] = len(_response_cache)
+    with _slot_lock:
+        stats.update(_slot_stats)
+    lookups = stats["hits"] + stats["misses"]
+    stats["hit_rate"] = stats["hits"] / lookups if lookups else 0.0
+    stats["max_concurrency"] = LLM_MAX_CONCURRENCY
+    return stats
+
+
+def call_gpt(system_prompt, user_prompt, cache_ttl=None, time_granularity=None):
+    """
+    Call the chat model
+    cache_ttl (seconds) opts the call into the response cache, keyed on a hash of
+    the model, prompts and parameters. time_granularity (seconds) buckets any
+    timestamps in the prompts before hashing, so a prompt stamped to the second
+    still hits within the same bucket.
+    """
+    key = None
+    if cache_ttl:
+        key = _cache_key(system_prompt, user_prompt, time_granularity)
+        cached = _cache_get(key)
+        if cached is not None:
+            return cached
+
+    _acquire_slot()
+    try:
+        response = client.chat.completions.create(
+            model=MODEL,
+            messages=[
+                {"role": "system", "content": system_prompt},
+                {"role": "user", "content": user_prompt}
+            ],
+            max_tokens=MAX_TOKENS,
+            temperature=TEMPERATURE,
+            timeout=clamp_timeout(LLM_REQUEST_TIMEOUT)
+        )
+    finally:
+        _release_slot()
+
+    return _finish(response, key, cache_ttl)
+
+
+def stream_gpt(system_prompt, user_prompt):
+    """
+    Call the chat model and yield the reply as it is generated, one text delta at a time
+    Holds a concurrency slot until the stream ends or the caller stops iterating.
+    Streamed replies are not cached.
+    """
+    _acquire_slot()
+    try:
+        stream = client.chat.completions.create(
+            model=MODEL,
+            messages=[
+                {"role": "system", "content": system_prompt},
+                {"role": "user", "content": user_prompt}
+            ],
+            max_tokens=MAX_TOKENS,
+            temperature=TEMPERATURE,
+            stream=True,
+            timeout=clamp_timeout(LLM_REQUEST_TIMEOUT)
+        )
+        try:
+            for chunk in stream:
+                if not chunk.choices:
+                    continue
+                delta = chunk.choices[0].delta.content
+                if delta:
+                    yield delta
+                left = remaining()
+                if left is not None and left <= 0:
+                    raise DeadlineExceeded("Deadline exceeded while streaming a reply")
+        finally:
+            # Stop the upstream generation if the caller went away mid-stream
+            stream.close()
+    finally:
+        _release_slot()
+
+
+def get_embeddings(texts):
+    """Embed a batch of texts in one request; returns one list of floats per text, in order"""
+    _acquire_slot()
+    try:
+        response = client.embeddings.create(
+            model=EMBEDDING_MODEL,
+            input=list(texts),
+            dimensions=EMBEDDING_DIMENSIONS,
+            timeout=clamp_timeout(LLM_REQUEST_TIMEOUT)
+        )
+    finally:
+        _release_slot()
+
+    return [item.embedding for item in sorted(response.data, key=lambda item: item.index)]
+
+
+def _finish(response, key, cache_ttl):
+    reply = response.choices[0].message.content
+    if key is not None and reply:
+        usage = response.usage
+        tokens = (usage.prompt_tokens, usage.completion_tokens) if usage else (0, 0)
+        _cache_set(key, reply, cache_ttl, tokens)
+    return reply
+
+
+def _get_async_client() -> AsyncOpenAI:
+    # httpx connections belong to the loop that opened them, so each loop gets its own client
+    loop = asyncio.get_running_loop()
+    async_client = _async_clients.get(loop)
+    if async_client is None:
+        async_client = _async_clients[loop] = AsyncOpenAI(api_key=os.getenv("OPENAI_API_KEY"))
+    return async_client
+
+
+async def call_gpt_async(system_prompt, user_prompt, cache_ttl=None, time_granularity=None):
+    """Async call_gpt: same caching, and shares call_gpt's process-wide concurrency limit"""
+    key = None
+    if cache_ttl:
+        key = _cache_key(system_prompt, user_prompt, time_granularity)
+        cached = _cache_get(key)
+        if cached is not None:
+            return cached
+
+    await _acquire_slot_async()
+    try:
+        response = await _get_async_client().chat.completions.create(
+            model=MODEL,
+            messages=[
+                {"role": "system", "content": system_prompt},
+                {"role": "user", "content": user_prompt}
+            ],
+            max_tokens=MAX_TOKENS,
+            temperature=TEMPERATURE,
+            timeout=clamp_timeout(LLM_REQUEST_TIMEOUT)
+        )
+    finally:
+        _release_slot()
+
+    return _finish(response, key, cache_ttl)
+
+
+def _get_async_loop():
+    with _async_lock:
+        if _async_state["pid"] != os.getpid():
+            # The loop thread doesn't survive a fork, so each worker starts its own
+            loop = asyncio.new_event_loop()
+            thread = threading.Thread(target=loop.run_forever, name="llm-async", daemon=True)
+            thread.start()
+            _async_state.update({"pid": os.getpid(), "loop": loop})
+        return _async_state["loop"]
+
+
+def call_gpt_concurrently(requests, return_exceptions=False):
+    """
+    Run several independent call_gpt requests at the same time from synchronous code
+    `requests` is a list of call_gpt keyword-argument dicts; replies come back in order.
+    With return_exceptions, a failed call yields its exception instead of failing the rest.
+    The calls run on the shared background event loop and inherit the caller's context.
+    """
+    loop = _get_async_loop()
+
+    async def gather():
+        return await asyncio.gather(*(call_gpt_async(**request) for request in requests),
+                                    return_exceptions=return_exceptions)
+
+    return asyncio.run_coroutine_threadsafe(gather(), loop).result()
@@ -0,0 +1,164 @@
+# market_refresher.py
+# Keeps the shared market snapshot fresh on a market-hours-aware schedule so
+# request-path commands only ever read the latest snapshot. Runs as a daemon
+# thread inside each API worker (start_market_refresher) or as its own process:
+#
+#     python market_refresher.py
+#
+# Several refreshers can run at once; the single-flight refresh in
+# memory.market_snapshot makes sure only one of them collects per interval.
+
+import os
+import threading
+from datetime import datetime
+from typing import Dict, Any
+from dotenv import load_dotenv
+from memory.market_snapshot import (
+    get_market_snapshot, get_latest_market_snapshot, is_fresh_snapshot, snapshot_age_seconds
+)
+from utils.market_hours import get_refresh_interval, is_market_open
+
+load_dotenv()
+
+MARKET_REFRESHER_ENABLED = os.getenv("MARKET_REFRESHER_ENABLED", "true").lower() == "true"
+MARKET_REFRESHER_POLL_SECONDS = float(os.getenv("MARKET_REFRESHER_POLL_SECONDS", "60"))
+# How long past its refresh interval a snapshot may get before analyses stop using it
+# (a refresh takes a poll plus collection time, so a due snapshot is still normal for a while)
+MARKET_SNAPSHOT_STALE_GRACE_SECONDS = float(os.getenv("MARKET_SNAPSHOT_STALE_GRACE_SECONDS", "600"))
+
+MARKET_DATA_REFRESHING_MESSAGE = "Market data is being refreshed and will be available in a few minutes, please try again shortly"
+
+_state_lock = threading.Lock()
+_refresher = {"pid": None, "thread": None, "stop": None}
+_kick_thread = None
+_status = {
+    "runs": 0,
+    "failures": 0,
+    "kicks": 0,
+    "last_run": None,
+    "last_error": None
+}
+
+
+def _collect_market_data() -> Dict[str, Any]:
+    # Imported lazily: the get_market_data command imports this module
+    from commands.get_market_data import collect_market_data
+    return collect_market_data()
+
+
+def refresh_market_data() -> Dict[str, Any]:
+    """Collect a new snapshot if the latest one is older than the current refresh interval"""
+    try:
+        snapshot = get_market_snapshot(_collect_market_data, max_age=get_refresh_interval())
+        with _state_lock:
+            _status["runs"] += 1
+            _status["last_run"] = datetime.now().isoformat()
+        return snapshot
+
+    except Exception as e:
+        print(f"Error refreshing market data: {e}")
+        with _state_lock:
+            _status["failures"] += 1
+            _status["last_error"] = str(e)
+        return {}
+
+
+def request_market_refresh() -> bool:
+    """Start a refresh in the background unless one is already running in this process"""
+    global _kick_thread
+    with _state_lock:
+        if _kick_thread is not None and _kick_thread.is_alive():
+            return False
+        _kick_thread = threading.Thread(target=refresh_market_data, name="market-refresh", daemon=True)
+        _status["kicks"] += 1
+        _kick_thread.start()
+    return True
+
+
+def market_data_refreshing() -> Dict[str, Any]:
+    """Placeholder returned instead of market data (or an analysis of it) while it is refreshed"""
+    return {"status": "refreshing", "message": MARKET_DATA_REFRESHING_MESSAGE}
+
+
+def is_stale_snapshot(snapshot: Dict[str, Any]) -> bool:
+    """Not from today, or past its refresh interval by more than the grace period"""
+    return not is_fresh_snapshot(snapshot, get_refresh_interval() + MARKET_SNAPSHOT_STALE_GRACE_SECONDS)
+
+
+def read_market_snapshot() -> Dict[str, Any]:
+    """
+    Latest shared market snapshot, without ever blocking on collection
+    A snapshot due for refresh kicks off a background refresh and is returned straight
+    away; with no snapshot the refreshing placeholder is returned, and a stale one is
+    returned with "status": "stale" so callers can tell.
+    """
+    snapshot = get_latest_market_snapshot()
+    if not is_fresh_snapshot(snapshot, get_refresh_interval()):
+        request_market_refresh()
+    if not snapshot:
+        return market_data_refreshing()
+    if is_stale_snapshot(snapshot):
+        return dict(snapshot, status="stale", message=MARKET_DATA_REFRESHING_MESSAGE)
+    return snapshot
+
+
+def is_usable_snapshot(market_data) -> bool:
+    """Whether market data read via get_market_data is current enough to analyse"""
+    if not isinstance(market_data, dict) or not market_data:
+        return False
+    return market_data.get("status") not in ("refreshing", "stale")
+
+
+def _run(stop_event: threading.Event):
+    print("Market refresher started")
+    while not stop_event.is_set():
+        refresh_market_data()
+        stop_event.wait(MARKET_REFRESHER_POLL_SECONDS)
+    print("Market refresher stopped")
+
+
+def start_market_refresher() -> bool:
+    """Start the refresher thread for this process (no-op if disabled or already running)"""
+    if not MARKET_REFRESHER_ENABLED:
+        return False
+    if _refresher["pid"] == os.getpid():
+        return False
+
+    with _state_lock:
+        # Threads don't survive a fork, so each worker process starts its own
+        if _refresher["pid"] == os.getpid():
+            return False
+        stop_event = threading.Event()
+        thread = threading.Thread(target=_run, args=(stop_event,), name="market-refresher", daemon=True)
+        _refresher.update({"pid": os.getpid(), "thread": thread, "stop": stop_event})
+        thread.start()
+    return True
+
+
+def stop_market_refresher():
+    """Signal the refresher thread to stop"""
+    with _state_lock:
+        if _refresher["stop"] is not None:
+            _refresher["stop"].set()
+        _refresher.update({"pid": None, "thread": None, "stop": None})
+
+
+def get_refresher_status() -> Dict[str, Any]:
+    """Refresher counters plus the age of the latest snapshot"""
+    with _state_lock:
+        status = dict(_status)
+        thread = _refresher["thread"]
+        status["running"] = bool(thread is not None and thread.is_alive() and _refresher["pid"] == os.getpid())
+    status["enabled"] = MARKET_REFRESHER_ENABLED
+    status["market_open"] = is_market_open()
+    status["refresh_interval"] = get_refresh_interval()
+    status["snapshot_age_seconds"] = snapshot_age_seconds(get_latest_market_snapshot())
+    return status
+
+
+if __name__ == "__main__":
+    stop = threading.Event()
+    try:
+        _run(stop)
+    except KeyboardInterrupt:
+        stop.set()
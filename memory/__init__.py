@@ -4,12 +4,28 @@
 from .short_term_cache import (
     get_recent_conversation,
     add_to_recent_conversation,
+    add_messages_to_recent_conversation,
     update_current_cache,
+    append_to_cache_list,
     get_current_cache,
     update_market_data,
     get_current_market_data,
     get_comprehensive_cache,
-    get_user_data_summary
+    get_user_data_summary,
+    UserSession,
+    user_session,
+    with_user_session
+)
+
+from .market_snapshot import (
+    get_market_snapshot,
+    get_latest_market_snapshot,
+    save_market_snapshot
+)
+
+from .result_store import (
+    get_fresh_result,
+    save_command_result
 )
 
 from .command_stack import (
@@ -38,12 +54,26 @@ __all__ = [
     # Short term cache functions
     'get_recent_conversation',
     'add_to_recent_conversation', 
+    'add_messages_to_recent_conversation',
     'update_current_cache',
+    'append_to_cache_list',
     'get_current_cache',
     'update_market_data',
     'get_current_market_data',
     'get_comprehensive_cache',
     'get_user_data_summary',
+    'UserSession',
+    'user_session',
+    'with_user_session',
+    
+    # Market snapshot functions
+    'get_market_snapshot',
+    'get_latest_market_snapshot',
+    'save_market_snapshot',
+    
+    # Command result store functions
+    'get_fresh_result',
+    'save_command_result',
     
     # Command stack functions
     'peek_stack',
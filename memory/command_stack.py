@@ -1,6 +1,26 @@
-from memory.short_term_cache import update_current_cache, get_current_cache
+from memory.short_term_cache import (
+    update_current_cache, get_current_cache, append_to_cache_list, flush_current_cache
+)
+from memory.result_store import get_fresh_result
+from command_registry import (
+    get_command, get_dependencies, get_required_fields as get_command_required_fields,
+    get_command_budget, COST_CLASSES
+)
+from utils.deadline import deadline_scope, remaining, is_expired
+from concurrent.futures import ThreadPoolExecutor, wait, FIRST_COMPLETED
 from datetime import datetime
+from dotenv import load_dotenv
+import contextvars
 import json
+import os
+
+load_dotenv()
+
+# Most commands of one stack running at the same time
+STACK_MAX_PARALLEL = int(os.getenv("STACK_MAX_PARALLEL", "4"))
+
+# A dependency in one of these states no longer holds up the commands that need it
+SETTLED_STATUSES = ("done", "error")
 
 
 def peek_stack(user_id):
@@ -20,7 +40,7 @@ def has_pending_steps(user_id):
     current_cache = get_current_cache(user_id)
     command_stack = current_cache.get("command_stack", [])
     
-    return any(step["status"] in ["pending", "executing"] for step in command_stack)
+    return any(step["status"] in ["pending", "executing", "waiting_for_input"] for step in command_stack)
 
 
 def get_current_goal(user_id):
@@ -35,22 +55,8 @@ def get_current_goal(user_id):
 
 
 def get_required_commands(command_name):
-    """Get required commands for a given command"""
-    # Define command dependencies
-    command_dependencies = {
-        "asset_assess": ["get_asset_info"],
-        "market_rec": [],
-        "portfolio_screener": ["get_investment_criteria", "market_assess"],
-        "portfolio_construction": ["get_investment_criteria", "portfolio_screener", "market_assess"],
-        "portfolio_calculation": ["portfolio_construction"],
-        "holdings_analysis": ["get_investment_criteria", "get_user_portfolio", "market_assess", "portfolio_calculation"],
-        "simulate_portfolio": ["get_investment_criteria", "market_assess"],
-        "create_portfolio": ["get_investment_criteria", "portfolio_screener", "portfolio_construction", "portfolio_calculation", "simulate_portfolio", "build_pie"],
-        "optimise_portfolio": ["get_investment_criteria", "portfolio_calculation", "simulate_portfolio", "rebalance_pie"],
-        "analyse_portfolio": ["get_investment_criteria", "holdings_analysis", "portfolio_screener", "portfolio_calculation", "simulate_portfolio", "rebalance_pie"]
-    }
-    
-    return command_dependencies.get(command_name, [])
+    """Get required commands for a given command (declared in its COMMAND_META)"""
+    return get_dependencies(command_name)
 
 def build_command_stack_with_dependencies(user_id, main_command, args, goal=None):
     """Build a complete command stack with all required dependencies"""
@@ -61,45 +67,14 @@ def build_command_stack_with_dependencies(user_id, main_command, args, goal=None
     current_cache = get_current_cache(user_id)
     command_stack = []
     
+    reused_results = []
+    
     # Add required commands first (in order)
     for req_command in required_commands:
-        # Check if we already have recent results for this command
-        # For now, we'll add all required commands - optimization can come later
-        
-        # Pass relevant args to required commands based on their requirements
-        req_args = {}
-        
-        # Define what args each command typically needs
-        command_arg_mapping = {
-            "get_asset_info": ["symbol"],
-            "get_financials": ["symbol"], 
-            "get_earnings": ["symbol"],
-            "sector_assess": ["sector"],
-            "get_investment_criteria": ["user_id"],
-            "portfolio_screener": ["filters"],
-            "screen_assets": ["filters"],
-            "search_web": ["query"]
-        }
-        
-        # Get the required args for this command
-        needed_args = command_arg_mapping.get(req_command, [])
-        
-        # Pass any available args that this command needs
-        for arg_name in needed_args:
-            if arg_name in args:
-                req_args[arg_name] = args[arg_name]
-        
-        # Special case: if the main command has a symbol, pass it to asset-related commands
-        if "symbol" in args and req_command in ["get_asset_info", "get_financials", "get_earnings"]:
-            req_args["symbol"] = args["symbol"]
-        
-        # Special case: if the main command has a sector, pass it to sector commands
-        if "sector" in args and req_command == "sector_assess":
-            req_args["sector"] = args["sector"]
-        
-        # Always pass user_id to commands that need it
-        if "user_id" in args and req_command in ["asset_assess", "market_rec"]:
-            req_args["user_id"] = args["user_id"]
+        # Pass the args this command takes from the main command (its inherit_args)
+        required_command = get_command(req_command)
+        inherited = required_command["inherit_args"] if required_command else []
+        req_args = {arg_name: args[arg_name] for arg_name in inherited if arg_name in args}
         
         new_command = {
             "command": req_command,
@@ -113,8 +88,26 @@ def build_command_stack_with_dependencies(user_id, main_command, args, goal=None
             "result": None,
             "error": None,
             "completion_notes": None,
-            "is_required": True  # Mark as required command
+            "is_required": True,  # Mark as required command
+            # Only dependencies that are part of this stack gate it
+            "depends_on": [dep for dep in get_required_commands(req_command) if dep in required_commands]
         }
+        
+        # A result still inside the command's freshness window satisfies the dependency
+        fresh = get_fresh_result(req_command, {**req_args, "user_id": args.get("user_id")})
+        if fresh:
+            new_command.update({
+                "status": "done",
+                "execution_end": fresh["created_at"].isoformat(),
+                "result": fresh["result"],
+                "completion_notes": "reused fresh result"
+            })
+            reused_results.append({
+                "command": req_command,
+                "result": fresh["result"],
+                "is_required": True
+            })
+        
         command_stack.append(new_command)
     
     # Add the main command last
@@ -130,132 +123,279 @@ def build_command_stack_with_dependencies(user_id, main_command, args, goal=None
         "result": None,
         "error": None,
         "completion_notes": None,
-        "is_required": False  # Main command
+        "is_required": False,  # Main command
+        "depends_on": list(required_commands)
     }
     command_stack.append(main_command_obj)
     
-    # Update database with new stack
+    # Update database with new stack; reused results are visible to the commands that need them
     update_current_cache(user_id, {
         "command_stack": command_stack,
         "last_stack_update": datetime.now().isoformat(),
         "active_goals": [cmd.get("goal") for cmd in command_stack if cmd.get("goal")],
         "pending_commands": len([cmd for cmd in command_stack if cmd["status"] == "pending"]),
-        "completed_commands": 0,
+        "completed_commands": len(reused_results),
+        "execution_results": reused_results,
         "stack_type": "dependency_chain"
     })
+    flush_current_cache(user_id)
     
     return command_stack
 
 def check_required_fields(command_name, args):
     """Check if a command has all its required fields"""
-    try:
-        # Try to import the command module and get required fields
-        module = __import__(f"commands.{command_name}", fromlist=["get_required_fields"])
-        required_fields = module.get_required_fields()
-        
-        if isinstance(required_fields, dict):
-            # Dictionary format: {"field": {"prompt": "..."}}
-            missing_fields = [field for field in required_fields if field not in args]
-        elif isinstance(required_fields, list):
-            # List format: ["field1", "field2"]
-            missing_fields = [field for field in required_fields if field not in args]
-        else:
-            # No required fields defined
-            missing_fields = []
-        
-        return missing_fields
-        
-    except (ImportError, AttributeError):
-        # Command doesn't have required fields defined
-        return []
+    return [field for field in get_command_required_fields(command_name) if field not in args]
+
+def get_stack_dependencies(command_stack):
+    """Map each stack position to the positions of the commands it has to wait for"""
+    positions = {}
+    for index, command in enumerate(command_stack):
+        positions.setdefault(command["command"], index)
+
+    dependencies = {}
+    for index, command in enumerate(command_stack):
+        names = command.get("depends_on")
+        if names is None:
+            # Stacks saved before depends_on was recorded
+            if command.get("is_required", False):
+                names = get_required_commands(command["command"])
+            else:
+                names = [other["command"] for other in command_stack if other.get("is_required", False)]
+        dependencies[index] = {positions[name] for name in names
+                               if name in positions and positions[name] != index}
+    return dependencies
+
+
+def _ready_commands(command_stack, dependencies, running):
+    """Pending positions whose dependencies have all settled"""
+    ready = [
+        index for index, command in enumerate(command_stack)
+        if command["status"] == "pending"
+        and all(command_stack[dep]["status"] in SETTLED_STATUSES for dep in dependencies[index])
+    ]
+    if not ready and not running:
+        # Nothing can start and nothing will finish (a dependency cycle): fall back to stack order
+        ready = [index for index, command in enumerate(command_stack) if command["status"] == "pending"][:1]
+    # Start the most expensive commands first so the slowest branch isn't left until last
+    return sorted(ready, key=lambda index: -COST_CLASSES.index(_command_cost(command_stack[index]["command"])))
+
+
+def _command_cost(command_name):
+    command = get_command(command_name)
+    return command["cost"] if command else "light"
+
+
+def _downstream_budget(command_stack, dependencies, index, memo=None):
+    """Budget of the longest chain of commands that still has to run after this one"""
+    memo = {} if memo is None else memo
+    if index not in memo:
+        memo[index] = 0.0  # guards against cycles in old stacks
+        memo[index] = max((get_command_budget(command_stack[other]["command"])
+                           + _downstream_budget(command_stack, dependencies, other, memo)
+                           for other, deps in dependencies.items()
+                           if index in deps and command_stack[other]["status"] == "pending"),
+                          default=0.0)
+    return memo[index]
+
+
+def _step_budget(command_stack, dependencies, index):
+    """
+    Time a command may take within the stack's deadline
+    The time left is split in proportion to budgets along the longest remaining
+    chain, so the commands that depend on this one still get their share.
+    """
+    own = get_command_budget(command_stack[index]["command"])
+    left = remaining()
+    if left is None:
+        return own
+    downstream = _downstream_budget(command_stack, dependencies, index)
+    return min(own, left * own / (own + downstream))
+
+
+def _run_within(seconds, command_engine, command_name, args):
+    with deadline_scope(seconds):
+        return command_engine(command_name, args)
+
+
+def _cancel_remaining(command_stack, running):
+    """Mark unfinished commands cancelled; returns their names"""
+    cancelled = []
+    running_positions = set(running.values())
+    for index, command in enumerate(command_stack):
+        if command["status"] in ("pending", "waiting_for_input") or index in running_positions:
+            command["status"] = "cancelled"
+            command["execution_end"] = datetime.now().isoformat()
+            command["error"] = "Deadline exceeded"
+            cancelled.append(command["command"])
+    running.clear()
+    return cancelled
+
+
+def _save_stack(user_id, command_stack):
+    """
+    Persist node statuses and results as they change
+    Written to Postgres straight away, not at the end of the request's session, so
+    finished commands survive the request failing or the worker dying mid-stack.
+    """
+    update_current_cache(user_id, {
+        "command_stack": command_stack,
+        "last_stack_update": datetime.now().isoformat(),
+        "pending_commands": len([cmd for cmd in command_stack if cmd["status"] == "pending"]),
+        "completed_commands": len([cmd for cmd in command_stack if cmd["status"] == "done"])
+    })
+    flush_current_cache(user_id)
+
 
 def execute_complete_stack(user_id, command_engine):
-    """Execute the complete command stack continuously until empty"""
-    from memory.long_term_db import save_result
-    from utils.storage_summariser import summarise_result
-    from utils.output_summariser import summarise_output
-    from memory.data_collector import needs_more_input, start_data_collection
+    """
+    Execute the command stack until every command has run
+    Commands run as soon as the commands they depend on have finished, independent
+    ones in parallel. Each command's status and result are saved as it completes.
+    A command missing required fields pauses the stack for input: nothing new starts,
+    commands already running finish, and resume_stack_execution picks up from there.
+    Under a deadline (utils.deadline) each command gets a share of the time left; when
+    it runs out, unfinished commands are cancelled and the partial results returned
+    with status "deadline_exceeded".
+    """
+    from memory.summary_queue import enqueue_summary
+    from memory.data_collector import start_data_collection, cancel_data_collection
     
     current_cache = get_current_cache(user_id)
     command_stack = current_cache.get("command_stack", [])
+    dependencies = get_stack_dependencies(command_stack)
     
-    results = []
-    errors = []
+    results = {}  # position → result entry, so results keep stack order
+    errors = {}
     
-    # Execute all commands in the stack
-    for i, command in enumerate(command_stack):
-        if command["status"] == "pending":
-            try:
-                # Check for required fields before executing
-                missing_fields = check_required_fields(command["command"], command["args"])
-                
-                if missing_fields:
-                    # Missing fields - trigger data collection
-                    command["status"] = "waiting_for_input"
-                    command["missing_fields"] = missing_fields
+    for index, command in enumerate(command_stack):
+        if command["status"] in ("executing", "waiting_for_input"):
+            # Interrupted by a previous run or paused for input: run it again
+            command["status"] = "pending"
+        elif command["status"] == "done":
+            # Completed before the stack was paused
+            results[index] = {
+                "command": command["command"],
+                "result": command.get("result"),
+                "is_required": command.get("is_required", False)
+            }
+        elif command["status"] == "error":
+            errors[index] = {
+                "command": command["command"],
+                "error": command.get("error"),
+                "is_required": command.get("is_required", False)
+            }
+    
+    waiting_command = None
+    cancelled = []
+    running = {}  # future → stack position
+    
+    executor = ThreadPoolExecutor(max_workers=max(1, STACK_MAX_PARALLEL), thread_name_prefix="stack")
+    try:
+        while True:
+            if is_expired():
+                # Out of time: nothing new starts, and whatever is still running is abandoned
+                cancelled = _cancel_remaining(command_stack, running)
+                if waiting_command is not None:
+                    cancel_data_collection(user_id)
+                    waiting_command = None
+                _save_stack(user_id, command_stack)
+                break
+            
+            if waiting_command is None:
+                for index in _ready_commands(command_stack, dependencies, running):
+                    command = command_stack[index]
                     
-                    # Start data collection for this command
-                    start_data_collection(user_id, command["command"], command["args"], missing_fields, {})
+                    # Check for required fields before executing
+                    missing_fields = check_required_fields(command["command"], command["args"])
+                    if missing_fields:
+                        # Missing fields - trigger data collection and stop starting new commands
+                        command["status"] = "waiting_for_input"
+                        command["missing_fields"] = missing_fields
+                        start_data_collection(user_id, command["command"], command["args"], missing_fields, {})
+                        waiting_command = command
+                        break
                     
-                    # Return early to let data collector handle the input
-                    return {
-                        "results": results,
-                        "errors": errors,
-                        "main_command_result": None,
-                        "needs_input": True,
-                        "missing_fields": missing_fields,
-                        "current_command": command["command"]
-                    }
+                    # Mark as executing
+                    command["status"] = "executing"
+                    command["execution_start"] = datetime.now().isoformat()
+                    
+                    # Each command gets its own copy of the caller's context (open session, deadline)
+                    future = executor.submit(contextvars.copy_context().run, _run_within,
+                                             _step_budget(command_stack, dependencies, index),
+                                             command_engine, command["command"], command["args"])
+                    running[future] = index
                 
-                # Mark as executing
-                command["status"] = "executing"
-                command["execution_start"] = datetime.now().isoformat()
+                _save_stack(user_id, command_stack)
+            
+            if not running:
+                break
+            
+            finished, _ = wait(running, timeout=remaining(), return_when=FIRST_COMPLETED)
+            for future in finished:
+                index = running.pop(future)
+                command = command_stack[index]
+                command["execution_end"] = datetime.now().isoformat()
                 
-                # Execute the command
-                result = command_engine(command["command"], command["args"])
+                try:
+                    result = future.result()
+                except Exception as e:
+                    # Mark as error
+                    command["status"] = "error"
+                    command["error"] = str(e)
+                    errors[index] = {
+                        "command": command["command"],
+                        "error": str(e),
+                        "is_required": command.get("is_required", False)
+                    }
+                    continue
                 
                 # Mark as complete
                 command["status"] = "done"
-                command["execution_end"] = datetime.now().isoformat()
                 command["result"] = result
                 
-                # Save result to long-term memory
-                summary = summarise_result(command["command"], result)
-                save_result(user_id, summary)
+                # Summarise and save to long-term memory in the background
+                enqueue_summary(user_id, command["command"], result)
                 
-                # Store result for later use
-                results.append({
+                results[index] = {
                     "command": command["command"],
                     "result": result,
                     "is_required": command.get("is_required", False)
-                })
-                
-                # Update cache immediately so next command can access this data
-                # Get existing execution_results and append new result
-                current_cache = get_current_cache(user_id)
-                existing_results = current_cache.get("execution_results", [])
-                existing_results.append({
-                    "command": command["command"],
-                    "result": result,
-                    "is_required": command.get("is_required", False)
-                })
-                
-                update_current_cache(user_id, {
-                    "execution_results": existing_results,
-                    "last_stack_update": datetime.now().isoformat()
-                })
-                
-            except Exception as e:
-                # Mark as error
-                command["status"] = "error"
-                command["execution_end"] = datetime.now().isoformat()
-                command["error"] = str(e)
+                }
                 
-                errors.append({
-                    "command": command["command"],
-                    "error": str(e),
-                    "is_required": command.get("is_required", False)
-                })
+                # Record the result so dependent commands can access it; _save_stack
+                # below writes it to the database along with the node's status
+                append_to_cache_list(user_id, "execution_results", [results[index]],
+                                     extra={"last_stack_update": datetime.now().isoformat()})
+            
+            _save_stack(user_id, command_stack)
+    finally:
+        # Don't hold the request for commands abandoned at the deadline
+        executor.shutdown(wait=not cancelled, cancel_futures=True)
+    
+    results = [results[index] for index in sorted(results)]
+    errors = [errors[index] for index in sorted(errors)]
+    
+    if cancelled:
+        # The deadline ran out: return what finished and which commands never completed
+        return {
+            "results": results,
+            "errors": errors,
+            "main_command_result": None,
+            "deadline_exceeded": True,
+            "status": "deadline_exceeded",
+            "cancelled_commands": cancelled
+        }
+    
+    if waiting_command is not None:
+        # Return early to let data collector handle the input
+        return {
+            "results": results,
+            "errors": errors,
+            "main_command_result": None,
+            "needs_input": True,
+            "missing_fields": waiting_command["missing_fields"],
+            "current_command": waiting_command["command"]
+        }
     
     # Update the database with final stack state
     update_current_cache(user_id, {
@@ -265,6 +405,7 @@ def execute_complete_stack(user_id, command_engine):
         "execution_results": results,
         "execution_errors": errors
     })
+    flush_current_cache(user_id)
     
     return {
         "results": results,
@@ -272,8 +413,24 @@ def execute_complete_stack(user_id, command_engine):
         "main_command_result": next((r["result"] for r in results if not r["is_required"]), None)
     }
 
-def resume_stack_execution(user_id, command_engine):
-    """Resume stack execution after data collection is complete"""
+def _apply_collected_input(user_id, filled):
+    """Give the paused command the fields the data collector gathered"""
+    if not filled:
+        return
+    command_stack = get_current_cache(user_id).get("command_stack", [])
+    for command in command_stack:
+        if command["command"] == filled.get("command") and command["status"] == "waiting_for_input":
+            command["args"].update(filled.get("args", {}))
+            command["status"] = "pending"
+            command.pop("missing_fields", None)
+            _save_stack(user_id, command_stack)
+            return
+
+def resume_stack_execution(user_id, command_engine, filled=None):
+    """
+    Resume stack execution after data collection is complete
+    filled is the completed entry from receive_input, if the caller already took it.
+    """
     from memory.data_collector import needs_more_input, receive_input
     
     # Check if we're still collecting data
@@ -281,6 +438,7 @@ def resume_stack_execution(user_id, command_engine):
         filled = receive_input(user_id, "")
         if filled:
             # Data collection complete, continue with stack execution
+            _apply_collected_input(user_id, filled)
             return execute_complete_stack(user_id, command_engine)
         else:
             # Still need more input
@@ -290,4 +448,5 @@ def resume_stack_execution(user_id, command_engine):
             }
     else:
         # No data collection in progress, execute the stack
-        return execute_complete_stack(user_id, command_engine)
\ No newline at end of file
+        _apply_collected_input(user_id, filled)
+        return execute_complete_stack(user_id, command_engine)
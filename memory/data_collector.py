@@ -1,37 +1,266 @@
+import os
+import json
+import time
+import threading
+from collections import OrderedDict
+from typing import Dict, Any, Optional
+from dotenv import load_dotenv
+from memory.db_pool import get_db_connection, ensure_schema
 from utils.field_extraction import extract_fields_from_text
 
-waiting_inputs = {}  # user_id → {command, args, missing_fields, field_meta}
+load_dotenv()
+
+# In-progress argument collection lives in Postgres so any worker can resume any
+# user's collection. Reads go through a small in-process cache; writes go straight
+# to the table and refresh this worker's cache. Another worker's write can take up
+# to DATA_COLLECTION_CACHE_TTL seconds to be seen by needs_more_input here, but
+# receive_input always reads and updates the stored row.
+
+# Database table name constant
+DATA_COLLECTION_DB = "data_collection"
+
+# Abandoned collections expire after this long
+DATA_COLLECTION_EXPIRY_HOURS = int(os.getenv("DATA_COLLECTION_EXPIRY_HOURS", "24"))
+# Seconds a cached read is trusted, and most users kept in the read cache
+DATA_COLLECTION_CACHE_TTL = float(os.getenv("DATA_COLLECTION_CACHE_TTL", "2"))
+DATA_COLLECTION_CACHE_MAX_SIZE = int(os.getenv("DATA_COLLECTION_CACHE_MAX_SIZE", "1000"))
+
+
+class CollectionCache:
+    """Thread-safe LRU of collection entries (None = not collecting), each trusted for a short TTL"""
+
+    def __init__(self, max_size: int = DATA_COLLECTION_CACHE_MAX_SIZE, ttl: float = DATA_COLLECTION_CACHE_TTL):
+        self.max_size = max(1, max_size)
+        self.ttl = ttl
+        self._lock = threading.Lock()
+        self._entries = OrderedDict()  # user_id → (entry or None, expires_at monotonic)
+        self._stats = {"hits": 0, "misses": 0, "expired": 0, "evictions": 0}
+
+    def get(self, user_id: str):
+        """(True, entry) on a hit, (False, None) on a miss"""
+        with self._lock:
+            cached = self._entries.get(user_id)
+            if cached is not None and cached[1] <= time.monotonic():
+                del self._entries[user_id]
+                self._stats["expired"] += 1
+                cached = None
+            if cached is None:
+                self._stats["misses"] += 1
+                return False, None
+            self._entries.move_to_end(user_id)
+            self._stats["hits"] += 1
+            return True, cached[0]
+
+    def set(self, user_id: str, entry: Optional[Dict[str, Any]]):
+        if self.ttl <= 0:
+            return
+        with self._lock:
+            self._entries[user_id] = (entry, time.monotonic() + self.ttl)
+            self._entries.move_to_end(user_id)
+            while len(self._entries) > self.max_size:
+                self._entries.popitem(last=False)
+                self._stats["evictions"] += 1
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+
+    def get_stats(self) -> Dict[str, Any]:
+        with self._lock:
+            stats = dict(self._stats)
+            stats.update({"size": len(self._entries), "max_size": self.max_size, "ttl": self.ttl})
+        lookups = stats["hits"] + stats["misses"]
+        stats["hit_rate"] = stats["hits"] / lookups if lookups else 0.0
+        return stats
+
+
+_collection_cache = CollectionCache()
+
+
+def _ensure_collection_table():
+    ensure_schema(DATA_COLLECTION_DB, [
+        f"""
+        CREATE TABLE IF NOT EXISTS {DATA_COLLECTION_DB} (
+            user_id TEXT PRIMARY KEY,
+            command TEXT NOT NULL,
+            args JSONB NOT NULL,
+            missing JSONB NOT NULL,
+            field_meta JSONB NOT NULL,
+            updated_at TIMESTAMPTZ NOT NULL DEFAULT now(),
+            expires_at TIMESTAMPTZ NOT NULL
+        )
+        """,
+        f"CREATE INDEX IF NOT EXISTS {DATA_COLLECTION_DB}_expires_idx ON {DATA_COLLECTION_DB} (expires_at)"
+    ])
+
+
+def _row_to_entry(row) -> Dict[str, Any]:
+    return {"command": row[0], "args": row[1], "missing": row[2], "field_meta": row[3]}
+
+
+def _load_entry(user_id, cursor=None, for_update=False) -> Optional[Dict[str, Any]]:
+    query = f"""
+        SELECT command, args, missing, field_meta FROM {DATA_COLLECTION_DB}
+        WHERE user_id = %s AND expires_at > now()
+        {"FOR UPDATE" if for_update else ""}
+    """
+    if cursor is not None:
+        cursor.execute(query, (user_id,))
+        row = cursor.fetchone()
+        return _row_to_entry(row) if row else None
+
+    _ensure_collection_table()
+    with get_db_connection() as conn:
+        cursor = conn.cursor()
+        cursor.execute(query, (user_id,))
+        row = cursor.fetchone()
+        cursor.close()
+    entry = _row_to_entry(row) if row else None
+    _collection_cache.set(user_id, entry)
+    return entry
+
+
+def get_collection(user_id) -> Optional[Dict[str, Any]]:
+    """Current collection entry {command, args, missing, field_meta} for a user, or None"""
+    hit, entry = _collection_cache.get(user_id)
+    if hit:
+        return entry
+    try:
+        return _load_entry(user_id)
+    except Exception as e:
+        print(f"Error reading data collection: {e}")
+        return None
+
 
 def needs_more_input(user_id):
-    return user_id in waiting_inputs
+    return get_collection(user_id) is not None
+
 
 def start_data_collection(user_id, command_name, args, missing_fields, required_fields):
-    waiting_inputs[user_id] = {
+    entry = {
         "command": command_name,
         "args": args,
-        "missing": missing_fields,
+        "missing": list(missing_fields),
         "field_meta": required_fields
     }
+    try:
+        _ensure_collection_table()
+        with get_db_connection() as conn:
+            cursor = conn.cursor()
+            cursor.execute(f"""
+                INSERT INTO {DATA_COLLECTION_DB} (user_id, command, args, missing, field_meta, updated_at, expires_at)
+                VALUES (%s, %s, %s, %s, %s, now(), now() + interval '{DATA_COLLECTION_EXPIRY_HOURS} hours')
+                ON CONFLICT (user_id)
+                DO UPDATE SET
+                    command = EXCLUDED.command,
+                    args = EXCLUDED.args,
+                    missing = EXCLUDED.missing,
+                    field_meta = EXCLUDED.field_meta,
+                    updated_at = EXCLUDED.updated_at,
+                    expires_at = EXCLUDED.expires_at
+            """, (user_id, command_name, json.dumps(args, default=str), json.dumps(entry["missing"]),
+                  json.dumps(required_fields, default=str)))
+            conn.commit()
+            cursor.close()
+        _collection_cache.set(user_id, entry)
+        return True
+
+    except Exception as e:
+        print(f"Error starting data collection: {e}")
+        return False
+
+
+def cancel_data_collection(user_id):
+    try:
+        _ensure_collection_table()
+        with get_db_connection() as conn:
+            cursor = conn.cursor()
+            cursor.execute(f"DELETE FROM {DATA_COLLECTION_DB} WHERE user_id = %s", (user_id,))
+            conn.commit()
+            cursor.close()
+        _collection_cache.set(user_id, None)
+        return True
+
+    except Exception as e:
+        print(f"Error cancelling data collection: {e}")
+        return False
+
+
+def _apply_extracted(user_id, extracted) -> Optional[Dict[str, Any]]:
+    """
+    Merge extracted fields into the stored entry under a row lock
+    Returns the completed entry (and removes it) once nothing is missing, else None.
+    """
+    with get_db_connection() as conn:
+        cursor = conn.cursor()
+        entry = _load_entry(user_id, cursor, for_update=True)
+        if entry is None:
+            conn.commit()
+            cursor.close()
+            _collection_cache.set(user_id, None)
+            return None
+
+        for key, value in extracted.items():
+            if key in entry["missing"]:
+                entry["args"][key] = value
+                entry["missing"].remove(key)
+
+        if not entry["missing"]:
+            cursor.execute(f"DELETE FROM {DATA_COLLECTION_DB} WHERE user_id = %s", (user_id,))
+        else:
+            cursor.execute(f"""
+                UPDATE {DATA_COLLECTION_DB}
+                SET args = %s, missing = %s, updated_at = now()
+                WHERE user_id = %s
+            """, (json.dumps(entry["args"], default=str), json.dumps(entry["missing"]), user_id))
+        conn.commit()
+        cursor.close()
+
+    if not entry["missing"]:
+        _collection_cache.set(user_id, None)
+        return entry
+    _collection_cache.set(user_id, entry)
+    return None
+
 
 def receive_input(user_id, user_message):
-    if user_id not in waiting_inputs:
-        return None
+    try:
+        # Always read the stored entry: the cached one may be another worker's stale view
+        _ensure_collection_table()
+        entry = _load_entry(user_id)
+        if entry is None:
+            return None
+
+        # 🔍 Use GPT to extract available fields from message (outside the row lock)
+        extracted = extract_fields_from_text(user_message, entry["field_meta"])
+
+        # ✅ If all fields filled, return full command
+        return _apply_extracted(user_id, extracted)
+
+    except Exception as e:
+        print(f"Error receiving collected input: {e}")
+        return None  # Still collecting
+
 
-    entry = waiting_inputs[user_id]
-    args = entry["args"]
-    required_fields = entry["field_meta"]
-    missing = entry["missing"]
+def get_collection_cache_stats() -> Dict[str, Any]:
+    """Read cache counters for this process"""
+    return _collection_cache.get_stats()
 
-    # 🔍 Use GPT to extract available fields from message
-    extracted = extract_fields_from_text(user_message, required_fields)
 
-    for key, value in extracted.items():
-        if key in missing:
-            args[key] = value
-            missing.remove(key)
+def cleanup_data_collections() -> int:
+    """Remove expired (abandoned) collections"""
+    try:
+        _ensure_collection_table()
+        with get_db_connection() as conn:
+            cursor = conn.cursor()
+            cursor.execute(f"DELETE FROM {DATA_COLLECTION_DB} WHERE expires_at <= now()")
+            deleted_count = cursor.rowcount
+            conn.commit()
+            cursor.close()
 
-    # ✅ If all fields filled, return full command
-    if not missing:
-        return waiting_inputs.pop(user_id)
+        print(f"Cleaned up {deleted_count} data collections")
+        return deleted_count
 
-    return None  # Still collecting
\ No newline at end of file
+    except Exception as e:
+        print(f"Error cleaning up data collections: {e}")
+        return 0
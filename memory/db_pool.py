@@ -0,0 +1,274 @@
+import os
+import time
+import threading
+from contextlib import contextmanager
+from typing import Dict, Any
+import psycopg2
+from psycopg2 import extensions
+from dotenv import load_dotenv
+
+load_dotenv()
+
+# Pool configuration (all overridable through the environment)
+DB_POOL_MIN_SIZE = int(os.getenv("DB_POOL_MIN_SIZE", "1"))
+DB_POOL_MAX_SIZE = int(os.getenv("DB_POOL_MAX_SIZE", "10"))
+DB_POOL_TIMEOUT = float(os.getenv("DB_POOL_TIMEOUT", "10"))  # max seconds a caller waits for a connection
+DB_POOL_HEALTHCHECK_AFTER = float(os.getenv("DB_POOL_HEALTHCHECK_AFTER", "30"))  # idle seconds before a ping
+
+
+class PoolTimeout(Exception):
+    """Raised when no connection becomes available within the pool timeout"""
+
+
+class ConnectionPool:
+    """
+    Thread-safe pool of psycopg2 connections
+    Connections are created lazily up to max_size, pinged before reuse once they
+    have been idle for a while, and discarded if they come back broken.
+    """
+
+    def __init__(self, dsn: str, min_size: int = DB_POOL_MIN_SIZE, max_size: int = DB_POOL_MAX_SIZE,
+                 timeout: float = DB_POOL_TIMEOUT, healthcheck_after: float = DB_POOL_HEALTHCHECK_AFTER):
+        self.dsn = dsn
+        self.min_size = max(0, min(min_size, max_size))
+        self.max_size = max(1, max_size)
+        self.timeout = timeout
+        self.healthcheck_after = healthcheck_after
+        self.pid = os.getpid()
+
+        self._cond = threading.Condition()
+        self._idle = []  # [(connection, last_used_monotonic)]
+        self._size = 0  # open connections, idle + checked out
+        self._waiting = 0
+        self._stats = {
+            "checkouts": 0,
+            "timeouts": 0,
+            "connections_created": 0,
+            "connections_discarded": 0,
+            "healthcheck_failures": 0,
+            "wait_time_total": 0.0,
+            "wait_time_max": 0.0,
+            "checkout_time_total": 0.0,
+            "checkout_time_max": 0.0
+        }
+        self._checked_out = {}  # id(connection) → checkout time
+
+        for _ in range(self.min_size):
+            try:
+                conn = self._connect()
+            except Exception as e:
+                print(f"Error pre-filling connection pool: {e}")
+                break
+            with self._cond:
+                self._size += 1
+                self._idle.append((conn, time.monotonic()))
+
+    def _connect(self):
+        conn = psycopg2.connect(self.dsn)
+        with self._cond:
+            self._stats["connections_created"] += 1
+        return conn
+
+    def _discard(self, conn):
+        try:
+            conn.close()
+        except Exception:
+            pass
+        with self._cond:
+            self._stats["connections_discarded"] += 1
+
+    def _is_healthy(self, conn, last_used: float) -> bool:
+        """Cheap check for closed connections, plus a ping if the connection sat idle"""
+        if conn.closed:
+            return False
+        if time.monotonic() - last_used < self.healthcheck_after:
+            return True
+        try:
+            cursor = conn.cursor()
+            cursor.execute("SELECT 1")
+            cursor.close()
+            conn.rollback()
+            return True
+        except Exception:
+            with self._cond:
+                self._stats["healthcheck_failures"] += 1
+            return False
+
+    def getconn(self):
+        """Check out a connection, waiting at most `timeout` seconds"""
+        start = time.monotonic()
+        deadline = start + self.timeout
+
+        conn = None
+        last_used = None
+        with self._cond:
+            while True:
+                if self._idle:
+                    conn, last_used = self._idle.pop()
+                    break
+                if self._size < self.max_size:
+                    # Reserve a slot, the connection is opened outside the lock
+                    self._size += 1
+                    break
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    self._stats["timeouts"] += 1
+                    raise PoolTimeout(
+                        f"No database connection available after {self.timeout:.1f}s "
+                        f"(pool size {self.max_size})"
+                    )
+                self._waiting += 1
+                try:
+                    self._cond.wait(remaining)
+                finally:
+                    self._waiting -= 1
+
+        if conn is not None and not self._is_healthy(conn, last_used):
+            # Drop the dead connection but keep its slot for a fresh one
+            self._discard(conn)
+            conn = None
+
+        if conn is None:
+            try:
+                conn = self._connect()
+            except Exception:
+                with self._cond:
+                    self._size -= 1
+                    self._cond.notify()
+                raise
+
+        wait_time = time.monotonic() - start
+        with self._cond:
+            self._stats["checkouts"] += 1
+            self._stats["wait_time_total"] += wait_time
+            self._stats["wait_time_max"] = max(self._stats["wait_time_max"], wait_time)
+            self._checked_out[id(conn)] = time.monotonic()
+        return conn
+
+    def putconn(self, conn):
+        """Return a connection to the pool, rolling back any open transaction"""
+        with self._cond:
+            checked_out_at = self._checked_out.pop(id(conn), None)
+            if checked_out_at is not None:
+                held = time.monotonic() - checked_out_at
+                self._stats["checkout_time_total"] += held
+                self._stats["checkout_time_max"] = max(self._stats["checkout_time_max"], held)
+
+        reusable = not conn.closed
+        if reusable:
+            try:
+                if conn.info.transaction_status != extensions.TRANSACTION_STATUS_IDLE:
+                    conn.rollback()
+            except Exception:
+                reusable = False
+
+        if not reusable:
+            self._discard(conn)
+
+        with self._cond:
+            if reusable:
+                self._idle.append((conn, time.monotonic()))
+            else:
+                self._size -= 1
+            self._cond.notify()
+
+    def closeall(self):
+        """Close every idle connection (checked out ones are closed when returned)"""
+        with self._cond:
+            idle, self._idle = self._idle, []
+            self._size -= len(idle)
+        for conn, _ in idle:
+            try:
+                conn.close()
+            except Exception:
+                pass
+
+    def get_stats(self) -> Dict[str, Any]:
+        with self._cond:
+            stats = dict(self._stats)
+            stats.update({
+                "min_size": self.min_size,
+                "max_size": self.max_size,
+                "size": self._size,
+                "idle": len(self._idle),
+                "in_use": self._size - len(self._idle),
+                "waiting": self._waiting
+            })
+        checkouts = stats["checkouts"]
+        stats["wait_time_avg"] = stats["wait_time_total"] / checkouts if checkouts else 0.0
+        stats["checkout_time_avg"] = stats["checkout_time_total"] / checkouts if checkouts else 0.0
+        return stats
+
+
+_pool = None
+_pool_lock = threading.Lock()
+
+
+def get_pool() -> ConnectionPool:
+    """Get the process-wide pool, creating it on first use (and again after a fork)"""
+    global _pool
+    pool = _pool
+    if pool is not None and pool.pid == os.getpid():
+        return pool
+
+    with _pool_lock:
+        if _pool is None or _pool.pid != os.getpid():
+            # Connections inherited from a parent process must not be shared, so
+            # a forked worker simply starts its own pool
+            _pool = ConnectionPool(os.getenv('DATABASE_URL'))
+        return _pool
+
+
+@contextmanager
+def get_db_connection():
+    """
+    Borrow a pooled connection to the database using Railway's injected DATABASE_URL
+    The connection goes back to the pool when the block exits, even on errors.
+    """
+    pool = get_pool()
+    conn = pool.getconn()
+    try:
+        yield conn
+    finally:
+        pool.putconn(conn)
+
+
+def get_pool_stats() -> Dict[str, Any]:
+    """Get pool size, checkout and wait metrics for this process"""
+    pool = _pool
+    if pool is None or pool.pid != os.getpid():
+        return {"status": "not_initialized"}
+    return pool.get_stats()
+
+
+def close_pool():
+    """Close the process-wide pool"""
+    global _pool
+    with _pool_lock:
+        if _pool is not None:
+            _pool.closeall()
+            _pool = None
+
+
+_ensured_schemas = set()
+_schema_lock = threading.Lock()
+
+
+def ensure_schema(name: str, statements):
+    """
+    Run idempotent DDL (CREATE ... IF NOT EXISTS) once per process
+    An advisory lock keeps concurrent workers from racing on the same objects.
+    """
+    if name in _ensured_schemas:
+        return
+    with _schema_lock:
+        if name in _ensured_schemas:
+            return
+        with get_db_connection() as conn:
+            cursor = conn.cursor()
+            cursor.execute("SELECT pg_advisory_xact_lock(hashtext(%s))", (name,))
+            for statement in statements:
+                cursor.execute(statement)
+            conn.commit()
+            cursor.close()
+        _ensured_schemas.add(name)
@@ -0,0 +1,164 @@
+import os
+import json
+from datetime import datetime, timedelta, timezone
+from typing import Dict, Any, Optional
+from dotenv import load_dotenv
+from memory.db_pool import get_db_connection, ensure_schema
+
+load_dotenv()
+
+# Database table name constant
+FUNDAMENTALS_CACHE_DB = "fundamentals_cache"
+
+# Fundamentals only move around earnings, so entries are kept for days
+FUNDAMENTALS_CACHE_DAYS = float(os.getenv("FUNDAMENTALS_CACHE_DAYS", "7"))
+# Right after a report the numbers are still being updated upstream, so re-check sooner
+FUNDAMENTALS_POST_EARNINGS_HOURS = float(os.getenv("FUNDAMENTALS_POST_EARNINGS_HOURS", "12"))
+POST_EARNINGS_WINDOW = timedelta(days=3)
+
+
+def _ensure_fundamentals_table():
+    ensure_schema(FUNDAMENTALS_CACHE_DB, [
+        f"""
+        CREATE TABLE IF NOT EXISTS {FUNDAMENTALS_CACHE_DB} (
+            symbol TEXT NOT NULL,
+            kind TEXT NOT NULL,
+            data JSONB NOT NULL,
+            next_earnings_date TIMESTAMPTZ,
+            fetched_at TIMESTAMPTZ NOT NULL DEFAULT now(),
+            expires_at TIMESTAMPTZ NOT NULL,
+            PRIMARY KEY (symbol, kind)
+        )
+        """
+    ])
+
+
+def extract_next_earnings_date(quote_summary: Dict[str, Any]) -> Optional[datetime]:
+    """Earliest upcoming earnings date from a quoteSummary result (earningsChart or calendarEvents)"""
+    if not isinstance(quote_summary, dict):
+        return None
+
+    candidates = []
+    earnings_chart = (quote_summary.get("earnings") or {}).get("earningsChart") or {}
+    calendar_earnings = (quote_summary.get("calendarEvents") or {}).get("earnings") or {}
+    # get_earnings caches the `earnings` module itself, so accept that shape too
+    chart = quote_summary.get("earningsChart") or {}
+    for source in (earnings_chart, calendar_earnings, chart):
+        for entry in source.get("earningsDate") or []:
+            raw = entry.get("raw") if isinstance(entry, dict) else entry
+            if isinstance(raw, (int, float)):
+                candidates.append(datetime.fromtimestamp(raw, tz=timezone.utc))
+
+    if not candidates:
+        return None
+    upcoming = [date for date in candidates if date >= datetime.now(timezone.utc) - POST_EARNINGS_WINDOW]
+    return min(upcoming) if upcoming else max(candidates)
+
+
+def compute_expiry(next_earnings_date: Optional[datetime], now: datetime = None) -> datetime:
+    """
+    When a cached entry should be refetched
+    Normally FUNDAMENTALS_CACHE_DAYS out, but never past the day after the next
+    earnings report, and only a few hours while a report is fresh.
+    """
+    now = now or datetime.now(timezone.utc)
+    expires_at = now + timedelta(days=FUNDAMENTALS_CACHE_DAYS)
+    if next_earnings_date is None:
+        return expires_at
+
+    if next_earnings_date <= now:
+        if now - next_earnings_date < POST_EARNINGS_WINDOW:
+            return now + timedelta(hours=FUNDAMENTALS_POST_EARNINGS_HOURS)
+        return expires_at
+
+    return min(expires_at, next_earnings_date + timedelta(days=1))
+
+
+def get_cached_fundamentals(symbol: str, kind: str) -> Optional[Dict[str, Any]]:
+    """Cached data for (symbol, kind) if it hasn't expired, otherwise None"""
+    try:
+        _ensure_fundamentals_table()
+        with get_db_connection() as conn:
+            cursor = conn.cursor()
+            cursor.execute(f"""
+                SELECT data FROM {FUNDAMENTALS_CACHE_DB}
+                WHERE symbol = %s AND kind = %s AND expires_at > now()
+            """, (symbol, kind))
+            result = cursor.fetchone()
+            cursor.close()
+
+        return result[0] if result else None
+
+    except Exception as e:
+        print(f"Error reading fundamentals cache: {e}")
+        return None
+
+
+def get_known_earnings_date(symbol: str) -> Optional[datetime]:
+    """Next earnings date recorded by any cached entry for the symbol"""
+    try:
+        _ensure_fundamentals_table()
+        with get_db_connection() as conn:
+            cursor = conn.cursor()
+            cursor.execute(f"""
+                SELECT max(next_earnings_date) FROM {FUNDAMENTALS_CACHE_DB}
+                WHERE symbol = %s
+            """, (symbol,))
+            result = cursor.fetchone()
+            cursor.close()
+
+        return result[0] if result else None
+
+    except Exception as e:
+        print(f"Error reading earnings date: {e}")
+        return None
+
+
+def save_fundamentals(symbol: str, kind: str, data: Dict[str, Any],
+                      next_earnings_date: Optional[datetime] = None) -> bool:
+    """Cache data for (symbol, kind), expiring around the symbol's next earnings date"""
+    try:
+        if next_earnings_date is None:
+            next_earnings_date = extract_next_earnings_date(data) or get_known_earnings_date(symbol)
+        expires_at = compute_expiry(next_earnings_date)
+
+        _ensure_fundamentals_table()
+        with get_db_connection() as conn:
+            cursor = conn.cursor()
+            cursor.execute(f"""
+                INSERT INTO {FUNDAMENTALS_CACHE_DB}
+                (symbol, kind, data, next_earnings_date, fetched_at, expires_at)
+                VALUES (%s, %s, %s, %s, now(), %s)
+                ON CONFLICT (symbol, kind)
+                DO UPDATE SET
+                    data = EXCLUDED.data,
+                    next_earnings_date = EXCLUDED.next_earnings_date,
+                    fetched_at = EXCLUDED.fetched_at,
+                    expires_at = EXCLUDED.expires_at
+            """, (symbol, kind, json.dumps(data), next_earnings_date, expires_at))
+            conn.commit()
+            cursor.close()
+        return True
+
+    except Exception as e:
+        print(f"Error saving fundamentals cache: {e}")
+        return False
+
+
+def cleanup_fundamentals_cache() -> int:
+    """Remove expired fundamentals entries"""
+    try:
+        _ensure_fundamentals_table()
+        with get_db_connection() as conn:
+            cursor = conn.cursor()
+            cursor.execute(f"DELETE FROM {FUNDAMENTALS_CACHE_DB} WHERE expires_at <= now()")
+            deleted_count = cursor.rowcount
+            conn.commit()
+            cursor.close()
+
+        print(f"Cleaned up {deleted_count} fundamentals cache entries")
+        return deleted_count
+
+    except Exception as e:
+        print(f"Error cleaning up fundamentals cache: {e}")
+        return 0
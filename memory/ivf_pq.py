@@ -0,0 +1,277 @@
+# memory/ivf_pq.py
+# Approximate search for VectorIndex at million-entry scale. Vectors are grouped by
+# their nearest coarse k-means centroid (the inverted file, IVF), and each one is
+# stored as a product-quantized (PQ) code of its residual from that centroid, one
+# byte per sub-vector. A query scans only its nprobe nearest clusters, scoring codes
+# with a per-query lookup table, and VectorIndex re-scores the best candidates
+# exactly against the full vectors.
+#
+# The model is trained from the index's matrix and written next to it under a new
+# version; the small model file is swapped in last, so other processes pick up a
+# complete model on their next search. Rows added after training, and rows whose
+# vector was overwritten since (an upsert), are encoded in memory by each process
+# until the next retrain; overwritten rows' trained codes are skipped as stale.
+
+import os
+import glob
+import time
+import threading
+from typing import Optional
+import numpy as np
+from dotenv import load_dotenv
+
+load_dotenv()
+
+# Clusters in the inverted file (0 = about 4 * sqrt(entries))
+ANN_NLIST = int(os.getenv("ANN_NLIST", "0"))
+# Clusters scanned per query: more is slower and more accurate
+ANN_NPROBE = int(os.getenv("ANN_NPROBE", "16"))
+# Bytes per vector code (0 = one per 8 dimensions)
+ANN_PQ_SUBVECTORS = int(os.getenv("ANN_PQ_SUBVECTORS", "0"))
+# Vectors sampled to train the clusters, and the PQ codebooks
+ANN_TRAIN_SAMPLE = int(os.getenv("ANN_TRAIN_SAMPLE", "100000"))
+ANN_PQ_TRAIN_SAMPLE = int(os.getenv("ANN_PQ_TRAIN_SAMPLE", "32768"))
+ANN_KMEANS_ITERATIONS = int(os.getenv("ANN_KMEANS_ITERATIONS", "10"))
+
+PQ_CENTROIDS = 256  # codes are one byte
+ENCODE_CHUNK_ROWS = 8192
+
+MODEL_FILE = "ivfpq.npz"
+
+
+def nearest(x: np.ndarray, centroids: np.ndarray) -> np.ndarray:
+    """Index of the nearest (L2) centroid for each row of x"""
+    # argmin |x - c|^2 == argmax x.c - |c|^2 / 2
+    half_norms = 0.5 * np.einsum("ij,ij->i", centroids, centroids)
+    assign = np.empty(len(x), dtype=np.int32)
+    for start in range(0, len(x), ENCODE_CHUNK_ROWS):
+        scores = x[start:start + ENCODE_CHUNK_ROWS] @ centroids.T
+        scores -= half_norms
+        assign[start:start + ENCODE_CHUNK_ROWS] = scores.argmax(axis=1)
+    return assign
+
+
+def kmeans(x: np.ndarray, k: int, iterations: int = ANN_KMEANS_ITERATIONS, seed: int = 0) -> np.ndarray:
+    """Lloyd's k-means; empty clusters are re-seeded from random points"""
+    rng = np.random.default_rng(seed)
+    k = min(k, len(x))
+    centroids = x[rng.choice(len(x), k, replace=False)].astype(np.float32)
+    for _ in range(iterations):
+        assign = nearest(x, centroids)
+        counts = np.bincount(assign, minlength=k)
+        present = np.flatnonzero(counts)
+        starts = np.concatenate(([0], np.cumsum(counts[present])[:-1]))
+        sums = np.add.reduceat(x[np.argsort(assign, kind="stable")], starts, axis=0)
+        centroids[present] = sums / counts[present, None]
+        empty = np.flatnonzero(counts == 0)
+        if len(empty):
+            centroids[empty] = x[rng.choice(len(x), len(empty), replace=False)]
+    return centroids
+
+
+def default_nlist(entries: int) -> int:
+    return ANN_NLIST or int(min(65536, max(16, 4 * np.sqrt(entries))))
+
+
+def default_subvectors(dim: int) -> int:
+    wanted = ANN_PQ_SUBVECTORS or max(1, dim // 8)
+    # Sub-vectors must split the dimensions evenly
+    return max(m for m in range(1, min(wanted, dim) + 1) if dim % m == 0)
+
+
+class IVFPQ:
+    """IVF-PQ model for one VectorIndex directory"""
+
+    def __init__(self, path: str):
+        self.path = path
+        self._lock = threading.Lock()
+        self._model_path = os.path.join(path, MODEL_FILE)
+        self._loaded_mtime = None
+        self.version = None
+        self.trained_rows = 0
+        self.trained_at = 0.0
+        self.trained_seq = 0  # VectorIndex overwrite sequence the model's codes reflect
+        # Rows added or overwritten since training, encoded by this process
+        self.updated_seq = 0
+        self._tail_end = 0
+        self._tail = (np.empty(0, np.int64), np.empty(0, np.int32), np.empty((0, 0), np.uint8))
+        self._stale = np.empty(0, np.int64)  # trained rows whose stored code is out of date
+
+    def load(self) -> bool:
+        """(Re)load the model if it changed on disk; False if there is no model"""
+        try:
+            mtime = os.stat(self._model_path).st_mtime_ns
+        except FileNotFoundError:
+            return False
+        if mtime == self._loaded_mtime:
+            return True
+
+        with self._lock:
+            if mtime == self._loaded_mtime:
+                return True
+            with np.load(self._model_path) as model:
+                version = str(model["version"])
+                self.centroids = model["centroids"]
+                self.codebooks = model["codebooks"]
+                self.offsets = model["offsets"]
+                self.trained_rows = int(model["trained_rows"])
+                self.trained_at = float(model["trained_at"])
+                self.trained_seq = int(model["trained_seq"]) if "trained_seq" in model.files else 0
+            subvectors = self.codebooks.shape[0]
+            self._rows = np.memmap(self._data_path(version, "rows"), dtype=np.int64, mode="r",
+                                   shape=(self.trained_rows,)) if self.trained_rows else np.empty(0, np.int64)
+            self._codes = np.memmap(self._data_path(version, "codes"), dtype=np.uint8, mode="r",
+                                    shape=(self.trained_rows, subvectors)) if self.trained_rows else np.empty((0, subvectors), np.uint8)
+            self._tail_end = self.trained_rows
+            self._tail = (np.empty(0, np.int64), np.empty(0, np.int32), np.empty((0, subvectors), np.uint8))
+            self._stale = np.empty(0, np.int64)
+            self.updated_seq = self.trained_seq
+            self.version = version
+            self._loaded_mtime = mtime
+        return True
+
+    @property
+    def dim(self) -> int:
+        return self.centroids.shape[1]
+
+    @property
+    def nlist(self) -> int:
+        return self.centroids.shape[0]
+
+    def _data_path(self, version: str, kind: str) -> str:
+        return os.path.join(self.path, f"ivfpq_{kind}.{version}.bin")
+
+    def encode(self, vectors: np.ndarray, centroids: np.ndarray = None, codebooks: np.ndarray = None):
+        """(cluster assignment, PQ codes) for unit vectors"""
+        centroids = self.centroids if centroids is None else centroids
+        codebooks = self.codebooks if codebooks is None else codebooks
+        subvectors, _, width = codebooks.shape
+        assign = nearest(vectors, centroids)
+        residuals = vectors - centroids[assign]
+        codes = np.empty((len(vectors), subvectors), dtype=np.uint8)
+        for m in range(subvectors):
+            codes[:, m] = nearest(residuals[:, m * width:(m + 1) * width], codebooks[m])
+        return assign, codes
+
+    def train(self, matrix: np.ndarray, count: int, overwrite_seq: int = 0, nlist: int = None,
+              subvectors: int = None, seed: int = 0):
+        """
+        Train clusters and codebooks on a sample of matrix[:count], encode every row and publish the model
+        overwrite_seq is the index's overwrite sequence read before the matrix, so the codes reflect every
+        overwrite up to it.
+        """
+        dim = matrix.shape[1]
+        nlist = min(nlist or default_nlist(count), count)
+        subvectors = subvectors or default_subvectors(dim)
+        rng = np.random.default_rng(seed)
+
+        sample = np.sort(rng.choice(count, min(count, max(ANN_TRAIN_SAMPLE, nlist * 4)), replace=False))
+        train_vectors = np.asarray(matrix[sample], dtype=np.float32)
+        centroids = kmeans(train_vectors, nlist, seed=seed)
+
+        pq_sample = train_vectors[rng.choice(len(train_vectors), min(len(train_vectors), ANN_PQ_TRAIN_SAMPLE), replace=False)]
+        residuals = pq_sample - centroids[nearest(pq_sample, centroids)]
+        width = dim // subvectors
+        codebooks = np.zeros((subvectors, PQ_CENTROIDS, width), dtype=np.float32)
+        for m in range(subvectors):
+            trained = kmeans(np.ascontiguousarray(residuals[:, m * width:(m + 1) * width]), PQ_CENTROIDS, seed=seed + m)
+            codebooks[m, :len(trained)] = trained
+
+        # Encode everything, then lay codes out contiguously per cluster
+        assign = np.empty(count, dtype=np.int32)
+        codes = np.empty((count, subvectors), dtype=np.uint8)
+        for start in range(0, count, ENCODE_CHUNK_ROWS):
+            end = min(start + ENCODE_CHUNK_ROWS, count)
+            assign[start:end], codes[start:end] = self.encode(np.asarray(matrix[start:end], dtype=np.float32),
+                                                              centroids, codebooks)
+        order = np.argsort(assign, kind="stable")
+        offsets = np.concatenate(([0], np.cumsum(np.bincount(assign, minlength=len(centroids))))).astype(np.int64)
+
+        version = f"{int(time.time() * 1000)}_{os.getpid()}"
+        order.astype(np.int64).tofile(self._data_path(version, "rows"))
+        codes[order].tofile(self._data_path(version, "codes"))
+        temp_path = f"{self._model_path}.{version}.npz"
+        np.savez(temp_path, version=version, centroids=centroids, codebooks=codebooks, offsets=offsets,
+                 trained_rows=count, trained_at=time.time(), trained_seq=overwrite_seq)
+        os.replace(temp_path, self._model_path)
+
+        # Processes still mapping old versions keep reading them until they reload
+        for old in glob.glob(os.path.join(self.path, "ivfpq_*.bin")):
+            if f".{version}." not in old:
+                os.remove(old)
+        self.load()
+
+    def extend(self, matrix: np.ndarray, count: int):
+        """Encode rows added since training (or since the last extend) into this process's tail"""
+        if count <= self._tail_end:
+            return
+        with self._lock:
+            start = self._tail_end
+            if count <= start:
+                return
+            rows, assign, codes = self._tail
+            new_assign, new_codes = self.encode(np.asarray(matrix[start:count], dtype=np.float32))
+            self._tail = (np.concatenate((rows, np.arange(start, count, dtype=np.int64))),
+                          np.concatenate((assign, new_assign)),
+                          np.concatenate((codes, new_codes)))
+            self._tail_end = count
+
+    def refresh_rows(self, matrix: np.ndarray, rows, seq: int):
+        """Re-encode overwritten rows into the tail, marking their trained codes stale, up to overwrite seq"""
+        with self._lock:
+            rows = np.unique(np.asarray(rows, dtype=np.int64))
+            # Rows this process hasn't reached yet are encoded with their current vector by extend
+            rows = rows[rows < self._tail_end]
+            if len(rows):
+                new_assign, new_codes = self.encode(np.asarray(matrix[rows], dtype=np.float32))
+                tail_rows, tail_assign, tail_codes = self._tail
+                keep = ~np.isin(tail_rows, rows)
+                self._tail = (np.concatenate((tail_rows[keep], rows)),
+                              np.concatenate((tail_assign[keep], new_assign)),
+                              np.concatenate((tail_codes[keep], new_codes)))
+                self._stale = np.union1d(self._stale, rows[rows < self.trained_rows])
+            self.updated_seq = max(self.updated_seq, seq)
+
+    def changed_rows(self, count: int) -> int:
+        """Rows added (of count) or overwritten since training, as far as this process has seen"""
+        return max(0, max(count, self._tail_end) - self.trained_rows) + len(self._stale)
+
+    def candidates(self, query: np.ndarray, nprobe: int = ANN_NPROBE, limit: int = 100) -> np.ndarray:
+        """Rows of the ~limit best approximate matches for a unit query vector"""
+        subvectors, _, width = self.codebooks.shape
+        coarse = self.centroids @ query
+        nprobe = max(1, min(nprobe, self.nlist))
+        probe = np.argpartition(coarse, self.nlist - nprobe)[self.nlist - nprobe:]
+
+        # query . x ~= query . centroid + sum over sub-vectors of query_m . codebook_m[code_m]
+        table = np.einsum("md,mkd->mk", query.reshape(subvectors, width), self.codebooks).ravel()
+        table_offsets = np.arange(subvectors) * PQ_CENTROIDS
+
+        rows, scores = [], []
+        for cluster in probe:
+            start, end = self.offsets[cluster], self.offsets[cluster + 1]
+            if start == end:
+                continue
+            members, codes = self._rows[start:end], self._codes[start:end]
+            if len(self._stale):
+                # Overwritten rows are scored from their fresh code in the tail instead
+                current = ~np.isin(members, self._stale)
+                members, codes = members[current], codes[current]
+            rows.append(members)
+            scores.append(coarse[cluster] + table[codes + table_offsets].sum(axis=1))
+
+        tail_rows, tail_assign, tail_codes = self._tail
+        if len(tail_rows):
+            in_probe = np.isin(tail_assign, probe)
+            rows.append(tail_rows[in_probe])
+            scores.append(coarse[tail_assign[in_probe]] + table[tail_codes[in_probe] + table_offsets].sum(axis=1))
+
+        if not rows:
+            return np.empty(0, np.int64)
+        rows, scores = np.concatenate(rows), np.concatenate(scores)
+        if len(rows) > limit:
+            rows = rows[np.argpartition(scores, len(rows) - limit)[len(rows) - limit:]]
+        return rows
+
+    def age(self) -> Optional[float]:
+        return time.time() - self.trained_at if self.version else None
@@ -1,3 +1,222 @@
+# memory/knowledge_memory.py
+# Knowledge retrieval for prompts: documents are embedded once and stored in the
+# local vector index (memory/vector_index.py); get_vector_matches embeds the message
+# and returns the closest documents. Embeddings are cached on disk by model and text,
+# so re-adding a document or repeating a query doesn't call the API again.
+#
+# Add documents from code with add_knowledge(...) or from the shell:
+#   python -m memory.knowledge_memory add notes.md research/*.txt
+# With KNOWLEDGE_INDEX_MODE=ivfpq large indexes are searched approximately (see
+# memory/ivf_pq.py); the model trains itself in the background, or on demand with:
+#   python -m memory.knowledge_memory retrain
+
+import os
+import sys
+import time
+import sqlite3
+import hashlib
+import threading
+from typing import Dict, List, Any
+import numpy as np
+from dotenv import load_dotenv
+from memory.vector_index import VectorIndex
+
+load_dotenv()
+
+# Where the index and embedding cache live (must be a persistent volume in production)
+KNOWLEDGE_INDEX_DIR = os.getenv("KNOWLEDGE_INDEX_DIR", "data/knowledge")
+# "exact" (brute force) or "ivfpq" (approximate once the index passes ANN_MIN_ENTRIES)
+KNOWLEDGE_INDEX_MODE = os.getenv("KNOWLEDGE_INDEX_MODE", "exact").lower()
+KNOWLEDGE_TOP_K = int(os.getenv("KNOWLEDGE_TOP_K", "5"))
+# Matches below this cosine similarity are left out of prompts
+KNOWLEDGE_MIN_SCORE = float(os.getenv("KNOWLEDGE_MIN_SCORE", "0.3"))
+# Characters of each matched document shown in prompts
+KNOWLEDGE_SNIPPET_CHARS = int(os.getenv("KNOWLEDGE_SNIPPET_CHARS", "600"))
+
+EMBEDDING_BATCH_SIZE = int(os.getenv("EMBEDDING_BATCH_SIZE", "100"))
+EMBEDDING_CACHE_MAX_ENTRIES = int(os.getenv("EMBEDDING_CACHE_MAX_ENTRIES", "200000"))
+
+NO_MATCHES = "No matching docs found"
+
+_index_lock = threading.Lock()
+_state = {"index": None, "cache": None}
+
+
+class EmbeddingCache:
+    """On-disk (SQLite) cache of embeddings keyed by model and text, pruned least recently used first"""
+
+    # Check the size limit once per this many writes
+    PRUNE_EVERY = 500
+
+    def __init__(self, path: str, max_entries: int = EMBEDDING_CACHE_MAX_ENTRIES):
+        self.path = path
+        self.max_entries = max(1, max_entries)
+        self._local = threading.local()
+        self._lock = threading.Lock()
+        self._writes = 0
+        with self._connection() as conn:
+            conn.execute("""
+                CREATE TABLE IF NOT EXISTS embeddings (
+                    key TEXT PRIMARY KEY,
+                    vector BLOB NOT NULL,
+                    last_used REAL NOT NULL
+                )
+            """)
+            conn.execute("CREATE INDEX IF NOT EXISTS embeddings_last_used_idx ON embeddings (last_used)")
+
+    def _connection(self):
+        conn = getattr(self._local, "conn", None)
+        if conn is None or self._local.pid != os.getpid():
+            conn = sqlite3.connect(self.path, timeout=30)
+            conn.execute("PRAGMA journal_mode=WAL")
+            self._local.conn, self._local.pid = conn, os.getpid()
+        return conn
+
+    @staticmethod
+    def key(model: str, dimensions: int, text: str) -> str:
+        return hashlib.sha256(f"{model}:{dimensions}:{text}".encode("utf-8")).hexdigest()
+
+    def get_many(self, keys: List[str]) -> Dict[str, np.ndarray]:
+        found = {}
+        with self._connection() as conn:
+            for start in range(0, len(keys), 500):
+                batch = keys[start:start + 500]
+                placeholders = ",".join("?" * len(batch))
+                rows = conn.execute(f"SELECT key, vector FROM embeddings WHERE key IN ({placeholders})",
+                                    batch).fetchall()
+                if rows:
+                    conn.execute(f"UPDATE embeddings SET last_used = ? WHERE key IN ({placeholders})",
+                                 [time.time()] + batch)
+                for key, blob in rows:
+                    found[key] = np.frombuffer(blob, dtype=np.float32)
+        return found
+
+    def put_many(self, entries: Dict[str, np.ndarray]):
+        now = time.time()
+        with self._connection() as conn:
+            conn.executemany("INSERT OR REPLACE INTO embeddings (key, vector, last_used) VALUES (?, ?, ?)",
+                             [(key, np.asarray(vector, dtype=np.float32).tobytes(), now)
+                              for key, vector in entries.items()])
+        with self._lock:
+            self._writes += len(entries)
+            prune = self._writes >= self.PRUNE_EVERY
+            if prune:
+                self._writes = 0
+        if prune:
+            self.prune()
+
+    def prune(self) -> int:
+        with self._connection() as conn:
+            cursor = conn.execute("""
+                DELETE FROM embeddings WHERE key IN (
+                    SELECT key FROM embeddings ORDER BY last_used DESC LIMIT -1 OFFSET ?
+                )
+            """, (self.max_entries,))
+            return cursor.rowcount
+
+
+def _get_store():
+    with _index_lock:
+        if _state["index"] is None:
+            _state["index"] = VectorIndex(KNOWLEDGE_INDEX_DIR, ann=KNOWLEDGE_INDEX_MODE == "ivfpq")
+            _state["cache"] = EmbeddingCache(os.path.join(KNOWLEDGE_INDEX_DIR, "embeddings.sqlite"))
+        return _state["index"], _state["cache"]
+
+
+def embed_texts(texts: List[str]) -> np.ndarray:
+    """Embeddings for texts (one row each), from the disk cache where possible"""
+    # Imported lazily so the index can be used without the LLM client
+    from llm_model import get_embeddings, EMBEDDING_MODEL, EMBEDDING_DIMENSIONS
+
+    _, cache = _get_store()
+    keys = [EmbeddingCache.key(EMBEDDING_MODEL, EMBEDDING_DIMENSIONS, text) for text in texts]
+    found = cache.get_many(list(set(keys)))
+
+    missing = list({key: text for key, text in zip(keys, texts) if key not in found}.items())
+    for start in range(0, len(missing), EMBEDDING_BATCH_SIZE):
+        batch = missing[start:start + EMBEDDING_BATCH_SIZE]
+        vectors = get_embeddings([text for _, text in batch])
+        computed = {key: np.asarray(vector, dtype=np.float32) for (key, _), vector in zip(batch, vectors)}
+        cache.put_many(computed)
+        found.update(computed)
+
+    return np.vstack([found[key] for key in keys]) if keys else np.empty((0, EMBEDDING_DIMENSIONS), np.float32)
+
+
+def add_knowledge(documents: List[Dict[str, Any]]) -> int:
+    """
+    Embed and index documents: [{"text", optional "doc_id", optional "metadata"}]
+    A document without a doc_id is identified by its text; re-adding a doc_id replaces it.
+    """
+    documents = [doc for doc in documents if (doc.get("text") or "").strip()]
+    if not documents:
+        return 0
+    try:
+        index, _ = _get_store()
+        vectors = embed_texts([doc["text"] for doc in documents])
+        return index.add([{
+            "doc_id": doc.get("doc_id") or hashlib.sha256(doc["text"].encode("utf-8")).hexdigest(),
+            "text": doc["text"],
+            "metadata": doc.get("metadata") or {},
+            "vector": vector
+        } for doc, vector in zip(documents, vectors)])
+
+    except Exception as e:
+        print(f"Error adding knowledge: {e}")
+        return 0
+
+
+def search_knowledge(query: str, k: int = KNOWLEDGE_TOP_K, min_score: float = KNOWLEDGE_MIN_SCORE) -> List[Dict[str, Any]]:
+    """Closest indexed documents to the query, best first"""
+    index, _ = _get_store()
+    if not query or not query.strip() or index.count() == 0:
+        # Nothing to search: skip the embedding call
+        return []
+    return index.search(embed_texts([query])[0], k=k, min_score=min_score)
+
+
 def get_vector_matches(message: str) -> str:
-    # Placeholder to swap with real vector search
-    return "No matching docs found"
+    """Knowledge relevant to the message, formatted for a prompt"""
+    try:
+        matches = search_knowledge(message)
+    except Exception as e:
+        print(f"Error searching knowledge: {e}")
+        return NO_MATCHES
+
+    if not matches:
+        return NO_MATCHES
+
+    lines = []
+    for match in matches:
+        text = match["text"].strip()
+        if len(text) > KNOWLEDGE_SNIPPET_CHARS:
+            text = text[:KNOWLEDGE_SNIPPET_CHARS].rstrip() + "..."
+        source = match["metadata"].get("source")
+        label = f"{source}, relevance {match['score']:.2f}" if source else f"relevance {match['score']:.2f}"
+        lines.append(f"- ({label}) {text}")
+    return "\n".join(lines)
+
+
+def _documents_from_file(path: str) -> List[Dict[str, Any]]:
+    # One document per blank-line separated paragraph
+    with open(path, encoding="utf-8") as f:
+        paragraphs = [part.strip() for part in f.read().split("\n\n")]
+    return [{"doc_id": f"{path}#{number}", "text": text, "metadata": {"source": os.path.basename(path)}}
+            for number, text in enumerate(paragraphs) if text]
+
+
+def retrain_knowledge_index() -> bool:
+    """Retrain the ANN model now (KNOWLEDGE_INDEX_MODE=ivfpq only)"""
+    index, _ = _get_store()
+    return index.train_ann()
+
+
+if __name__ == "__main__":
+    if len(sys.argv) >= 3 and sys.argv[1] == "add":
+        for path in sys.argv[2:]:
+            print(f"{path}: indexed {add_knowledge(_documents_from_file(path))} documents")
+    elif len(sys.argv) == 2 and sys.argv[1] == "retrain":
+        sys.exit(0 if retrain_knowledge_index() else 1)
+    else:
+        print("Usage: python -m memory.knowledge_memory add FILE [FILE ...] | retrain")
+        sys.exit(1)
@@ -1,70 +1,156 @@
-import psycopg2
 import os
 import json
+import time
+import threading
+from collections import OrderedDict
 from datetime import datetime, date
 from typing import Dict, List, Any, Optional
 from dotenv import load_dotenv
+from psycopg2.extras import execute_values
+from memory.db_pool import get_db_connection, ensure_schema
+from memory.result_store import get_latest_fresh_result
 
 load_dotenv()
 
-# Database table name constant
+# Database table name constants
 LONG_TERM_DB = "long_term_memory"
+COMMAND_SUMMARIES_DB = "command_summaries"
 
-def get_db_connection():
-    """Get connection to database using Railway's injected DATABASE_URL"""
-    return psycopg2.connect(os.getenv('DATABASE_URL'))
+# Command summaries older than this, or beyond the newest N per user, are deleted nightly
+COMMAND_SUMMARIES_RETENTION_DAYS = int(os.getenv("COMMAND_SUMMARIES_RETENTION_DAYS", "90"))
+COMMAND_SUMMARIES_MAX_PER_USER = int(os.getenv("COMMAND_SUMMARIES_MAX_PER_USER", "500"))
 
+# Rendered get_user_facts strings, invalidated by the writers below. The TTL
+# bounds staleness when another worker process does the write.
+USER_FACTS_CACHE_TTL = float(os.getenv("USER_FACTS_CACHE_TTL", "300"))
+USER_FACTS_CACHE_MAX_SIZE = int(os.getenv("USER_FACTS_CACHE_MAX_SIZE", "2000"))
+
+
+class UserFactsCache:
+    """
+    Thread-safe LRU of rendered user facts, each trusted for a TTL
+    Every write gets a number from a process-wide counter; a read only caches its
+    result if the user's generation didn't change while it ran. Generations are
+    bounded too: a user whose generation was evicted reads as the highest evicted
+    one, which is never below any generation a reader saw before that write.
+    """
+
+    def __init__(self, max_size: int = USER_FACTS_CACHE_MAX_SIZE, ttl: float = USER_FACTS_CACHE_TTL):
+        self.max_size = max(1, max_size)
+        self.ttl = ttl
+        self._lock = threading.Lock()
+        self._entries = OrderedDict()  # user_id → (facts string, expires_at monotonic)
+        self._generations = OrderedDict()  # user_id → write counter at the user's last write
+        self._writes = 0
+        self._evicted_generation = 0
+        self._stats = {"hits": 0, "misses": 0, "expired": 0, "evictions": 0}
+
+    def _generation(self, user_id: str) -> int:
+        return self._generations.get(user_id, self._evicted_generation)
+
+    def get(self, user_id: str):
+        """(facts or None, generation to pass back to set)"""
+        with self._lock:
+            cached = self._entries.get(user_id)
+            if cached is not None and cached[1] <= time.monotonic():
+                del self._entries[user_id]
+                self._stats["expired"] += 1
+                cached = None
+            if cached is None:
+                self._stats["misses"] += 1
+                return None, self._generation(user_id)
+            self._entries.move_to_end(user_id)
+            self._stats["hits"] += 1
+            return cached[0], self._generation(user_id)
+
+    def set(self, user_id: str, facts: str, generation: int):
+        if self.ttl <= 0:
+            return
+        with self._lock:
+            # Only cache if no writer touched this user while the facts were read
+            if self._generation(user_id) != generation:
+                return
+            self._entries[user_id] = (facts, time.monotonic() + self.ttl)
+            self._entries.move_to_end(user_id)
+            while len(self._entries) > self.max_size:
+                self._entries.popitem(last=False)
+                self._stats["evictions"] += 1
+
+    def invalidate(self, user_id: str):
+        with self._lock:
+            self._entries.pop(user_id, None)
+            self._writes += 1
+            self._generations[user_id] = self._writes
+            self._generations.move_to_end(user_id)
+            while len(self._generations) > self.max_size:
+                _, evicted = self._generations.popitem(last=False)
+                self._evicted_generation = max(self._evicted_generation, evicted)
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+
+    def get_stats(self) -> Dict[str, Any]:
+        with self._lock:
+            stats = dict(self._stats)
+            stats.update({"size": len(self._entries), "max_size": self.max_size, "ttl": self.ttl})
+        lookups = stats["hits"] + stats["misses"]
+        stats["hit_rate"] = stats["hits"] / lookups if lookups else 0.0
+        return stats
+
+
+_user_facts_cache = UserFactsCache()
 
 def create_user_profile(user_id: str, profile_data: Dict[str, Any]) -> bool:
     """
     Create or update user profile with investment preferences and goals
     """
     try:
-        conn = get_db_connection()
-        cursor = conn.cursor()
-        
-        # Extract profile fields
-        risk_tolerance = profile_data.get('risk_tolerance')
-        investment_goal = profile_data.get('investment_goal')
-        asset_preferences = profile_data.get('asset_preferences', {})
-        industry_preferences = profile_data.get('industry_preferences', {})
-        investment_style = profile_data.get('investment_style')
-        
-        # Check if user exists
-        cursor.execute(f"""
-            SELECT user_id FROM {LONG_TERM_DB}
-            WHERE user_id = %s
-        """, (user_id,))
-        
-        exists = cursor.fetchone()
-        
-        if exists:
-            # Update existing user
+        with get_db_connection() as conn:
+            cursor = conn.cursor()
+        
+            # Extract profile fields
+            risk_tolerance = profile_data.get('risk_tolerance')
+            investment_goal = profile_data.get('investment_goal')
+            asset_preferences = profile_data.get('asset_preferences', {})
+            industry_preferences = profile_data.get('industry_preferences', {})
+            investment_style = profile_data.get('investment_style')
+        
+            # Check if user exists
             cursor.execute(f"""
-                UPDATE {LONG_TERM_DB}
-                SET risk_tolerance = %s,
-                    investment_goal = %s,
-                    asset_preferences = %s,
-                    industry_preferences = %s,
-                    investment_style = %s
+                SELECT user_id FROM {LONG_TERM_DB}
                 WHERE user_id = %s
-            """, (json.dumps(risk_tolerance), json.dumps(investment_goal),
-                  json.dumps(asset_preferences), json.dumps(industry_preferences),
-                  json.dumps(investment_style), user_id))
-        else:
-            # Create new user
-            cursor.execute(f"""
-                INSERT INTO {LONG_TERM_DB}
-                (user_id, created_at, risk_tolerance, investment_goal, 
-                 asset_preferences, industry_preferences, investment_style)
-                VALUES (%s, %s, %s, %s, %s, %s, %s)
-            """, (user_id, datetime.now().date(), json.dumps(risk_tolerance),
-                  json.dumps(investment_goal), json.dumps(asset_preferences),
-                  json.dumps(industry_preferences), json.dumps(investment_style)))
-        
-        conn.commit()
-        cursor.close()
-        conn.close()
+            """, (user_id,))
+        
+            exists = cursor.fetchone()
+        
+            if exists:
+                # Update existing user
+                cursor.execute(f"""
+                    UPDATE {LONG_TERM_DB}
+                    SET risk_tolerance = %s,
+                        investment_goal = %s,
+                        asset_preferences = %s,
+                        industry_preferences = %s,
+                        investment_style = %s
+                    WHERE user_id = %s
+                """, (json.dumps(risk_tolerance), json.dumps(investment_goal),
+                      json.dumps(asset_preferences), json.dumps(industry_preferences),
+                      json.dumps(investment_style), user_id))
+            else:
+                # Create new user
+                cursor.execute(f"""
+                    INSERT INTO {LONG_TERM_DB}
+                    (user_id, created_at, risk_tolerance, investment_goal, 
+                     asset_preferences, industry_preferences, investment_style)
+                    VALUES (%s, %s, %s, %s, %s, %s, %s)
+                """, (user_id, datetime.now().date(), json.dumps(risk_tolerance),
+                      json.dumps(investment_goal), json.dumps(asset_preferences),
+                      json.dumps(industry_preferences), json.dumps(investment_style)))
+        
+            conn.commit()
+            cursor.close()
+        invalidate_user_facts(user_id)
         return True
         
     except Exception as e:
@@ -74,19 +160,19 @@ def create_user_profile(user_id: str, profile_data: Dict[str, Any]) -> bool:
 def update_portfolio_holdings(user_id: str, holdings: Dict[str, Any]) -> bool:
     """Update user's portfolio holdings"""
     try:
-        conn = get_db_connection()
-        cursor = conn.cursor()
-        
-        cursor.execute(f"""
-            INSERT INTO {LONG_TERM_DB} (user_id, portfolio_holdings, created_at)
-            VALUES (%s, %s, %s)
-            ON CONFLICT (user_id) 
-            DO UPDATE SET portfolio_holdings = %s
-        """, (user_id, json.dumps(holdings), datetime.now().date(), json.dumps(holdings)))
-        
-        conn.commit()
-        cursor.close()
-        conn.close()
+        with get_db_connection() as conn:
+            cursor = conn.cursor()
+        
+            cursor.execute(f"""
+                INSERT INTO {LONG_TERM_DB} (user_id, portfolio_holdings, created_at)
+                VALUES (%s, %s, %s)
+                ON CONFLICT (user_id) 
+                DO UPDATE SET portfolio_holdings = %s
+            """, (user_id, json.dumps(holdings), datetime.now().date(), json.dumps(holdings)))
+        
+            conn.commit()
+            cursor.close()
+        invalidate_user_facts(user_id)
         return True
         
     except Exception as e:
@@ -96,22 +182,22 @@ def update_portfolio_holdings(user_id: str, holdings: Dict[str, Any]) -> bool:
 def update_portfolio_performance(user_id: str, performance: Dict[str, Any]) -> bool:
     """Update user's portfolio performance metrics"""
     try:
-        conn = get_db_connection()
-        cursor = conn.cursor()
-        
-        # Add timestamp to performance data
-        performance["last_updated"] = datetime.now().isoformat()
-        
-        cursor.execute(f"""
-            INSERT INTO {LONG_TERM_DB} (user_id, portfolio_performance, created_at)
-            VALUES (%s, %s, %s)
-            ON CONFLICT (user_id) 
-            DO UPDATE SET portfolio_performance = %s
-        """, (user_id, json.dumps(performance), datetime.now().date(), json.dumps(performance)))
-        
-        conn.commit()
-        cursor.close()
-        conn.close()
+        with get_db_connection() as conn:
+            cursor = conn.cursor()
+        
+            # Add timestamp to performance data
+            performance["last_updated"] = datetime.now().isoformat()
+        
+            cursor.execute(f"""
+                INSERT INTO {LONG_TERM_DB} (user_id, portfolio_performance, created_at)
+                VALUES (%s, %s, %s)
+                ON CONFLICT (user_id) 
+                DO UPDATE SET portfolio_performance = %s
+            """, (user_id, json.dumps(performance), datetime.now().date(), json.dumps(performance)))
+        
+            conn.commit()
+            cursor.close()
+        invalidate_user_facts(user_id)
         return True
         
     except Exception as e:
@@ -121,39 +207,39 @@ def update_portfolio_performance(user_id: str, performance: Dict[str, Any]) -> b
 def add_user_transaction(user_id: str, transaction: Dict[str, Any]) -> bool:
     """Add a new transaction to user's history"""
     try:
-        conn = get_db_connection()
-        cursor = conn.cursor()
-        
-        # Get existing transactions
-        cursor.execute(f"""
-            SELECT user_transactions FROM {LONG_TERM_DB}
-            WHERE user_id = %s
-        """, (user_id,))
-        
-        result = cursor.fetchone()
-        if result and result[0]:
-            transactions = result[0]
-        else:
-            transactions = []
+        with get_db_connection() as conn:
+            cursor = conn.cursor()
+        
+            # Get existing transactions
+            cursor.execute(f"""
+                SELECT user_transactions FROM {LONG_TERM_DB}
+                WHERE user_id = %s
+            """, (user_id,))
         
-        # Add new transaction with timestamp
-        transaction["timestamp"] = datetime.now().isoformat()
-        transactions.append(transaction)
+            result = cursor.fetchone()
+            if result and result[0]:
+                transactions = result[0]
+            else:
+                transactions = []
         
-        # Keep only last 100 transactions
-        if len(transactions) > 100:
-            transactions = transactions[-100:]
+            # Add new transaction with timestamp
+            transaction["timestamp"] = datetime.now().isoformat()
+            transactions.append(transaction)
         
-        cursor.execute(f"""
-            INSERT INTO {LONG_TERM_DB} (user_id, user_transactions, created_at)
-            VALUES (%s, %s, %s)
-            ON CONFLICT (user_id) 
-            DO UPDATE SET user_transactions = %s
-        """, (user_id, json.dumps(transactions), datetime.now().date(), json.dumps(transactions)))
+            # Keep only last 100 transactions
+            if len(transactions) > 100:
+                transactions = transactions[-100:]
         
-        conn.commit()
-        cursor.close()
-        conn.close()
+            cursor.execute(f"""
+                INSERT INTO {LONG_TERM_DB} (user_id, user_transactions, created_at)
+                VALUES (%s, %s, %s)
+                ON CONFLICT (user_id) 
+                DO UPDATE SET user_transactions = %s
+            """, (user_id, json.dumps(transactions), datetime.now().date(), json.dumps(transactions)))
+        
+            conn.commit()
+            cursor.close()
+        invalidate_user_facts(user_id)
         return True
         
     except Exception as e:
@@ -163,19 +249,19 @@ def add_user_transaction(user_id: str, transaction: Dict[str, Any]) -> bool:
 def update_user_goals(user_id: str, goals: Dict[str, Any]) -> bool:
     """Update user's investment goals"""
     try:
-        conn = get_db_connection()
-        cursor = conn.cursor()
-        
-        cursor.execute(f"""
-            INSERT INTO {LONG_TERM_DB} (user_id, user_goals, created_at)
-            VALUES (%s, %s, %s)
-            ON CONFLICT (user_id) 
-            DO UPDATE SET user_goals = %s
-        """, (user_id, json.dumps(goals), datetime.now().date(), json.dumps(goals)))
-        
-        conn.commit()
-        cursor.close()
-        conn.close()
+        with get_db_connection() as conn:
+            cursor = conn.cursor()
+        
+            cursor.execute(f"""
+                INSERT INTO {LONG_TERM_DB} (user_id, user_goals, created_at)
+                VALUES (%s, %s, %s)
+                ON CONFLICT (user_id) 
+                DO UPDATE SET user_goals = %s
+            """, (user_id, json.dumps(goals), datetime.now().date(), json.dumps(goals)))
+        
+            conn.commit()
+            cursor.close()
+        invalidate_user_facts(user_id)
         return True
         
     except Exception as e:
@@ -185,19 +271,19 @@ def update_user_goals(user_id: str, goals: Dict[str, Any]) -> bool:
 def update_user_pathway(user_id: str, pathway: Dict[str, Any]) -> bool:
     """Update user's investment pathway/strategy"""
     try:
-        conn = get_db_connection()
-        cursor = conn.cursor()
-        
-        cursor.execute(f"""
-            INSERT INTO {LONG_TERM_DB} (user_id, user_pathway, created_at)
-            VALUES (%s, %s, %s)
-            ON CONFLICT (user_id) 
-            DO UPDATE SET user_pathway = %s
-        """, (user_id, json.dumps(pathway), datetime.now().date(), json.dumps(pathway)))
-        
-        conn.commit()
-        cursor.close()
-        conn.close()
+        with get_db_connection() as conn:
+            cursor = conn.cursor()
+        
+            cursor.execute(f"""
+                INSERT INTO {LONG_TERM_DB} (user_id, user_pathway, created_at)
+                VALUES (%s, %s, %s)
+                ON CONFLICT (user_id) 
+                DO UPDATE SET user_pathway = %s
+            """, (user_id, json.dumps(pathway), datetime.now().date(), json.dumps(pathway)))
+        
+            conn.commit()
+            cursor.close()
+        invalidate_user_facts(user_id)
         return True
         
     except Exception as e:
@@ -207,19 +293,18 @@ def update_user_pathway(user_id: str, pathway: Dict[str, Any]) -> bool:
 def get_user_profile(user_id: str) -> Dict[str, Any]:
     """Get complete user profile data"""
     try:
-        conn = get_db_connection()
-        cursor = conn.cursor()
+        with get_db_connection() as conn:
+            cursor = conn.cursor()
         
-        cursor.execute(f"""
-            SELECT risk_tolerance, investment_goal, asset_preferences, 
-                   industry_preferences, investment_style, created_at
-            FROM {LONG_TERM_DB}
-            WHERE user_id = %s
-        """, (user_id,))
+            cursor.execute(f"""
+                SELECT risk_tolerance, investment_goal, asset_preferences, 
+                       industry_preferences, investment_style, created_at
+                FROM {LONG_TERM_DB}
+                WHERE user_id = %s
+            """, (user_id,))
         
-        result = cursor.fetchone()
-        cursor.close()
-        conn.close()
+            result = cursor.fetchone()
+            cursor.close()
         
         if not result:
             return {}
@@ -242,18 +327,17 @@ def get_user_profile(user_id: str) -> Dict[str, Any]:
 def get_portfolio_data(user_id: str) -> Dict[str, Any]:
     """Get user's portfolio holdings and performance"""
     try:
-        conn = get_db_connection()
-        cursor = conn.cursor()
+        with get_db_connection() as conn:
+            cursor = conn.cursor()
         
-        cursor.execute(f"""
-            SELECT portfolio_holdings, portfolio_performance
-            FROM {LONG_TERM_DB}
-            WHERE user_id = %s
-        """, (user_id,))
+            cursor.execute(f"""
+                SELECT portfolio_holdings, portfolio_performance
+                FROM {LONG_TERM_DB}
+                WHERE user_id = %s
+            """, (user_id,))
         
-        result = cursor.fetchone()
-        cursor.close()
-        conn.close()
+            result = cursor.fetchone()
+            cursor.close()
         
         if not result:
             return {"holdings": {}, "performance": {}}
@@ -272,17 +356,16 @@ def get_portfolio_data(user_id: str) -> Dict[str, Any]:
 def get_user_transactions(user_id: str, limit: int = 10) -> List[Dict[str, Any]]:
     """Get user's recent transactions"""
     try:
-        conn = get_db_connection()
-        cursor = conn.cursor()
+        with get_db_connection() as conn:
+            cursor = conn.cursor()
         
-        cursor.execute(f"""
-            SELECT user_transactions FROM {LONG_TERM_DB}
-            WHERE user_id = %s
-        """, (user_id,))
+            cursor.execute(f"""
+                SELECT user_transactions FROM {LONG_TERM_DB}
+                WHERE user_id = %s
+            """, (user_id,))
         
-        result = cursor.fetchone()
-        cursor.close()
-        conn.close()
+            result = cursor.fetchone()
+            cursor.close()
         
         if not result or not result[0]:
             return []
@@ -297,18 +380,17 @@ def get_user_transactions(user_id: str, limit: int = 10) -> List[Dict[str, Any]]
 def get_user_goals_and_pathway(user_id: str) -> Dict[str, Any]:
     """Get user's goals and investment pathway"""
     try:
-        conn = get_db_connection()
-        cursor = conn.cursor()
+        with get_db_connection() as conn:
+            cursor = conn.cursor()
         
-        cursor.execute(f"""
-            SELECT user_goals, user_pathway
-            FROM {LONG_TERM_DB}
-            WHERE user_id = %s
-        """, (user_id,))
+            cursor.execute(f"""
+                SELECT user_goals, user_pathway
+                FROM {LONG_TERM_DB}
+                WHERE user_id = %s
+            """, (user_id,))
         
-        result = cursor.fetchone()
-        cursor.close()
-        conn.close()
+            result = cursor.fetchone()
+            cursor.close()
         
         if not result:
             return {"goals": {}, "pathway": {}}
@@ -328,114 +410,222 @@ def get_user_facts(user_id: str) -> str:
     """
     Get comprehensive user facts for brain.py integration
     Formats all long-term memory data into a readable string
+    Reads the whole row in one query and memoizes the rendered string per user
+    until a writer invalidates it (or USER_FACTS_CACHE_TTL passes)
     """
+    cached, generation = _user_facts_cache.get(user_id)
+    if cached is not None:
+        return cached
+
     try:
-        profile = get_user_profile(user_id)
-        portfolio = get_portfolio_data(user_id)
-        transactions = get_user_transactions(user_id, 5)  # Last 5 transactions
-        goals_pathway = get_user_goals_and_pathway(user_id)
-        
-        facts = []
-        
-        # Profile information
-        if profile:
-            facts.append("=== USER PROFILE ===")
-            if profile.get("risk_tolerance"):
-                facts.append(f"Risk Tolerance: {profile['risk_tolerance']}")
-            if profile.get("investment_goal"):
-                facts.append(f"Investment Goal: {profile['investment_goal']}")
-            if profile.get("investment_style"):
-                facts.append(f"Investment Style: {profile['investment_style']}")
-            if profile.get("asset_preferences"):
-                facts.append(f"Asset Preferences: {profile['asset_preferences']}")
-            if profile.get("industry_preferences"):
-                facts.append(f"Industry Preferences: {profile['industry_preferences']}")
-            if profile.get("created_at"):
-                facts.append(f"Profile Created: {profile['created_at']}")
-        
-        # Portfolio information
-        if portfolio.get("holdings"):
-            facts.append("\n=== PORTFOLIO HOLDINGS ===")
-            facts.append(f"Current Holdings: {portfolio['holdings']}")
-        
-        if portfolio.get("performance"):
-            facts.append("\n=== PORTFOLIO PERFORMANCE ===")
-            facts.append(f"Performance Metrics: {portfolio['performance']}")
-        
-        # Recent transactions
-        if transactions:
-            facts.append("\n=== RECENT TRANSACTIONS ===")
-            for i, transaction in enumerate(transactions, 1):
-                facts.append(f"Transaction {i}: {transaction}")
-        
-        # Goals and pathway
-        if goals_pathway.get("goals"):
-            facts.append("\n=== INVESTMENT GOALS ===")
-            facts.append(f"Goals: {goals_pathway['goals']}")
-        
-        if goals_pathway.get("pathway"):
-            facts.append("\n=== INVESTMENT PATHWAY ===")
-            facts.append(f"Strategy: {goals_pathway['pathway']}")
-        
-        return "\n".join(facts) if facts else "No long-term memory data available for this user."
-        
+        with get_db_connection() as conn:
+            cursor = conn.cursor()
+
+            cursor.execute(f"""
+                SELECT risk_tolerance, investment_goal, asset_preferences,
+                       industry_preferences, investment_style, created_at,
+                       portfolio_holdings, portfolio_performance, user_transactions,
+                       user_goals, user_pathway
+                FROM {LONG_TERM_DB}
+                WHERE user_id = %s
+            """, (user_id,))
+
+            result = cursor.fetchone()
+            cursor.close()
+
+        if result:
+            (risk_tolerance, investment_goal, asset_preferences, industry_preferences,
+             investment_style, created_at, holdings, performance, transactions,
+             goals, pathway) = result
+            profile = {
+                "risk_tolerance": risk_tolerance,
+                "investment_goal": investment_goal,
+                "asset_preferences": asset_preferences or {},
+                "industry_preferences": industry_preferences or {},
+                "investment_style": investment_style,
+                "created_at": created_at
+            }
+            portfolio = {"holdings": holdings or {}, "performance": performance or {}}
+            transactions = (transactions or [])[-5:]  # Last 5 transactions
+            goals_pathway = {"goals": goals or {}, "pathway": pathway or {}}
+        else:
+            profile = {}
+            portfolio = {"holdings": {}, "performance": {}}
+            transactions = []
+            goals_pathway = {"goals": {}, "pathway": {}}
+
+        user_facts = _format_user_facts(profile, portfolio, transactions, goals_pathway)
+
+        _user_facts_cache.set(user_id, user_facts, generation)
+
+        return user_facts
+
     except Exception as e:
         print(f"Error generating user facts: {e}")
         return "Error retrieving user facts."
 
-def save_result(user_id: str, result: str) -> bool:
+def _format_user_facts(profile: Dict[str, Any], portfolio: Dict[str, Any],
+                       transactions: List[Dict[str, Any]], goals_pathway: Dict[str, Any]) -> str:
+    """Render long-term memory data as the user facts string"""
+    facts = []
+    
+    # Profile information
+    if profile:
+        facts.append("=== USER PROFILE ===")
+        if profile.get("risk_tolerance"):
+            facts.append(f"Risk Tolerance: {profile['risk_tolerance']}")
+        if profile.get("investment_goal"):
+            facts.append(f"Investment Goal: {profile['investment_goal']}")
+        if profile.get("investment_style"):
+            facts.append(f"Investment Style: {profile['investment_style']}")
+        if profile.get("asset_preferences"):
+            facts.append(f"Asset Preferences: {profile['asset_preferences']}")
+        if profile.get("industry_preferences"):
+            facts.append(f"Industry Preferences: {profile['industry_preferences']}")
+        if profile.get("created_at"):
+            facts.append(f"Profile Created: {profile['created_at']}")
+    
+    # Portfolio information
+    if portfolio.get("holdings"):
+        facts.append("\n=== PORTFOLIO HOLDINGS ===")
+        facts.append(f"Current Holdings: {portfolio['holdings']}")
+    
+    if portfolio.get("performance"):
+        facts.append("\n=== PORTFOLIO PERFORMANCE ===")
+        facts.append(f"Performance Metrics: {portfolio['performance']}")
+    
+    # Recent transactions
+    if transactions:
+        facts.append("\n=== RECENT TRANSACTIONS ===")
+        for i, transaction in enumerate(transactions, 1):
+            facts.append(f"Transaction {i}: {transaction}")
+    
+    # Goals and pathway
+    if goals_pathway.get("goals"):
+        facts.append("\n=== INVESTMENT GOALS ===")
+        facts.append(f"Goals: {goals_pathway['goals']}")
+    
+    if goals_pathway.get("pathway"):
+        facts.append("\n=== INVESTMENT PATHWAY ===")
+        facts.append(f"Strategy: {goals_pathway['pathway']}")
+    
+    return "\n".join(facts) if facts else "No long-term memory data available for this user."
+
+def invalidate_user_facts(user_id: str):
+    """Drop the memoized user facts after a write to the user's long-term memory"""
+    _user_facts_cache.invalidate(user_id)
+
+def get_user_facts_cache_stats() -> Dict[str, Any]:
+    """Hit, miss, expiry and eviction counters for this process's user facts cache"""
+    return _user_facts_cache.get_stats()
+
+def _ensure_summaries_table():
+    ensure_schema(COMMAND_SUMMARIES_DB, [
+        f"""
+        CREATE TABLE IF NOT EXISTS {COMMAND_SUMMARIES_DB} (
+            id BIGSERIAL PRIMARY KEY,
+            user_id TEXT NOT NULL,
+            command TEXT,
+            summary TEXT NOT NULL,
+            created_at TIMESTAMPTZ NOT NULL DEFAULT now()
+        )
+        """,
+        f"CREATE INDEX IF NOT EXISTS {COMMAND_SUMMARIES_DB}_user_idx ON {COMMAND_SUMMARIES_DB} (user_id, id)",
+        f"CREATE INDEX IF NOT EXISTS {COMMAND_SUMMARIES_DB}_created_idx ON {COMMAND_SUMMARIES_DB} (created_at)"
+    ])
+
+def save_result(user_id: str, result: str, command_name: str = None) -> bool:
     """
-    Save command result to long-term memory
+    Save a command result summary to long-term memory
     This maintains compatibility with existing brain.py usage
     """
+    return save_results([(user_id, command_name, result)])
+
+def save_results(rows: List[tuple]) -> bool:
+    """Save many (user_id, command_name, summary) rows in one transaction"""
+    rows = [row for row in rows if row[0] and row[2]]
+    if not rows:
+        return True
+
     try:
-        # For now, we'll store results in a simple format
-        # This could be enhanced to extract structured data from results
-        conn = get_db_connection()
-        cursor = conn.cursor()
-        
-        # Get existing results or create new list
-        cursor.execute(f"""
-            SELECT user_transactions FROM {LONG_TERM_DB}
-            WHERE user_id = %s
-        """, (user_id,))
-        
-        result_data = cursor.fetchone()
-        if result_data and result_data[0]:
-            # Use existing transactions field to store results for now
-            # In a full implementation, you might want a separate results field
-            pass
-        
-        # For compatibility, we'll just return True
-        # The actual result storage could be enhanced based on specific needs
-        cursor.close()
-        conn.close()
+        _ensure_summaries_table()
+        with get_db_connection() as conn:
+            cursor = conn.cursor()
+            execute_values(cursor, f"""
+                INSERT INTO {COMMAND_SUMMARIES_DB} (user_id, command, summary)
+                VALUES %s
+            """, [(user_id, command_name, str(summary)) for user_id, command_name, summary in rows])
+            conn.commit()
+            cursor.close()
         return True
         
     except Exception as e:
-        print(f"Error saving result: {e}")
+        print(f"Error saving results: {e}")
         return False
 
+def cleanup_command_summaries(keep_days: int = COMMAND_SUMMARIES_RETENTION_DAYS,
+                              keep: int = COMMAND_SUMMARIES_MAX_PER_USER) -> int:
+    """
+    Background job: delete summaries older than keep_days and everything beyond
+    the newest `keep` summaries per user
+    """
+    try:
+        _ensure_summaries_table()
+        with get_db_connection() as conn:
+            cursor = conn.cursor()
+
+            cursor.execute(f"""
+                DELETE FROM {COMMAND_SUMMARIES_DB}
+                WHERE created_at < now() - make_interval(days => %s)
+            """, (keep_days,))
+            deleted_count = cursor.rowcount
+
+            cursor.execute(f"""
+                DELETE FROM {COMMAND_SUMMARIES_DB} s
+                USING (
+                    SELECT id FROM (
+                        SELECT id, row_number() OVER (PARTITION BY user_id ORDER BY id DESC) AS position
+                        FROM {COMMAND_SUMMARIES_DB}
+                    ) ranked
+                    WHERE position > %s
+                ) old
+                WHERE s.id = old.id
+            """, (keep,))
+            deleted_count += cursor.rowcount
+
+            conn.commit()
+            cursor.close()
+
+        print(f"Cleaned up {deleted_count} command summaries")
+        return deleted_count
+
+    except Exception as e:
+        print(f"Error cleaning up command summaries: {e}")
+        return 0
+
 def get_latest_result(command_name: str, symbol: str = None) -> Optional[Dict[str, Any]]:
-    """Get the latest result for a specific command"""
-    # This could be enhanced to actually retrieve command results
-    # For now, return None to maintain compatibility
-    return None
+    """Get the latest still-fresh result for a specific command (optionally for one symbol)"""
+    return get_latest_fresh_result(command_name, symbol)
 
 def clear_user_data(user_id: str) -> bool:
     """Clear all long-term memory data for a user"""
     try:
-        conn = get_db_connection()
-        cursor = conn.cursor()
+        _ensure_summaries_table()
+        with get_db_connection() as conn:
+            cursor = conn.cursor()
         
-        cursor.execute(f"""
-            DELETE FROM {LONG_TERM_DB}
-            WHERE user_id = %s
-        """, (user_id,))
+            cursor.execute(f"""
+                DELETE FROM {LONG_TERM_DB}
+                WHERE user_id = %s
+            """, (user_id,))
+            cursor.execute(f"""
+                DELETE FROM {COMMAND_SUMMARIES_DB}
+                WHERE user_id = %s
+            """, (user_id,))
         
-        conn.commit()
-        cursor.close()
-        conn.close()
+            conn.commit()
+            cursor.close()
+        invalidate_user_facts(user_id)
         return True
         
     except Exception as e:
@@ -445,21 +635,20 @@ def clear_user_data(user_id: str) -> bool:
 def get_user_data_summary(user_id: str) -> Dict[str, Any]:
     """Get comprehensive summary of user's long-term memory data"""
     try:
-        conn = get_db_connection()
-        cursor = conn.cursor()
-        
-        cursor.execute(f"""
-            SELECT risk_tolerance, investment_goal, asset_preferences, 
-                   industry_preferences, investment_style, portfolio_holdings,
-                   portfolio_performance, user_transactions, user_goals,
-                   user_pathway, created_at
-            FROM {LONG_TERM_DB}
-            WHERE user_id = %s
-        """, (user_id,))
-        
-        result = cursor.fetchone()
-        cursor.close()
-        conn.close()
+        with get_db_connection() as conn:
+            cursor = conn.cursor()
+        
+            cursor.execute(f"""
+                SELECT risk_tolerance, investment_goal, asset_preferences, 
+                       industry_preferences, investment_style, portfolio_holdings,
+                       portfolio_performance, user_transactions, user_goals,
+                       user_pathway, created_at
+                FROM {LONG_TERM_DB}
+                WHERE user_id = %s
+            """, (user_id,))
+        
+            result = cursor.fetchone()
+            cursor.close()
         
         if not result:
             return {
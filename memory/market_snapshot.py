@@ -0,0 +1,234 @@
+import os
+import json
+import time
+import threading
+from datetime import datetime, timezone
+from typing import Dict, Any, Callable, Optional
+from dotenv import load_dotenv
+from memory.db_pool import get_db_connection, ensure_schema
+
+load_dotenv()
+
+# Database table name constant
+MARKET_SNAPSHOT_DB = "market_snapshots"
+
+# How long a process trusts its last read of the latest snapshot
+MARKET_SNAPSHOT_MEMO_SECONDS = float(os.getenv("MARKET_SNAPSHOT_MEMO_SECONDS", "60"))
+# How long a request waits for someone else's refresh before settling for what exists
+MARKET_REFRESH_WAIT_SECONDS = float(os.getenv("MARKET_REFRESH_WAIT_SECONDS", "90"))
+# Snapshots older than this are treated as "no current market data"
+MARKET_SNAPSHOT_MAX_AGE_HOURS = float(os.getenv("MARKET_SNAPSHOT_MAX_AGE_HOURS", "24"))
+
+# Advisory lock id shared by every worker refreshing the snapshot
+_REFRESH_LOCK_ID = 0x4D4B5453  # "MKTS"
+
+_refresh_lock = threading.Lock()
+_memo_lock = threading.Lock()
+_latest_memo = (None, 0.0)  # (snapshot, fetched_at monotonic)
+
+
+def _ensure_snapshot_table():
+    ensure_schema(MARKET_SNAPSHOT_DB, [
+        f"""
+        CREATE TABLE IF NOT EXISTS {MARKET_SNAPSHOT_DB} (
+            snapshot_at TIMESTAMPTZ PRIMARY KEY,
+            snapshot_date DATE NOT NULL,
+            data JSONB NOT NULL
+        )
+        """
+    ])
+
+
+def _read_latest(cursor) -> Dict[str, Any]:
+    cursor.execute(f"""
+        SELECT data FROM {MARKET_SNAPSHOT_DB}
+        ORDER BY snapshot_at DESC
+        LIMIT 1
+    """)
+    result = cursor.fetchone()
+    return result[0] if result and result[0] else {}
+
+
+def _insert_snapshot(cursor, market_data: Dict[str, Any]) -> Dict[str, Any]:
+    snapshot_at = datetime.now(timezone.utc)
+    snapshot = dict(market_data)
+    snapshot.setdefault("date", snapshot_at.strftime("%Y-%m-%d"))
+    snapshot["snapshot_at"] = snapshot_at.isoformat()
+    snapshot["last_updated"] = datetime.now().isoformat()
+
+    cursor.execute(f"""
+        INSERT INTO {MARKET_SNAPSHOT_DB} (snapshot_at, snapshot_date, data)
+        VALUES (%s, %s, %s)
+    """, (snapshot_at, snapshot["date"], json.dumps(snapshot)))
+    return snapshot
+
+
+def _remember(snapshot: Dict[str, Any]):
+    global _latest_memo
+    with _memo_lock:
+        _latest_memo = (snapshot, time.monotonic())
+
+
+def is_current_snapshot(snapshot: Optional[Dict[str, Any]]) -> bool:
+    """A snapshot is current when it was collected today (UTC), matching the daily refresh"""
+    if not snapshot:
+        return False
+    return snapshot.get("date") == datetime.now(timezone.utc).strftime("%Y-%m-%d")
+
+
+def snapshot_age_seconds(snapshot: Optional[Dict[str, Any]]) -> Optional[float]:
+    """Seconds since the snapshot was collected, or None if unknown"""
+    if not snapshot or not snapshot.get("snapshot_at"):
+        return None
+    try:
+        snapshot_at = datetime.fromisoformat(snapshot["snapshot_at"])
+        return (datetime.now(timezone.utc) - snapshot_at).total_seconds()
+    except (TypeError, ValueError):
+        return None
+
+
+def is_fresh_snapshot(snapshot: Optional[Dict[str, Any]], max_age: Optional[float] = None) -> bool:
+    """Current for today, and when max_age is given, collected less than max_age seconds ago"""
+    if not is_current_snapshot(snapshot):
+        return False
+    if max_age is None:
+        return True
+    age = snapshot_age_seconds(snapshot)
+    return age is not None and age < max_age
+
+
+def get_latest_market_snapshot(use_memo: bool = True) -> Dict[str, Any]:
+    """Get the most recent shared market snapshot (empty dict if there is none)"""
+    if use_memo:
+        with _memo_lock:
+            snapshot, fetched_at = _latest_memo
+        if snapshot is not None and time.monotonic() - fetched_at < MARKET_SNAPSHOT_MEMO_SECONDS:
+            return snapshot
+
+    try:
+        _ensure_snapshot_table()
+        with get_db_connection() as conn:
+            cursor = conn.cursor()
+            snapshot = _read_latest(cursor)
+            cursor.close()
+        _remember(snapshot)
+        return snapshot
+
+    except Exception as e:
+        print(f"Error retrieving market snapshot: {e}")
+        return {}
+
+
+def save_market_snapshot(market_data: Dict[str, Any]) -> Dict[str, Any]:
+    """Store a new shared market snapshot and return it as stored"""
+    try:
+        _ensure_snapshot_table()
+        with get_db_connection() as conn:
+            cursor = conn.cursor()
+            snapshot = _insert_snapshot(cursor, market_data)
+            conn.commit()
+            cursor.close()
+        _remember(snapshot)
+        return snapshot
+
+    except Exception as e:
+        print(f"Error saving market snapshot: {e}")
+        return market_data
+
+
+def get_market_snapshot(collect: Callable[[], Dict[str, Any]], max_age: Optional[float] = None) -> Dict[str, Any]:
+    """
+    Get today's shared market snapshot, collecting it if needed
+    With max_age, a snapshot older than max_age seconds is collected again.
+    Refreshes are single-flight: within a process only one thread collects while
+    the rest wait on it, and across worker processes a Postgres advisory lock
+    makes sure a burst of requests triggers exactly one collection.
+    """
+    snapshot = get_latest_market_snapshot()
+    if is_fresh_snapshot(snapshot, max_age):
+        return snapshot
+
+    if not _refresh_lock.acquire(timeout=MARKET_REFRESH_WAIT_SECONDS):
+        print("Timed out waiting for market snapshot refresh, using latest snapshot")
+        return get_latest_market_snapshot(use_memo=False)
+
+    try:
+        # Someone may have finished a refresh while we waited for the lock
+        snapshot = get_latest_market_snapshot(use_memo=False)
+        if is_fresh_snapshot(snapshot, max_age):
+            return snapshot
+
+        _ensure_snapshot_table()
+        with get_db_connection() as conn:
+            cursor = conn.cursor()
+            if not _acquire_refresh_lock(cursor):
+                cursor.close()
+                print("Timed out waiting for another worker's market snapshot refresh")
+                return get_latest_market_snapshot(use_memo=False)
+
+            try:
+                latest = _read_latest(cursor)
+                conn.commit()
+                if is_fresh_snapshot(latest, max_age):
+                    # Another worker refreshed while we waited on the advisory lock
+                    snapshot = latest
+                else:
+                    market_data = collect()
+                    snapshot = _insert_snapshot(cursor, market_data)
+                    conn.commit()
+            finally:
+                conn.rollback()
+                cursor.execute("SELECT pg_advisory_unlock(%s)", (_REFRESH_LOCK_ID,))
+                conn.commit()
+                cursor.close()
+
+        _remember(snapshot)
+        return snapshot
+
+    finally:
+        _refresh_lock.release()
+
+
+def _acquire_refresh_lock(cursor) -> bool:
+    """Poll for the cross-process refresh lock for up to MARKET_REFRESH_WAIT_SECONDS"""
+    deadline = time.monotonic() + MARKET_REFRESH_WAIT_SECONDS
+    while True:
+        cursor.execute("SELECT pg_try_advisory_lock(%s)", (_REFRESH_LOCK_ID,))
+        if cursor.fetchone()[0]:
+            cursor.connection.commit()
+            return True
+        cursor.connection.commit()
+        if time.monotonic() >= deadline:
+            return False
+        time.sleep(0.5)
+
+
+def get_current_snapshot_or_empty() -> Dict[str, Any]:
+    """Latest snapshot if it is recent enough to present as current market data"""
+    snapshot = get_latest_market_snapshot()
+    age = snapshot_age_seconds(snapshot)
+    if age is None or age > MARKET_SNAPSHOT_MAX_AGE_HOURS * 3600:
+        return {}
+    return snapshot
+
+
+def cleanup_market_snapshots(keep_days: int = 7) -> int:
+    """Remove snapshots older than keep_days"""
+    try:
+        _ensure_snapshot_table()
+        with get_db_connection() as conn:
+            cursor = conn.cursor()
+            cursor.execute(f"""
+                DELETE FROM {MARKET_SNAPSHOT_DB}
+                WHERE snapshot_at < now() - make_interval(days => %s)
+            """, (keep_days,))
+            deleted_count = cursor.rowcount
+            conn.commit()
+            cursor.close()
+
+        print(f"Cleaned up {deleted_count} market snapshots")
+        return deleted_count
+
+    except Exception as e:
+        print(f"Error cleaning up market snapshots: {e}")
+        return 0
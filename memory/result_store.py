@@ -0,0 +1,185 @@
+import json
+import hashlib
+from datetime import datetime, timedelta, timezone
+from typing import Dict, Any, Optional
+from memory.db_pool import get_db_connection, ensure_schema
+from command_registry import get_command
+
+# Database table name constant
+COMMAND_RESULTS_DB = "command_results"
+
+# Args that change how a command runs but not what it returns
+NON_KEY_ARGS = {"fresh"}
+
+
+def _ensure_results_table():
+    ensure_schema(COMMAND_RESULTS_DB, [
+        f"""
+        CREATE TABLE IF NOT EXISTS {COMMAND_RESULTS_DB} (
+            command TEXT NOT NULL,
+            args_key TEXT NOT NULL,
+            args JSONB NOT NULL,
+            result JSONB NOT NULL,
+            created_at TIMESTAMPTZ NOT NULL DEFAULT now(),
+            expires_at TIMESTAMPTZ NOT NULL,
+            PRIMARY KEY (command, args_key)
+        )
+        """,
+        f"CREATE INDEX IF NOT EXISTS {COMMAND_RESULTS_DB}_created_idx ON {COMMAND_RESULTS_DB} (command, created_at DESC)"
+    ])
+
+
+def get_result_policy(command_name: str):
+    """
+    (freshness seconds, shared) from the command's COMMAND_META
+    freshness_seconds is how long a result may be reused (0 = never); shared_results
+    marks results that don't depend on the user, so they are reused across users.
+    """
+    command = get_command(command_name)
+    if command is None:
+        return 0, False
+    return command["freshness_seconds"], command["shared_results"]
+
+
+def normalize_args(args: Dict[str, Any], shared: bool = False) -> Dict[str, Any]:
+    """Args as they identify a result: trimmed, symbols upper-cased, empty and run-only args dropped"""
+    normalized = {}
+    for key, value in (args or {}).items():
+        if key in NON_KEY_ARGS or value is None or value == "":
+            continue
+        if key == "user_id" and shared:
+            continue
+        if isinstance(value, str):
+            value = value.strip()
+            if key in ("symbol", "symbols"):
+                value = value.upper()
+        normalized[key] = value
+    return normalized
+
+
+def _args_key(normalized: Dict[str, Any]) -> str:
+    payload = json.dumps(normalized, sort_keys=True, default=str)
+    return hashlib.sha256(payload.encode("utf-8")).hexdigest()
+
+
+def _is_storable(result) -> bool:
+    # Commands with a freshness window raise on failure and run_command reports it as a
+    # "[Command Error" string; that, an error dict, a "refreshing" placeholder or an empty
+    # result must never be reused
+    if result is None:
+        return False
+    if isinstance(result, str) and not result.strip():
+        return False
+    if isinstance(result, str) and result.startswith("[Command Error"):
+        return False
+    if isinstance(result, dict) and ("error" in result or result.get("status") in ("refreshing", "stale")):
+        return False
+    return True
+
+
+def get_fresh_result(command_name: str, args: Dict[str, Any]) -> Optional[Dict[str, Any]]:
+    """
+    Stored result for (command, normalized args) if still within the command's freshness window
+    Returns {"result": ..., "created_at": ...} or None.
+    """
+    freshness, shared = get_result_policy(command_name)
+    if not freshness or (args or {}).get("fresh"):
+        return None
+
+    try:
+        _ensure_results_table()
+        with get_db_connection() as conn:
+            cursor = conn.cursor()
+            cursor.execute(f"""
+                SELECT result, created_at FROM {COMMAND_RESULTS_DB}
+                WHERE command = %s AND args_key = %s AND expires_at > now()
+            """, (command_name, _args_key(normalize_args(args, shared))))
+            row = cursor.fetchone()
+            cursor.close()
+
+        if not row:
+            return None
+        return {"result": row[0], "created_at": row[1]}
+
+    except Exception as e:
+        print(f"Error reading command result: {e}")
+        return None
+
+
+def save_command_result(command_name: str, args: Dict[str, Any], result) -> bool:
+    """Store a successful result for reuse, if the command declares a freshness window"""
+    freshness, shared = get_result_policy(command_name)
+    if not freshness or not _is_storable(result):
+        return False
+
+    try:
+        normalized = normalize_args(args, shared)
+        expires_at = datetime.now(timezone.utc) + timedelta(seconds=freshness)
+
+        _ensure_results_table()
+        with get_db_connection() as conn:
+            cursor = conn.cursor()
+            cursor.execute(f"""
+                INSERT INTO {COMMAND_RESULTS_DB} (command, args_key, args, result, created_at, expires_at)
+                VALUES (%s, %s, %s, %s, now(), %s)
+                ON CONFLICT (command, args_key)
+                DO UPDATE SET
+                    result = EXCLUDED.result,
+                    created_at = EXCLUDED.created_at,
+                    expires_at = EXCLUDED.expires_at
+            """, (command_name, _args_key(normalized), json.dumps(normalized, default=str),
+                  json.dumps(result, default=str), expires_at))
+            conn.commit()
+            cursor.close()
+        return True
+
+    except Exception as e:
+        print(f"Error saving command result: {e}")
+        return False
+
+
+def get_latest_fresh_result(command_name: str, symbol: str = None):
+    """Most recent unexpired result for a command, optionally for one symbol"""
+    try:
+        _ensure_results_table()
+        with get_db_connection() as conn:
+            cursor = conn.cursor()
+            if symbol:
+                cursor.execute(f"""
+                    SELECT result FROM {COMMAND_RESULTS_DB}
+                    WHERE command = %s AND args ->> 'symbol' = %s AND expires_at > now()
+                    ORDER BY created_at DESC LIMIT 1
+                """, (command_name, symbol.strip().upper()))
+            else:
+                cursor.execute(f"""
+                    SELECT result FROM {COMMAND_RESULTS_DB}
+                    WHERE command = %s AND expires_at > now()
+                    ORDER BY created_at DESC LIMIT 1
+                """, (command_name,))
+            row = cursor.fetchone()
+            cursor.close()
+
+        return row[0] if row else None
+
+    except Exception as e:
+        print(f"Error reading latest command result: {e}")
+        return None
+
+
+def cleanup_command_results() -> int:
+    """Remove expired command results"""
+    try:
+        _ensure_results_table()
+        with get_db_connection() as conn:
+            cursor = conn.cursor()
+            cursor.execute(f"DELETE FROM {COMMAND_RESULTS_DB} WHERE expires_at <= now()")
+            deleted_count = cursor.rowcount
+            conn.commit()
+            cursor.close()
+
+        print(f"Cleaned up {deleted_count} command results")
+        return deleted_count
+
+    except Exception as e:
+        print(f"Error cleaning up command results: {e}")
+        return 0
@@ -1,158 +1,246 @@
-import psycopg2
 import os
 import json
+import copy
+import inspect
+import functools
+import threading
+import contextvars
+from contextlib import contextmanager
 from datetime import datetime, timedelta, date
 from typing import Dict, List, Any
 from dotenv import load_dotenv
+from psycopg2.extras import execute_values
+from memory.db_pool import get_db_connection, ensure_schema
+from memory.market_snapshot import save_market_snapshot, get_current_snapshot_or_empty
 
 load_dotenv()
 
-# Database table name constant
+# Database table name constants
 SHORT_TERM_DB = "short_term_memory"
+CONVERSATION_DB = "conversation_messages"
 
-def get_db_connection():
-    """Get connection to database using Railway's injected DATABASE_URL"""
-    return psycopg2.connect(os.getenv('DATABASE_URL'))
+# Conversation window served to prompts
+RECENT_MESSAGE_LIMIT = 20
+MESSAGE_EXPIRY_HOURS = 24
+
+# Stored current_cache as it should be seen by a merge: expired rows start over empty
+LIVE_CACHE_SQL = f"""(CASE WHEN {SHORT_TERM_DB}.expires_at > CURRENT_DATE
+                          THEN COALESCE({SHORT_TERM_DB}.current_cache::jsonb, '{{}}'::jsonb)
+                          ELSE '{{}}'::jsonb END)"""
+
+def _ensure_conversation_table():
+    ensure_schema(CONVERSATION_DB, [
+        f"""
+        CREATE TABLE IF NOT EXISTS {CONVERSATION_DB} (
+            seq BIGSERIAL PRIMARY KEY,
+            user_id TEXT NOT NULL,
+            message TEXT NOT NULL,
+            created_at TIMESTAMPTZ NOT NULL DEFAULT now()
+        )
+        """,
+        f"""
+        CREATE INDEX IF NOT EXISTS {CONVERSATION_DB}_user_seq_idx
+        ON {CONVERSATION_DB} (user_id, seq)
+        """
+    ])
 
 def add_to_recent_conversation(user_id: str, message: str):
     """
     Add message to recent conversation
-    Keeps only the last 20 messages total
-    Sets expires_at to 24 hours from creation
+    Messages are appended with a single INSERT; trimming to the last 20 messages
+    and 24 hour expiry are handled by trim_conversation_messages
     """
+    session = get_active_session(user_id)
+    if session is not None:
+        return session.add_to_recent_conversation(message)
+
+    return add_messages_to_recent_conversation(user_id, [message])
+
+def add_messages_to_recent_conversation(user_id: str, messages: List[str]):
+    """Append several messages (e.g. a User/Assistant pair) in one round trip"""
+    session = get_active_session(user_id)
+    if session is not None:
+        return session.add_messages_to_recent_conversation(messages)
+
     try:
-        conn = get_db_connection()
-        cursor = conn.cursor()
-        
-        # Get existing messages
-        cursor.execute(f"""
-            SELECT recent_messages FROM {SHORT_TERM_DB}
-            WHERE user_id = %s
-        """, (user_id,))
-        
-        result = cursor.fetchone()
-        if result and result[0]:
-            messages = result[0]
-            # Use existing created_at, update expires_at to 24 hours from now
-            expires_at = (datetime.now() + timedelta(hours=24)).date()
-        else:
-            messages = []
-            # New user, set both created_at and expires_at
-            created_at = datetime.now().date()
-            expires_at = (datetime.now() + timedelta(hours=24)).date()
-        
-        # Add new message (just the text, no role categorization)
-        messages.append(message)
-        
-        # Keep only last 20 messages
-        if len(messages) > 20:
-            messages = messages[-20:]
-        
-        # Update database with proper timestamps
-        if result:
-            # Existing user, update messages and expires_at
-            cursor.execute(f"""
-                UPDATE {SHORT_TERM_DB}
-                SET recent_messages = %s, expires_at = %s
-                WHERE user_id = %s
-            """, (json.dumps(messages), expires_at, user_id))
-        else:
-            # New user, insert with created_at and expires_at
-            cursor.execute(f"""
-                INSERT INTO {SHORT_TERM_DB}
-                (user_id, recent_messages, created_at, expires_at)
-                VALUES (%s, %s, %s, %s)
-            """, (user_id, json.dumps(messages), created_at, expires_at))
-        
-        conn.commit()
-        cursor.close()
-        conn.close()
+        _ensure_conversation_table()
+        with get_db_connection() as conn:
+            cursor = conn.cursor()
+            _insert_conversation_messages(cursor, user_id, messages)
+            conn.commit()
+            cursor.close()
         return True
         
     except Exception as e:
         print(f"Error adding to conversation: {e}")
         return False
 
-def get_recent_conversation(user_id: str) -> str:
+def _insert_conversation_messages(cursor, user_id: str, messages: List[str]):
+    if messages:
+        execute_values(cursor, f"""
+            INSERT INTO {CONVERSATION_DB} (user_id, message)
+            VALUES %s
+        """, [(user_id, message) for message in messages])
+
+def get_recent_conversation(user_id: str, limit: int = RECENT_MESSAGE_LIMIT) -> str:
     """Get recent conversation as simple text"""
+    session = get_active_session(user_id)
+    if session is not None:
+        return session.get_recent_conversation()
+
     try:
-        conn = get_db_connection()
-        cursor = conn.cursor()
-        
-        cursor.execute(f"""
-            SELECT recent_messages FROM {SHORT_TERM_DB}
-            WHERE user_id = %s AND expires_at > CURRENT_DATE
-        """, (user_id,))
+        _ensure_conversation_table()
+        with get_db_connection() as conn:
+            cursor = conn.cursor()
         
-        result = cursor.fetchone()
-        cursor.close()
-        conn.close()
-        
-        if not result or not result[0]:
-            return ""
+            # Newest N messages via the (user_id, seq) index, returned oldest first
+            cursor.execute(f"""
+                SELECT message FROM (
+                    SELECT seq, message FROM {CONVERSATION_DB}
+                    WHERE user_id = %s AND created_at > now() - interval '{MESSAGE_EXPIRY_HOURS} hours'
+                    ORDER BY seq DESC
+                    LIMIT %s
+                ) recent
+                ORDER BY seq
+            """, (user_id, limit))
+        
+            rows = cursor.fetchall()
+            cursor.close()
         
         # Return messages as simple text, one per line
-        messages = result[0]
-        return "\n".join(messages)
+        return "\n".join(row[0] for row in rows)
         
     except Exception as e:
         print(f"Error retrieving conversation: {e}")
         return ""
 
+def trim_conversation_messages(keep: int = RECENT_MESSAGE_LIMIT) -> int:
+    """
+    Background job: delete expired messages and everything beyond the newest
+    `keep` messages per user
+    """
+    try:
+        _ensure_conversation_table()
+        with get_db_connection() as conn:
+            cursor = conn.cursor()
+
+            cursor.execute(f"""
+                DELETE FROM {CONVERSATION_DB}
+                WHERE created_at < now() - interval '{MESSAGE_EXPIRY_HOURS} hours'
+            """)
+            deleted_count = cursor.rowcount
+
+            cursor.execute(f"""
+                DELETE FROM {CONVERSATION_DB} c
+                USING (
+                    SELECT seq FROM (
+                        SELECT seq, row_number() OVER (PARTITION BY user_id ORDER BY seq DESC) AS position
+                        FROM {CONVERSATION_DB}
+                    ) ranked
+                    WHERE position > %s
+                ) old
+                WHERE c.seq = old.seq
+            """, (keep,))
+            deleted_count += cursor.rowcount
+
+            conn.commit()
+            cursor.close()
+
+        print(f"Trimmed {deleted_count} conversation messages")
+        return deleted_count
+
+    except Exception as e:
+        print(f"Error trimming conversation messages: {e}")
+        return 0
+
 def update_current_cache(user_id: str, cache_data: Dict[str, Any]):
-    """Update current cache with new data"""
+    """
+    Update current cache with new data
+    Only the given keys are sent; they are merged into the stored blob with
+    jsonb || in a single UPSERT, so untouched keys are never read or re-encoded
+    """
+    session = get_active_session(user_id)
+    if session is not None:
+        return session.update_current_cache(cache_data)
+
     try:
-        conn = get_db_connection()
-        cursor = conn.cursor()
-        
-        # Get existing cache
-        cursor.execute(f"""
-            SELECT current_cache FROM {SHORT_TERM_DB}
-            WHERE user_id = %s AND expires_at > CURRENT_DATE
-        """, (user_id,))
-        
-        result = cursor.fetchone()
-        existing_cache = result[0] if result and result[0] else {}
-        
-        # Merge new cache data
-        updated_cache = {**existing_cache, **cache_data}
-        
-        # Update database
-        cursor.execute(f"""
-            INSERT INTO {SHORT_TERM_DB} (user_id, current_cache, created_at, expires_at)
-            VALUES (%s, %s, %s, %s)
-            ON CONFLICT (user_id) 
-            DO UPDATE SET 
-                current_cache = %s,
-                expires_at = %s
-        """, (user_id, json.dumps(updated_cache), datetime.now().date(), 
-               (datetime.now() + timedelta(hours=24)).date(),
-               json.dumps(updated_cache), 
-               (datetime.now() + timedelta(hours=24)).date()))
-        
-        conn.commit()
-        cursor.close()
-        conn.close()
+        with get_db_connection() as conn:
+            cursor = conn.cursor()
+        
+            cursor.execute(f"""
+                INSERT INTO {SHORT_TERM_DB} (user_id, current_cache, created_at, expires_at)
+                VALUES (%s, %s, %s, %s)
+                ON CONFLICT (user_id) 
+                DO UPDATE SET 
+                    current_cache = {LIVE_CACHE_SQL} || EXCLUDED.current_cache::jsonb,
+                    expires_at = EXCLUDED.expires_at
+            """, (user_id, json.dumps(cache_data), datetime.now().date(), 
+                   (datetime.now() + timedelta(hours=24)).date()))
+        
+            conn.commit()
+            cursor.close()
         return True
         
     except Exception as e:
         print(f"Error updating cache: {e}")
         return False
 
+def append_to_cache_list(user_id: str, key: str, items: List[Any], extra: Dict[str, Any] = None):
+    """
+    Append items to a list stored under `key` in the current cache
+    The append happens server-side with jsonb_set, so only the new items travel.
+    `extra` keys are merged in the same statement.
+    """
+    session = get_active_session(user_id)
+    if session is not None:
+        return session.append_to_cache_list(key, items, extra)
+
+    extra = extra or {}
+
+    try:
+        with get_db_connection() as conn:
+            cursor = conn.cursor()
+
+            cursor.execute(f"""
+                INSERT INTO {SHORT_TERM_DB} (user_id, current_cache, created_at, expires_at)
+                VALUES (%s, jsonb_build_object(%s::text, %s::jsonb) || %s::jsonb, %s, %s)
+                ON CONFLICT (user_id)
+                DO UPDATE SET
+                    current_cache = jsonb_set(
+                        {LIVE_CACHE_SQL},
+                        ARRAY[%s::text],
+                        COALESCE({LIVE_CACHE_SQL} -> %s::text, '[]'::jsonb) || %s::jsonb
+                    ) || %s::jsonb,
+                    expires_at = EXCLUDED.expires_at
+            """, (user_id, key, json.dumps(items), json.dumps(extra), datetime.now().date(),
+                   (datetime.now() + timedelta(hours=24)).date(),
+                   key, key, json.dumps(items), json.dumps(extra)))
+
+            conn.commit()
+            cursor.close()
+        return True
+
+    except Exception as e:
+        print(f"Error appending to cache: {e}")
+        return False
+
 def get_current_cache(user_id: str) -> Dict[str, Any]:
     """Get current cache data for user"""
+    session = get_active_session(user_id)
+    if session is not None:
+        return session.get_current_cache()
+
     try:
-        conn = get_db_connection()
-        cursor = conn.cursor()
+        with get_db_connection() as conn:
+            cursor = conn.cursor()
         
-        cursor.execute(f"""
-            SELECT current_cache FROM {SHORT_TERM_DB}
-            WHERE user_id = %s AND expires_at > CURRENT_DATE
-        """, (user_id,))
+            cursor.execute(f"""
+                SELECT current_cache FROM {SHORT_TERM_DB}
+                WHERE user_id = %s AND expires_at > CURRENT_DATE
+            """, (user_id,))
         
-        result = cursor.fetchone()
-        cursor.close()
-        conn.close()
+            result = cursor.fetchone()
+            cursor.close()
         
         return result[0] if result and result[0] else {}
         
@@ -161,30 +249,13 @@ def get_current_cache(user_id: str) -> Dict[str, Any]:
         return {}
 
 def update_market_data(user_id: str, market_data: Dict[str, Any]):
-    """Update current market data context"""
+    """
+    Update current market data context
+    Market data is shared by every user, so it is stored as a global snapshot
+    rather than per user; user_id is kept for compatibility.
+    """
     try:
-        conn = get_db_connection()
-        cursor = conn.cursor()
-        
-        # Add timestamp
-        market_data["last_updated"] = datetime.now().isoformat()
-        
-        # Update database
-        cursor.execute(f"""
-            INSERT INTO {SHORT_TERM_DB} (user_id, current_market_data, created_at, expires_at)
-            VALUES (%s, %s, %s, %s)
-            ON CONFLICT (user_id) 
-            DO UPDATE SET 
-                current_market_data = %s,
-                expires_at = %s
-        """, (user_id, json.dumps(market_data), datetime.now().date(), 
-               (datetime.now() + timedelta(hours=24)).date(),
-               json.dumps(market_data), 
-               (datetime.now() + timedelta(hours=24)).date()))
-        
-        conn.commit()
-        cursor.close()
-        conn.close()
+        save_market_snapshot(market_data)
         return True
         
     except Exception as e:
@@ -192,41 +263,23 @@ def update_market_data(user_id: str, market_data: Dict[str, Any]):
         return False
 
 def get_current_market_data(user_id: str) -> Dict[str, Any]:
-    """Get current market data for user"""
-    try:
-        conn = get_db_connection()
-        cursor = conn.cursor()
-        
-        cursor.execute(f"""
-            SELECT current_market_data FROM {SHORT_TERM_DB}
-            WHERE user_id = %s AND expires_at > CURRENT_DATE
-        """, (user_id,))
-        
-        result = cursor.fetchone()
-        cursor.close()
-        conn.close()
-        
-        return result[0] if result and result[0] else {}
-        
-    except Exception as e:
-        print(f"Error retrieving market data: {e}")
-        return {}
+    """Get current market data (the latest shared snapshot, same for every user)"""
+    return get_current_snapshot_or_empty()
 
 def cleanup_expired_entries():
     """Remove all expired entries (older than 24 hours)"""
     try:
-        conn = get_db_connection()
-        cursor = conn.cursor()
+        with get_db_connection() as conn:
+            cursor = conn.cursor()
         
-        cursor.execute(f"""
-            DELETE FROM {SHORT_TERM_DB}
-            WHERE expires_at < CURRENT_DATE
-        """)
+            cursor.execute(f"""
+                DELETE FROM {SHORT_TERM_DB}
+                WHERE expires_at < CURRENT_DATE
+            """)
         
-        deleted_count = cursor.rowcount
-        conn.commit()
-        cursor.close()
-        conn.close()
+            deleted_count = cursor.rowcount
+            conn.commit()
+            cursor.close()
         
         print(f"Cleaned up {deleted_count} expired entries")
         return deleted_count
@@ -257,17 +310,22 @@ def get_user_preferences(user_id: str) -> Dict[str, Any]:
 def clear_user_data(user_id: str):
     """Clear all data for a user"""
     try:
-        conn = get_db_connection()
-        cursor = conn.cursor()
+        _ensure_conversation_table()
+        with get_db_connection() as conn:
+            cursor = conn.cursor()
         
-        cursor.execute(f"""
-            DELETE FROM {SHORT_TERM_DB}
-            WHERE user_id = %s
-        """, (user_id,))
+            cursor.execute(f"""
+                DELETE FROM {SHORT_TERM_DB}
+                WHERE user_id = %s
+            """, (user_id,))
+
+            cursor.execute(f"""
+                DELETE FROM {CONVERSATION_DB}
+                WHERE user_id = %s
+            """, (user_id,))
         
-        conn.commit()
-        cursor.close()
-        conn.close()
+            conn.commit()
+            cursor.close()
         return True
         
     except Exception as e:
@@ -277,19 +335,21 @@ def clear_user_data(user_id: str):
 def get_user_data_summary(user_id: str) -> Dict[str, Any]:
     """Get comprehensive summary of user's data including expiry info and cache details"""
     try:
-        conn = get_db_connection()
-        cursor = conn.cursor()
+        _ensure_conversation_table()
+        with get_db_connection() as conn:
+            cursor = conn.cursor()
         
-        cursor.execute(f"""
-            SELECT recent_messages, current_cache, current_market_data, 
-                   created_at, expires_at
-            FROM {SHORT_TERM_DB}
-            WHERE user_id = %s AND expires_at > CURRENT_DATE
-        """, (user_id,))
+            cursor.execute(f"""
+                SELECT (SELECT count(*) FROM {CONVERSATION_DB}
+                        WHERE user_id = %s
+                          AND created_at > now() - interval '{MESSAGE_EXPIRY_HOURS} hours'),
+                       current_cache, created_at, expires_at
+                FROM {SHORT_TERM_DB}
+                WHERE user_id = %s AND expires_at > CURRENT_DATE
+            """, (user_id, user_id))
         
-        result = cursor.fetchone()
-        cursor.close()
-        conn.close()
+            result = cursor.fetchone()
+            cursor.close()
         
         if not result:
             return {
@@ -304,7 +364,8 @@ def get_user_data_summary(user_id: str) -> Dict[str, Any]:
                 "execution_status": "no_data"
             }
         
-        messages, cache, market_data, created_at, expires_at = result
+        message_count, cache, created_at, expires_at = result
+        market_data = get_current_snapshot_or_empty()
         
         # Calculate time until expiry
         time_until_expiry = expires_at - datetime.now().date()
@@ -342,7 +403,7 @@ def get_user_data_summary(user_id: str) -> Dict[str, Any]:
         
         return {
             "user_id": user_id,
-            "message_count": len(messages) if messages else 0,
+            "message_count": min(message_count, RECENT_MESSAGE_LIMIT),
             "cache_keys": list(cache.keys()) if cache else [],
             "market_data_keys": list(market_data.keys()) if market_data else [],
             "created_at": created_at,
@@ -419,3 +480,222 @@ def get_comprehensive_cache(user_id: str) -> Dict[str, Any]:
     except Exception as e:
         print(f"Error getting comprehensive cache: {e}")
         return {"error": str(e)}
+
+
+# Request-scoped session
+# ----------------------
+# A UserSession loads the user's short_term_memory row and recent conversation
+# with a single SELECT, serves every read from memory and buffers writes until
+# flush(), which appends new messages and merges the changed cache keys back in
+# one transaction. While a session is active for a user
+# (see user_session / with_user_session) the module-level functions above are
+# routed through it, so callers don't need to know whether one is open.
+# State that must survive the request failing (command stack progress) is written
+# through with flush_current_cache. Once a session has closed, writes that still
+# reach it (threads that outlived the request) are flushed straight away.
+
+_active_session = contextvars.ContextVar("short_term_user_session", default=None)
+
+
+class UserSession:
+    """In-memory view of one user's short_term_memory row for the duration of a request"""
+
+    def __init__(self, user_id: str):
+        self.user_id = user_id
+        self._lock = threading.RLock()
+        self._loaded = False
+        self.recent_messages = []
+        self._new_messages = []
+        self.current_cache = {}
+        self._dirty_cache_keys = set()
+        self.created_at = None
+        self.expires_at = None
+        self.closed = False
+
+    def _ensure_loaded(self):
+        if self._loaded:
+            return
+        with self._lock:
+            if self._loaded:
+                return
+            try:
+                _ensure_conversation_table()
+                with get_db_connection() as conn:
+                    cursor = conn.cursor()
+                    # The LEFT JOIN always yields one row, so messages load even
+                    # when the user has no short_term_memory row yet
+                    cursor.execute(f"""
+                        SELECT s.current_cache, s.created_at, s.expires_at,
+                               (SELECT COALESCE(json_agg(recent.message ORDER BY recent.seq), '[]'::json)
+                                FROM (
+                                    SELECT seq, message FROM {CONVERSATION_DB}
+                                    WHERE user_id = %s
+                                      AND created_at > now() - interval '{MESSAGE_EXPIRY_HOURS} hours'
+                                    ORDER BY seq DESC
+                                    LIMIT %s
+                                ) recent)
+                        FROM (SELECT 1) one
+                        LEFT JOIN {SHORT_TERM_DB} s ON s.user_id = %s
+                    """, (self.user_id, RECENT_MESSAGE_LIMIT, self.user_id))
+                    result = cursor.fetchone()
+                    cursor.close()
+            except Exception as e:
+                print(f"Error loading user session: {e}")
+                result = None
+
+            if result:
+                cache, created_at, expires_at, messages = result
+                self.created_at = created_at
+                self.recent_messages = messages or []
+                # Expired rows start over empty, matching the server-side cache merge
+                if expires_at and expires_at > datetime.now().date():
+                    self.current_cache = cache or {}
+                    self.expires_at = expires_at
+            self._loaded = True
+
+    def get_recent_conversation(self) -> str:
+        self._ensure_loaded()
+        with self._lock:
+            return "\n".join(self.recent_messages)
+
+    def add_to_recent_conversation(self, message: str):
+        return self.add_messages_to_recent_conversation([message])
+
+    def add_messages_to_recent_conversation(self, messages: List[str]):
+        self._ensure_loaded()
+        with self._lock:
+            self.recent_messages.extend(messages)
+            self.recent_messages = self.recent_messages[-RECENT_MESSAGE_LIMIT:]
+            self._new_messages.extend(messages)
+            if self.closed:
+                return self.flush()
+        return True
+
+    def get_current_cache(self) -> Dict[str, Any]:
+        self._ensure_loaded()
+        with self._lock:
+            # Callers mutate what they get back, so hand out a copy just like a fresh read would
+            return copy.deepcopy(self.current_cache)
+
+    def update_current_cache(self, cache_data: Dict[str, Any]):
+        self._ensure_loaded()
+        with self._lock:
+            self.current_cache.update(copy.deepcopy(cache_data))
+            self._dirty_cache_keys.update(cache_data.keys())
+            if self.closed:
+                return self.flush()
+        return True
+
+    def append_to_cache_list(self, key: str, items: List[Any], extra: Dict[str, Any] = None):
+        self._ensure_loaded()
+        with self._lock:
+            existing = self.current_cache.get(key)
+            if not isinstance(existing, list):
+                existing = [] if existing is None else [existing]
+            self.current_cache[key] = existing + copy.deepcopy(items)
+            self._dirty_cache_keys.add(key)
+            if extra:
+                self.current_cache.update(copy.deepcopy(extra))
+                self._dirty_cache_keys.update(extra.keys())
+            if self.closed:
+                return self.flush()
+        return True
+
+    def flush(self, include_messages: bool = True) -> bool:
+        """
+        Append new messages and write changed cache keys back in one transaction
+        With include_messages=False only the cache is written; messages stay buffered.
+        """
+        with self._lock:
+            new_messages = self._new_messages if include_messages else []
+            if not self._dirty_cache_keys and not new_messages:
+                return True
+            expires_at = (datetime.now() + timedelta(hours=24)).date()
+            # Only keys changed during the session are sent and merged server-side
+            cache_patch = {key: self.current_cache[key] for key in self._dirty_cache_keys
+                           if key in self.current_cache}
+
+            try:
+                with get_db_connection() as conn:
+                    cursor = conn.cursor()
+                    _insert_conversation_messages(cursor, self.user_id, new_messages)
+                    if self._dirty_cache_keys:
+                        cursor.execute(f"""
+                            INSERT INTO {SHORT_TERM_DB} (user_id, current_cache, created_at, expires_at)
+                            VALUES (%s, %s, %s, %s)
+                            ON CONFLICT (user_id)
+                            DO UPDATE SET
+                                current_cache = {LIVE_CACHE_SQL} || EXCLUDED.current_cache::jsonb,
+                                expires_at = EXCLUDED.expires_at
+                        """, (self.user_id, json.dumps(cache_patch),
+                              datetime.now().date(), expires_at))
+                        self.expires_at = expires_at
+                    conn.commit()
+                    cursor.close()
+                self._dirty_cache_keys.clear()
+                if include_messages:
+                    self._new_messages = []
+                return True
+
+            except Exception as e:
+                print(f"Error flushing user session: {e}")
+                return False
+
+    def close(self) -> bool:
+        """Flush, and from now on write through instead of buffering"""
+        with self._lock:
+            self.closed = True
+            return self.flush()
+
+
+def get_active_session(user_id: str):
+    """Get the session open for this user in the current context, if any"""
+    session = _active_session.get()
+    if session is not None and user_id is not None and session.user_id == user_id:
+        return session
+    return None
+
+
+@contextmanager
+def user_session(user_id: str):
+    """
+    Open a UserSession for the duration of a block and flush it on exit
+    Re-entering for the same user reuses the open session.
+    """
+    existing = get_active_session(user_id)
+    if existing is not None or not user_id:
+        yield existing
+        return
+
+    session = UserSession(user_id)
+    token = _active_session.set(session)
+    try:
+        yield session
+    finally:
+        _active_session.reset(token)
+        session.close()
+
+
+def flush_current_cache(user_id: str) -> bool:
+    """
+    Write the open session's cache changes to Postgres now, for state that must not
+    wait for the end of the request; buffered conversation messages are left alone
+    so the history keeps its order. Without a session writes are already direct.
+    """
+    session = get_active_session(user_id)
+    if session is None:
+        return True
+    return session.flush(include_messages=False)
+
+
+def with_user_session(func):
+    """Decorator that runs func inside a user_session for its user_id argument"""
+    signature = inspect.signature(func)
+
+    @functools.wraps(func)
+    def wrapper(*args, **kwargs):
+        user_id = signature.bind(*args, **kwargs).arguments.get("user_id")
+        with user_session(user_id):
+            return func(*args, **kwargs)
+
+    return wrapper
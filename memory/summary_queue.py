@@ -0,0 +1,146 @@
+import os
+import time
+import queue
+import atexit
+import threading
+from typing import Dict, Any
+from dotenv import load_dotenv
+
+load_dotenv()
+
+# Write-behind queue for storage summaries: command results are queued on the
+# request path and a background worker summarises and saves them in batches,
+# so the user's answer no longer waits on the storage summary LLM call.
+
+SUMMARY_QUEUE_MAX_SIZE = int(os.getenv("SUMMARY_QUEUE_MAX_SIZE", "1000"))
+SUMMARY_BATCH_SIZE = int(os.getenv("SUMMARY_BATCH_SIZE", "20"))
+SUMMARY_BATCH_WAIT = float(os.getenv("SUMMARY_BATCH_WAIT", "0.5"))  # seconds to fill a batch
+SUMMARY_SAVE_RETRIES = int(os.getenv("SUMMARY_SAVE_RETRIES", "3"))
+SUMMARY_DRAIN_TIMEOUT = float(os.getenv("SUMMARY_DRAIN_TIMEOUT", "30"))  # seconds to drain at exit
+
+_lock = threading.Lock()
+_state = {"pid": None, "queue": None, "thread": None}
+_stats = {
+    "enqueued": 0,
+    "dropped": 0,
+    "batches": 0,
+    "summarised": 0,
+    "summary_failures": 0,
+    "saved": 0,
+    "save_failures": 0
+}
+
+
+def _count(key: str, amount: int = 1):
+    with _lock:
+        _stats[key] += amount
+
+
+def _get_queue() -> queue.Queue:
+    with _lock:
+        if _state["pid"] != os.getpid():
+            # The worker thread doesn't survive a fork, so each process starts its own
+            work = queue.Queue(maxsize=SUMMARY_QUEUE_MAX_SIZE)
+            thread = threading.Thread(target=_worker, args=(work,), name="summary-writer", daemon=True)
+            _state.update({"pid": os.getpid(), "queue": work, "thread": thread})
+            thread.start()
+        return _state["queue"]
+
+
+def enqueue_summary(user_id: str, command_name: str, raw_result) -> bool:
+    """Queue a command result to be summarised and saved to long-term memory in the background"""
+    if not user_id:
+        return False
+    try:
+        _get_queue().put_nowait((user_id, command_name, raw_result))
+        _count("enqueued")
+        return True
+    except queue.Full:
+        _count("dropped")
+        print(f"Summary queue full, dropping summary for {command_name}")
+        return False
+
+
+def _next_batch(work: queue.Queue) -> list:
+    batch = [work.get()]
+    deadline = time.monotonic() + SUMMARY_BATCH_WAIT
+    while len(batch) < SUMMARY_BATCH_SIZE:
+        remaining = deadline - time.monotonic()
+        if remaining <= 0:
+            break
+        try:
+            batch.append(work.get(timeout=remaining))
+        except queue.Empty:
+            break
+    return batch
+
+
+def _process_batch(batch: list):
+    # Imported lazily so importing the queue doesn't pull in the LLM client
+    from llm_model import call_gpt_concurrently
+    from utils.storage_summariser import build_summary_request
+    from memory.long_term_db import save_results
+
+    summaries = call_gpt_concurrently(
+        [build_summary_request(command_name, raw_result) for _, command_name, raw_result in batch],
+        return_exceptions=True
+    )
+
+    rows = []
+    for (user_id, command_name, _), summary in zip(batch, summaries):
+        if isinstance(summary, BaseException) or not summary:
+            print(f"Error summarising {command_name} result: {summary}")
+            _count("summary_failures")
+            continue
+        rows.append((user_id, command_name, summary))
+    _count("summarised", len(rows))
+
+    for attempt in range(SUMMARY_SAVE_RETRIES):
+        if save_results(rows):
+            _count("saved", len(rows))
+            return
+        time.sleep(min(2 ** attempt, 10))
+    _count("save_failures", len(rows))
+
+
+def _worker(work: queue.Queue):
+    while True:
+        batch = _next_batch(work)
+        try:
+            _count("batches")
+            _process_batch(batch)
+        except Exception as e:
+            print(f"Error writing summary batch: {e}")
+            _count("summary_failures", len(batch))
+        finally:
+            for _ in batch:
+                work.task_done()
+
+
+def drain_summary_queue(timeout: float = SUMMARY_DRAIN_TIMEOUT) -> bool:
+    """Wait until every queued summary has been written (or the timeout passes)"""
+    with _lock:
+        work = _state["queue"] if _state["pid"] == os.getpid() else None
+    if work is None:
+        return True
+
+    deadline = time.monotonic() + timeout
+    while work.unfinished_tasks:
+        if time.monotonic() >= deadline:
+            print(f"Timed out draining summary queue, {work.unfinished_tasks} summaries not written")
+            return False
+        time.sleep(0.05)
+    return True
+
+
+def get_summary_queue_stats() -> Dict[str, Any]:
+    """Queue depth and write-behind counters for this process"""
+    with _lock:
+        stats = dict(_stats)
+        work = _state["queue"] if _state["pid"] == os.getpid() else None
+    stats["pending"] = work.unfinished_tasks if work is not None else 0
+    stats["max_size"] = SUMMARY_QUEUE_MAX_SIZE
+    return stats
+
+
+atexit.register(drain_summary_queue)
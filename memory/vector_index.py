@@ -0,0 +1,321 @@
+# memory/vector_index.py
+# Local vector index: embeddings live in a memory-mapped float32 matrix (one row per
+# entry, L2-normalised so cosine similarity is a dot product) and an SQLite side
+# table maps each row to its doc id, text and metadata. Inserts append rows (or
+# overwrite a doc's row in place) without rebuilding, and the matrix file grows by
+# doubling. Worker processes share the files: writers serialise on a file lock and
+# publish new rows by committing the row count, readers pick it up on their next search.
+# Rows overwritten in place are logged with an increasing sequence number, so the
+# ANN model (below) can re-encode them.
+#
+# With ann=True, searches over ANN_MIN_ENTRIES rows go through an IVF-PQ model
+# (memory/ivf_pq.py) and only its best candidates are scored exactly. The model is
+# retrained in the background once the entries added or overwritten since training
+# reach ANN_RETRAIN_GROWTH, or once it has changed and is older than ANN_RETRAIN_SECONDS.
+
+import os
+import json
+import fcntl
+import sqlite3
+import time
+import threading
+from contextlib import contextmanager
+from typing import Dict, List, Any, Optional
+import numpy as np
+from dotenv import load_dotenv
+from memory.ivf_pq import IVFPQ, ANN_NPROBE
+
+load_dotenv()
+
+VECTORS_FILE = "vectors.f32"
+METADATA_FILE = "entries.sqlite"
+LOCK_FILE = "index.lock"
+TRAIN_LOCK_FILE = "train.lock"
+
+INITIAL_CAPACITY = 1024
+# Rows scored per matrix-vector product, bounding the scratch memory a search uses
+SEARCH_CHUNK_ROWS = 65536
+
+# Below this many entries exact search is fast enough, so the ANN model isn't used
+ANN_MIN_ENTRIES = int(os.getenv("ANN_MIN_ENTRIES", "200000"))
+# Candidates scored exactly per result wanted
+ANN_RERANK_FACTOR = int(os.getenv("ANN_RERANK_FACTOR", "50"))
+# Retrain once entries added or overwritten since training reach this fraction of the trained ones...
+ANN_RETRAIN_GROWTH = float(os.getenv("ANN_RETRAIN_GROWTH", "0.2"))
+# ...or once the model is this old (seconds, 0 = never) and anything was added
+ANN_RETRAIN_SECONDS = float(os.getenv("ANN_RETRAIN_SECONDS", "86400"))
+
+
+class VectorIndexError(Exception):
+    """Raised when vectors don't match the index (wrong dimension, bad input)"""
+
+
+def normalize_rows(vectors) -> np.ndarray:
+    """float32 copy of vectors (one per row) scaled to unit length"""
+    matrix = np.array(vectors, dtype=np.float32, ndmin=2)
+    norms = np.linalg.norm(matrix, axis=1, keepdims=True)
+    norms[norms == 0] = 1.0
+    return matrix / norms
+
+
+class VectorIndex:
+    """Memory-mapped cosine-similarity index with an id → metadata table"""
+
+    def __init__(self, path: str, ann: bool = False):
+        self.path = path
+        os.makedirs(path, exist_ok=True)
+        self._vectors_path = os.path.join(path, VECTORS_FILE)
+        self._lock_path = os.path.join(path, LOCK_FILE)
+        self._metadata_path = os.path.join(path, METADATA_FILE)
+
+        self._lock = threading.RLock()
+        self._local = threading.local()
+        self._matrix = None  # np.memmap of shape (capacity, dim)
+        self._dim = None
+        self._ann = IVFPQ(path) if ann else None
+        self._training = None  # background retrain thread
+
+        with self._connection() as conn:
+            conn.execute("""
+                CREATE TABLE IF NOT EXISTS entries (
+                    row INTEGER PRIMARY KEY,
+                    doc_id TEXT UNIQUE NOT NULL,
+                    text TEXT NOT NULL,
+                    metadata TEXT NOT NULL DEFAULT '{}',
+                    created_at TEXT NOT NULL DEFAULT CURRENT_TIMESTAMP
+                )
+            """)
+            conn.execute("CREATE TABLE IF NOT EXISTS index_state (key TEXT PRIMARY KEY, value INTEGER NOT NULL)")
+            # Rows overwritten in place, with the overwrite_seq of their latest overwrite
+            conn.execute("CREATE TABLE IF NOT EXISTS overwrites (row INTEGER PRIMARY KEY, seq INTEGER NOT NULL)")
+            conn.execute("CREATE INDEX IF NOT EXISTS overwrites_seq_idx ON overwrites (seq)")
+
+    @contextmanager
+    def _connection(self):
+        # One SQLite connection per thread and process (connections don't survive a fork)
+        conn = getattr(self._local, "conn", None)
+        if conn is None or self._local.pid != os.getpid():
+            conn = sqlite3.connect(self._metadata_path, timeout=30)
+            conn.execute("PRAGMA journal_mode=WAL")
+            self._local.conn, self._local.pid = conn, os.getpid()
+        with conn:
+            yield conn
+
+    @contextmanager
+    def _write_lock(self):
+        # Threads in this process, then other processes sharing the files
+        with self._lock, open(self._lock_path, "a") as lock_file:
+            fcntl.flock(lock_file, fcntl.LOCK_EX)
+            try:
+                yield
+            finally:
+                fcntl.flock(lock_file, fcntl.LOCK_UN)
+
+    def _state(self, conn) -> Dict[str, int]:
+        return dict(conn.execute("SELECT key, value FROM index_state").fetchall())
+
+    def _map(self, dim: int, min_rows: int):
+        """Map the matrix file with room for at least min_rows rows, growing it if needed"""
+        row_bytes = dim * 4
+        size = os.path.getsize(self._vectors_path) if os.path.exists(self._vectors_path) else 0
+        capacity = size // row_bytes
+        if capacity < min_rows:
+            capacity = max(INITIAL_CAPACITY, capacity)
+            while capacity < min_rows:
+                capacity *= 2
+            # Extending the file keeps existing rows where they are
+            with open(self._vectors_path, "ab") as f:
+                f.truncate(capacity * row_bytes)
+        if self._matrix is None or self._matrix.shape != (capacity, dim):
+            self._matrix = np.memmap(self._vectors_path, dtype=np.float32, mode="r+", shape=(capacity, dim))
+            self._dim = dim
+        return self._matrix
+
+    def count(self) -> int:
+        with self._connection() as conn:
+            return self._state(conn).get("count", 0)
+
+    def add(self, items: List[Dict[str, Any]]) -> int:
+        """
+        Insert or replace entries
+        Each item is {"doc_id", "text", "vector", optional "metadata"}; an existing
+        doc_id has its row overwritten in place. Returns the number of entries written.
+        """
+        if not items:
+            return 0
+        vectors = normalize_rows([item["vector"] for item in items])
+        if vectors.ndim != 2 or len(vectors) != len(items):
+            raise VectorIndexError("Every item needs one vector")
+
+        with self._write_lock(), self._connection() as conn:
+            state = self._state(conn)
+            dim = state.get("dim") or vectors.shape[1]
+            if vectors.shape[1] != dim:
+                raise VectorIndexError(f"Index holds {dim}-dimensional vectors, got {vectors.shape[1]}")
+            count = state.get("count", 0)
+
+            existing = {}
+            doc_ids = [str(item["doc_id"]) for item in items]
+            for start in range(0, len(doc_ids), 500):
+                batch = doc_ids[start:start + 500]
+                existing.update(conn.execute(
+                    f"SELECT doc_id, row FROM entries WHERE doc_id IN ({','.join('?' * len(batch))})", batch
+                ).fetchall())
+
+            overwritten = sorted({existing[doc_id] for doc_id in doc_ids if doc_id in existing})
+            rows = []
+            for doc_id in doc_ids:
+                if doc_id not in existing:
+                    existing[doc_id] = count
+                    count += 1
+                rows.append(existing[doc_id])
+
+            matrix = self._map(dim, count)
+            matrix[rows] = vectors
+            matrix.flush()
+
+            # Committing the new count is what makes the rows visible to searches
+            conn.executemany("""
+                INSERT INTO entries (row, doc_id, text, metadata) VALUES (?, ?, ?, ?)
+                ON CONFLICT(doc_id) DO UPDATE SET text = excluded.text, metadata = excluded.metadata
+            """, [(row, doc_id, item["text"], json.dumps(item.get("metadata") or {}, default=str))
+                  for row, doc_id, item in zip(rows, doc_ids, items)])
+            updates = [("dim", dim), ("count", count)]
+            if overwritten:
+                overwrite_seq = state.get("overwrite_seq", 0) + 1
+                conn.executemany("INSERT OR REPLACE INTO overwrites (row, seq) VALUES (?, ?)",
+                                 [(row, overwrite_seq) for row in overwritten])
+                updates.append(("overwrite_seq", overwrite_seq))
+            conn.executemany("INSERT OR REPLACE INTO index_state (key, value) VALUES (?, ?)", updates)
+        return len(items)
+
+    def search(self, vector, k: int = 5, min_score: float = None, nprobe: int = None,
+               rerank_factor: int = None, exact: bool = False) -> List[Dict[str, Any]]:
+        """
+        Top-k entries by cosine similarity, best first: [{"doc_id", "text", "metadata", "score"}]
+        Uses the ANN model when enabled and trained, unless exact is set; nprobe and
+        rerank_factor override ANN_NPROBE and ANN_RERANK_FACTOR.
+        """
+        with self._connection() as conn:
+            state = self._state(conn)
+        count = state.get("count", 0)
+        if count == 0 or k <= 0:
+            return []
+
+        query = normalize_rows(vector)[0]
+        if query.shape[0] != state["dim"]:
+            raise VectorIndexError(f"Index holds {state['dim']}-dimensional vectors, got {query.shape[0]}")
+
+        with self._lock:
+            matrix = self._map(state["dim"], count)
+
+        if self._ann is not None and not exact and count >= ANN_MIN_ENTRIES:
+            ready = self._ann.load() and self._ann.dim == state["dim"]
+            if ready:
+                self._ann.extend(matrix, count)
+                self._sync_overwrites(matrix, state.get("overwrite_seq", 0))
+            self._maybe_retrain(count)
+            if ready:
+                limit = k * (rerank_factor or ANN_RERANK_FACTOR)
+                rows = np.sort(self._ann.candidates(query, nprobe or ANN_NPROBE, limit))
+                scores = matrix[rows] @ query
+                return self._top(rows, scores, k, min_score)
+
+        scores = np.empty(count, dtype=np.float32)
+        for start in range(0, count, SEARCH_CHUNK_ROWS):
+            end = min(start + SEARCH_CHUNK_ROWS, count)
+            np.dot(matrix[start:end], query, out=scores[start:end])
+        return self._top(np.arange(count), scores, k, min_score)
+
+    def _top(self, rows, scores, k: int, min_score: float = None) -> List[Dict[str, Any]]:
+        k = min(k, len(rows))
+        if k == 0:
+            return []
+        top = np.argpartition(scores, len(rows) - k)[len(rows) - k:]
+        top = top[np.argsort(scores[top])[::-1]]
+        if min_score is not None:
+            top = top[scores[top] >= min_score]
+        return self._describe([(int(rows[i]), float(scores[i])) for i in top])
+
+    def _describe(self, matches) -> List[Dict[str, Any]]:
+        if not matches:
+            return []
+        rows = [row for row, _ in matches]
+        with self._connection() as conn:
+            found = {row: (doc_id, text, metadata) for row, doc_id, text, metadata in conn.execute(
+                f"SELECT row, doc_id, text, metadata FROM entries WHERE row IN ({','.join('?' * len(rows))})", rows
+            ).fetchall()}
+        return [
+            {"doc_id": found[row][0], "text": found[row][1], "metadata": json.loads(found[row][2]), "score": score}
+            for row, score in matches if row in found
+        ]
+
+    def _sync_overwrites(self, matrix, overwrite_seq: int):
+        """Re-encode rows overwritten since this process last looked"""
+        if overwrite_seq <= self._ann.updated_seq:
+            return
+        with self._connection() as conn:
+            rows = [row for (row,) in conn.execute("SELECT row FROM overwrites WHERE seq > ?",
+                                                   (self._ann.updated_seq,)).fetchall()]
+        self._ann.refresh_rows(matrix, rows, overwrite_seq)
+
+    def _needs_training(self, count: int) -> bool:
+        if not self._ann.load():
+            return True
+        changed = self._ann.changed_rows(count)
+        if changed >= ANN_RETRAIN_GROWTH * self._ann.trained_rows:
+            return True
+        return bool(ANN_RETRAIN_SECONDS) and changed > 0 and self._ann.age() >= ANN_RETRAIN_SECONDS
+
+    def _maybe_retrain(self, count: int):
+        with self._lock:
+            if self._training is not None and self._training.is_alive():
+                return
+            if not self._needs_training(count):
+                return
+            # Searches keep using the current model (or exact search) while this runs
+            self._training = threading.Thread(target=self.train_ann, kwargs={"wait": False},
+                                              name="ann-train", daemon=True)
+            self._training.start()
+
+    def train_ann(self, wait: bool = True) -> bool:
+        """
+        Train the ANN model on every entry and publish it to all processes using this index
+        Only one process trains at a time; with wait=False this returns False if another is.
+        """
+        if self._ann is None:
+            raise VectorIndexError("Index was opened without ann=True")
+        with open(os.path.join(self.path, TRAIN_LOCK_FILE), "a") as lock_file:
+            try:
+                fcntl.flock(lock_file, fcntl.LOCK_EX if wait else fcntl.LOCK_EX | fcntl.LOCK_NB)
+            except BlockingIOError:
+                return False
+            try:
+                with self._connection() as conn:
+                    state = self._state(conn)
+                count = state.get("count", 0)
+                if count == 0:
+                    return False
+                # Another process may have just trained
+                if not wait and self._ann.load() and not self._needs_training(count):
+                    return False
+                with self._lock:
+                    matrix = self._map(state["dim"], count)
+                overwrite_seq = state.get("overwrite_seq", 0)
+                start = time.monotonic()
+                self._ann.train(matrix, count, overwrite_seq)
+                # Overwrites up to the sequence read before training are in the new codes
+                with self._connection() as conn:
+                    conn.execute("DELETE FROM overwrites WHERE seq <= ?", (overwrite_seq,))
+                print(f"Trained ANN model on {count} entries in {time.monotonic() - start:.1f}s")
+                return True
+            except Exception as e:
+                print(f"Error training ANN model: {e}")
+                return False
+            finally:
+                fcntl.flock(lock_file, fcntl.LOCK_UN)
+
+    def get(self, doc_id: str) -> Optional[Dict[str, Any]]:
+        with self._connection() as conn:
+            row = conn.execute("SELECT text, metadata FROM entries WHERE doc_id = ?", (str(doc_id),)).fetchone()
+        return {"doc_id": str(doc_id), "text": row[0], "metadata": json.loads(row[1])} if row else None
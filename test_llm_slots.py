@@ -0,0 +1,86 @@
+#!/usr/bin/env python3
+"""
+Test the process-wide LLM concurrency limit
+With every slot busy, a call made outside any deadline must wait for a slot,
+and a call under a deadline must give up with DeadlineExceeded once it passes.
+No API calls are made: the OpenAI client is replaced with a stub.
+"""
+
+import os
+import sys
+import time
+import threading
+from types import SimpleNamespace
+
+# Add the current directory to Python path
+sys.path.append(os.path.dirname(os.path.abspath(__file__)))
+os.environ.setdefault("OPENAI_API_KEY", "test")
+
+import llm_model
+from utils.deadline import deadline_scope, DeadlineExceeded
+
+
+def _stub_create(**kwargs):
+    message = SimpleNamespace(content="stub reply")
+    return SimpleNamespace(choices=[SimpleNamespace(message=message)], usage=None)
+
+
+def _hold_all_slots():
+    for _ in range(llm_model.LLM_MAX_CONCURRENCY):
+        llm_model._acquire_slot()
+
+
+def _release_all_slots():
+    for _ in range(llm_model.LLM_MAX_CONCURRENCY):
+        llm_model._release_slot()
+
+
+def test_call_without_deadline_waits():
+    """A call with no deadline blocks until a slot is released, then succeeds"""
+    _hold_all_slots()
+    outcome = {}
+
+    def call():
+        try:
+            outcome["reply"] = llm_model.call_gpt("system", "user")
+        except Exception as e:
+            outcome["error"] = e
+
+    worker = threading.Thread(target=call)
+    worker.start()
+    time.sleep(0.3)
+    assert worker.is_alive() and not outcome, f"call should be waiting for a slot, got {outcome}"
+
+    llm_model._release_slot()
+    worker.join(timeout=5)
+    assert outcome.get("reply") == "stub reply", f"call should succeed once a slot frees up, got {outcome}"
+
+    # The call released its own slot; release the ones still held here
+    for _ in range(llm_model.LLM_MAX_CONCURRENCY - 1):
+        llm_model._release_slot()
+    print("✅ Call without a deadline waited for a free slot")
+
+
+def test_call_with_deadline_gives_up():
+    """A call under a deadline raises DeadlineExceeded when no slot frees up in time"""
+    _hold_all_slots()
+    try:
+        start = time.monotonic()
+        with deadline_scope(0.3):
+            llm_model.call_gpt("system", "user")
+        raise AssertionError("call should have raised DeadlineExceeded")
+    except DeadlineExceeded:
+        waited = time.monotonic() - start
+        assert 0.2 < waited < 2, f"should give up at the deadline, waited {waited:.2f}s"
+        print(f"✅ Call under a deadline gave up after {waited:.2f}s")
+    finally:
+        _release_all_slots()
+
+
+if __name__ == "__main__":
+    llm_model.client.chat.completions.create = _stub_create
+    test_call_without_deadline_waits()
+    test_call_with_deadline_gives_up()
+    stats = llm_model.get_llm_cache_stats()
+    assert stats["in_flight"] == 0, f"slots leaked: {stats}"
+    print("✅ All LLM slot tests passed")
@@ -0,0 +1,107 @@
+#!/usr/bin/env python3
+"""
+Test the knowledge vector index's ANN (IVF-PQ) mode with updated entries
+Re-adding a doc_id overwrites its vector in place; approximate search must find
+the entry by its new vector (in this process and after another process updates
+it), and overwrites must count towards retraining. Runs on a temporary index of
+random vectors, no API calls.
+"""
+
+import os
+import sys
+import shutil
+import tempfile
+import subprocess
+import numpy as np
+
+# Small thresholds so a test-sized index uses the ANN path; set before importing the index
+os.environ["ANN_MIN_ENTRIES"] = "1000"
+os.environ["ANN_RETRAIN_GROWTH"] = "0.05"
+os.environ["ANN_RETRAIN_SECONDS"] = "0"
+os.environ["ANN_TRAIN_SAMPLE"] = "20000"
+
+# Add the current directory to Python path
+sys.path.append(os.path.dirname(os.path.abspath(__file__)))
+
+from memory.vector_index import VectorIndex
+
+ENTRIES = 20000
+DIM = 32
+
+
+def _random_vectors(seed, count):
+    return np.random.default_rng(seed).standard_normal((count, DIM)).astype(np.float32)
+
+
+def _top_doc(index, vector, **kwargs):
+    matches = index.search(vector, k=1, **kwargs)
+    return (matches[0]["doc_id"], matches[0]["score"]) if matches else (None, None)
+
+
+def test_updated_entry_found_by_ann(path):
+    """An entry re-added with a new vector is found by ANN search for that vector"""
+    index = VectorIndex(path, ann=True)
+    vectors = _random_vectors(0, ENTRIES)
+    index.add([{"doc_id": f"d{i}", "text": f"doc {i}", "vector": vectors[i]} for i in range(ENTRIES)])
+    assert index.train_ann(), "training should succeed"
+    assert _top_doc(index, vectors[5])[0] == "d5", "trained entry should be found"
+
+    new_vector = _random_vectors(1, 1)[0]
+    index.add([{"doc_id": "d5", "text": "doc 5 updated", "vector": new_vector}])
+    assert index.count() == ENTRIES, "an update must not append a row"
+
+    exact_doc, exact_score = _top_doc(index, new_vector, exact=True)
+    ann_doc, ann_score = _top_doc(index, new_vector)
+    assert exact_doc == "d5" and exact_score > 0.999, f"exact search should find d5, got {exact_doc}"
+    assert ann_doc == "d5" and ann_score > 0.999, f"ANN search should find updated d5, got {ann_doc} {ann_score}"
+    print("✅ Updated entry found by ANN search")
+    return index
+
+
+def test_update_from_other_process(index, path):
+    """An update made by another worker process is picked up on the next ANN search"""
+    script = (
+        "import numpy as np\n"
+        "from memory.vector_index import VectorIndex\n"
+        f"vector = np.random.default_rng(2).standard_normal({DIM}).astype(np.float32)\n"
+        f"VectorIndex({path!r}, ann=True).add([{{'doc_id': 'd7', 'text': 'doc 7 updated', 'vector': vector}}])\n"
+    )
+    subprocess.run([sys.executable, "-c", script], check=True, env=os.environ,
+                   cwd=os.path.dirname(os.path.abspath(__file__)))
+
+    new_vector = np.random.default_rng(2).standard_normal(DIM).astype(np.float32)
+    ann_doc, ann_score = _top_doc(index, new_vector)
+    assert ann_doc == "d7" and ann_score > 0.999, f"ANN search should find d7 updated elsewhere, got {ann_doc}"
+    print("✅ Update from another process found by ANN search")
+
+
+def test_overwrites_trigger_retrain(index):
+    """Overwriting enough entries makes the model due for retraining, and retraining clears the log"""
+    count = index.count()
+    assert not index._needs_training(count), "two overwrites should not need a retrain yet"
+
+    updated = _random_vectors(3, 1500)
+    index.add([{"doc_id": f"d{100 + i}", "text": f"doc {100 + i} updated", "vector": updated[i]}
+               for i in range(len(updated))])
+    # Pick up the overwrites the way a search does, without starting a background retrain
+    with index._connection() as conn:
+        state = index._state(conn)
+    index._sync_overwrites(index._map(DIM, count), state["overwrite_seq"])
+    assert index._ann.changed_rows(count) == 1502, f"got {index._ann.changed_rows(count)} changed rows"
+    assert index._needs_training(count), "overwrites above ANN_RETRAIN_GROWTH should need a retrain"
+
+    assert index.train_ann(), "retraining should succeed"
+    assert not index._needs_training(count), "a fresh model should not need a retrain"
+    assert _top_doc(index, updated[10])[0] == "d110", "overwritten entry should be found after retraining"
+    print("✅ Overwrites counted towards retraining")
+
+
+if __name__ == "__main__":
+    path = tempfile.mkdtemp(prefix="vector-index-test-")
+    try:
+        index = test_updated_entry_found_by_ann(path)
+        test_update_from_other_process(index, path)
+        test_overwrites_trigger_retrain(index)
+        print("✅ All vector index tests passed")
+    finally:
+        shutil.rmtree(path, ignore_errors=True)
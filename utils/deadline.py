@@ -0,0 +1,84 @@
+# utils/deadline.py
+# Request-scoped deadline carried in a contextvar. A scope can only tighten the
+# deadline it inherits, and HTTP/LLM calls clamp their timeouts to what is left,
+# so a request's budget bounds everything it triggers (including worker threads
+# that run in a copy of its context).
+
+import os
+import time
+import functools
+import contextvars
+from contextlib import contextmanager
+from dotenv import load_dotenv
+
+load_dotenv()
+
+# Overall budget for one chat request (seconds)
+REQUEST_DEADLINE_SECONDS = float(os.getenv("REQUEST_DEADLINE_SECONDS", "180"))
+
+_deadline = contextvars.ContextVar("deadline", default=None)  # time.monotonic() value or None
+
+
+class DeadlineExceeded(TimeoutError):
+    """Raised when work is attempted after the current deadline has passed"""
+
+
+@contextmanager
+def deadline_scope(seconds: float):
+    """Run a block with at most `seconds` left (never extends an outer deadline)"""
+    deadline = time.monotonic() + seconds
+    current = _deadline.get()
+    if current is not None:
+        deadline = min(deadline, current)
+    token = _deadline.set(deadline)
+    try:
+        yield deadline
+    finally:
+        _deadline.reset(token)
+
+
+def remaining():
+    """Seconds left before the current deadline, or None when there is no deadline"""
+    deadline = _deadline.get()
+    if deadline is None:
+        return None
+    return max(0.0, deadline - time.monotonic())
+
+
+def is_expired() -> bool:
+    left = remaining()
+    return left is not None and left <= 0
+
+
+def check_deadline(what: str = "operation"):
+    """Raise DeadlineExceeded if the current deadline has passed"""
+    if is_expired():
+        raise DeadlineExceeded(f"Deadline exceeded before {what}")
+
+
+def clamp_timeout(timeout):
+    """
+    A timeout no longer than the time left
+    Accepts a number, a (connect, read) tuple or None; raises DeadlineExceeded if no time is left.
+    """
+    left = remaining()
+    if left is None:
+        return timeout
+    if left <= 0:
+        raise DeadlineExceeded("Deadline exceeded")
+    if timeout is None:
+        return left
+    if isinstance(timeout, tuple):
+        return tuple(left if part is None else min(part, left) for part in timeout)
+    return min(timeout, left)
+
+
+def with_deadline(seconds: float):
+    """Decorator that runs func inside a deadline_scope of `seconds`"""
+    def decorator(func):
+        @functools.wraps(func)
+        def wrapper(*args, **kwargs):
+            with deadline_scope(seconds):
+                return func(*args, **kwargs)
+        return wrapper
+    return decorator
@@ -25,7 +25,7 @@ Return ONLY a valid JSON object with the extracted fields. If a field cannot be
 Example format: {{"field1": "value1", "field2": "value2", "field3": null}}
 """
 
-    response = call_gpt(system_prompt, prompt)
+    response = call_gpt(system_prompt, prompt, cache_ttl=3600)
 
     try:
         return json.loads(response)
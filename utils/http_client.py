@@ -0,0 +1,164 @@
+# utils/http_client.py
+# Shared HTTP client for every upstream call (RapidAPI, OpenRouter, ...). Keeps one
+# keep-alive session per host, applies default connect/read timeouts, retries
+# 429/5xx responses with jittered exponential backoff and records per-host latency.
+
+import os
+import time
+import random
+import threading
+from collections import deque
+from urllib.parse import urlparse
+from typing import Dict, Any
+import requests
+from requests.adapters import HTTPAdapter
+from dotenv import load_dotenv
+from utils.deadline import clamp_timeout, remaining
+
+load_dotenv()
+
+HTTP_CONNECT_TIMEOUT = float(os.getenv("HTTP_CONNECT_TIMEOUT", "5"))
+HTTP_READ_TIMEOUT = float(os.getenv("HTTP_READ_TIMEOUT", "30"))
+HTTP_MAX_RETRIES = int(os.getenv("HTTP_MAX_RETRIES", "2"))
+HTTP_BACKOFF_BASE = float(os.getenv("HTTP_BACKOFF_BASE", "0.5"))
+HTTP_BACKOFF_MAX = float(os.getenv("HTTP_BACKOFF_MAX", "8"))
+HTTP_POOL_MAXSIZE = int(os.getenv("HTTP_POOL_MAXSIZE", "20"))
+
+# LLM-backed search answers take much longer than quote lookups
+HOST_READ_TIMEOUTS = {
+    "openrouter.ai": float(os.getenv("OPENROUTER_READ_TIMEOUT", "90"))
+}
+
+RETRY_STATUSES = {429, 500, 502, 503, 504}
+LATENCY_SAMPLES = 200  # recent requests kept per host for percentiles
+
+_lock = threading.Lock()
+_sessions = {}  # host → requests.Session
+_sessions_pid = None
+_stats = {}  # host → counters and recent latencies
+
+
+def _get_session(host: str) -> requests.Session:
+    global _sessions, _sessions_pid
+    with _lock:
+        if _sessions_pid != os.getpid():
+            # Sockets must not be shared with a parent process after a fork
+            _sessions = {}
+            _sessions_pid = os.getpid()
+        session = _sessions.get(host)
+        if session is None:
+            session = requests.Session()
+            # Retries are handled in request() so they can be jittered and counted
+            adapter = HTTPAdapter(pool_connections=1, pool_maxsize=HTTP_POOL_MAXSIZE, max_retries=0)
+            session.mount("https://", adapter)
+            session.mount("http://", adapter)
+            _sessions[host] = session
+        return session
+
+
+def _host_stats(host: str) -> Dict[str, Any]:
+    stats = _stats.get(host)
+    if stats is None:
+        stats = _stats[host] = {
+            "requests": 0,
+            "errors": 0,
+            "retries": 0,
+            "statuses": {},
+            "latency_total": 0.0,
+            "latency_max": 0.0,
+            "recent": deque(maxlen=LATENCY_SAMPLES)
+        }
+    return stats
+
+
+def _record(host: str, latency: float, status: int = None):
+    with _lock:
+        stats = _host_stats(host)
+        stats["requests"] += 1
+        stats["latency_total"] += latency
+        stats["latency_max"] = max(stats["latency_max"], latency)
+        stats["recent"].append(latency)
+        if status is None:
+            stats["errors"] += 1
+        else:
+            stats["statuses"][str(status)] = stats["statuses"].get(str(status), 0) + 1
+
+
+def _backoff(attempt: int, response: requests.Response = None) -> float:
+    """Honour a numeric Retry-After, otherwise full-jitter exponential backoff"""
+    if response is not None:
+        retry_after = response.headers.get("Retry-After")
+        if retry_after and retry_after.isdigit():
+            return min(float(retry_after), HTTP_BACKOFF_MAX)
+    return random.uniform(0, min(HTTP_BACKOFF_MAX, HTTP_BACKOFF_BASE * (2 ** attempt)))
+
+
+def default_timeout(host: str):
+    """(connect, read) timeout used when a caller doesn't pass one"""
+    return (HTTP_CONNECT_TIMEOUT, HOST_READ_TIMEOUTS.get(host, HTTP_READ_TIMEOUT))
+
+
+def request(method: str, url: str, retries: int = None, **kwargs) -> requests.Response:
+    """
+    Send a request through the shared per-host session
+    429 and 5xx responses and connection errors/timeouts are retried up to
+    `retries` times; the last response is returned (or the last error raised).
+    Timeouts and retries never run past the current deadline (utils.deadline).
+    """
+    host = urlparse(url).netloc
+    session = _get_session(host)
+    timeout = kwargs.pop("timeout", default_timeout(host))
+    retries = HTTP_MAX_RETRIES if retries is None else retries
+
+    for attempt in range(retries + 1):
+        kwargs["timeout"] = clamp_timeout(timeout)
+        start = time.monotonic()
+        try:
+            response = session.request(method, url, **kwargs)
+        except (requests.ConnectionError, requests.Timeout):
+            _record(host, time.monotonic() - start)
+            if attempt >= retries:
+                raise
+            delay = _backoff(attempt)
+            left = remaining()
+            if left is not None and delay >= left:
+                raise
+        else:
+            _record(host, time.monotonic() - start, response.status_code)
+            if response.status_code not in RETRY_STATUSES or attempt >= retries:
+                return response
+            delay = _backoff(attempt, response)
+            left = remaining()
+            if left is not None and delay >= left:
+                # No time for another attempt; hand back what we have
+                return response
+            response.close()
+
+        with _lock:
+            _host_stats(host)["retries"] += 1
+        time.sleep(delay)
+
+
+def get(url: str, **kwargs) -> requests.Response:
+    return request("GET", url, **kwargs)
+
+
+def post(url: str, **kwargs) -> requests.Response:
+    return request("POST", url, **kwargs)
+
+
+def get_http_stats() -> Dict[str, Any]:
+    """Per-host request counts, statuses, retries and latency (seconds) for this process"""
+    with _lock:
+        snapshot = {host: dict(stats, recent=list(stats["recent"]), statuses=dict(stats["statuses"]))
+                    for host, stats in _stats.items()}
+
+    result = {}
+    for host, stats in snapshot.items():
+        recent = sorted(stats.pop("recent"))
+        count = stats["requests"]
+        stats["latency_avg"] = stats["latency_total"] / count if count else 0.0
+        stats["latency_p50"] = recent[len(recent) // 2] if recent else 0.0
+        stats["latency_p95"] = recent[min(len(recent) - 1, int(len(recent) * 0.95))] if recent else 0.0
+        result[host] = stats
+    return result
@@ -0,0 +1,49 @@
+import os
+from datetime import datetime, time, timedelta, timezone
+from zoneinfo import ZoneInfo
+from dotenv import load_dotenv
+
+load_dotenv()
+
+MARKET_TIMEZONE = ZoneInfo("America/New_York")
+MARKET_OPEN = time(9, 30)
+MARKET_CLOSE = time(16, 0)
+
+# Refresh cadence for market data (seconds)
+MARKET_REFRESH_INTERVAL_OPEN = int(os.getenv("MARKET_REFRESH_INTERVAL_OPEN", "900"))
+MARKET_REFRESH_INTERVAL_CLOSED = int(os.getenv("MARKET_REFRESH_INTERVAL_CLOSED", "3600"))
+
+# How long a quote stays fresh while the market is open (seconds)
+QUOTE_TTL_OPEN = int(os.getenv("QUOTE_TTL_OPEN", "60"))
+
+
+def is_market_open(now: datetime = None) -> bool:
+    """Whether US equity markets are in regular trading hours (holidays are not tracked)"""
+    now = (now or datetime.now(timezone.utc)).astimezone(MARKET_TIMEZONE)
+    if now.weekday() >= 5:
+        return False
+    return MARKET_OPEN <= now.time() < MARKET_CLOSE
+
+
+def get_refresh_interval(now: datetime = None) -> int:
+    """How old market data may get before it should be refreshed"""
+    return MARKET_REFRESH_INTERVAL_OPEN if is_market_open(now) else MARKET_REFRESH_INTERVAL_CLOSED
+
+
+def next_market_open(now: datetime = None) -> datetime:
+    """The next regular-session open strictly after now (holidays are not tracked)"""
+    now = (now or datetime.now(timezone.utc)).astimezone(MARKET_TIMEZONE)
+    candidate = now.replace(hour=MARKET_OPEN.hour, minute=MARKET_OPEN.minute, second=0, microsecond=0)
+    if candidate <= now:
+        candidate += timedelta(days=1)
+    while candidate.weekday() >= 5:
+        candidate += timedelta(days=1)
+    return candidate
+
+
+def get_quote_ttl(now: datetime = None) -> float:
+    """Seconds a quote stays fresh: short during trading hours, until the next open otherwise"""
+    now = now or datetime.now(timezone.utc)
+    if is_market_open(now):
+        return QUOTE_TTL_OPEN
+    return max(QUOTE_TTL_OPEN, (next_market_open(now) - now).total_seconds())
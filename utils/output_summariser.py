@@ -1,9 +1,17 @@
-from llm_model import call_gpt
+from llm_model import call_gpt, stream_gpt
 from prompt import get_plugin_system_prompt
 from memory.long_term_db import get_user_facts
 from memory.short_term_cache import get_recent_conversation, get_current_market_data
 
 def summarise_output(command_name: str, user_input: str, raw_result, user_id: str = None) -> str:
+    return call_gpt(**build_output_request(command_name, user_input, raw_result, user_id))
+
+def stream_output(command_name: str, user_input: str, raw_result, user_id: str = None):
+    """summarise_output, yielding the response text as it is generated"""
+    return stream_gpt(**build_output_request(command_name, user_input, raw_result, user_id))
+
+def build_output_request(command_name: str, user_input: str, raw_result, user_id: str = None) -> dict:
+    """call_gpt arguments for the user-facing summary (user context is read here, in the caller's thread)"""
     plugin_system_prompt = get_plugin_system_prompt()
     system_prompt = f"{plugin_system_prompt}\n\nYou are Portfolio AI's intelligent output summarizer. Your role is to transform command results into natural, personalized, and proactive user responses that leverage your full context awareness."
     
@@ -46,4 +54,4 @@ Examples of proactive additions:
 Be insightful, helpful, and always thinking one step ahead for the user.
 """
     
-    return call_gpt(system_prompt, prompt)
+    return {"system_prompt": system_prompt, "user_prompt": prompt}
@@ -0,0 +1,189 @@
+# utils/quote_client.py
+# Batched access to the RapidAPI Yahoo Finance get-quote-v2 endpoint. The endpoint
+# takes a comma-separated `symbols` list, so quotes are fetched in batches and the
+# response is spread back into per-symbol results. Successful quotes are kept in a
+# bounded in-process LRU cache whose TTL follows market hours.
+
+import os
+import copy
+import time
+import threading
+from collections import OrderedDict
+import requests
+from utils import http_client
+from utils.market_hours import get_quote_ttl
+from typing import Dict, List, Any, Iterable
+from dotenv import load_dotenv
+
+load_dotenv()
+
+QUOTE_URL = "https://yahoo-finance166.p.rapidapi.com/api/market/get-quote-v2"
+QUOTE_HOST = "yahoo-finance166.p.rapidapi.com"
+
+# Symbols per request (Yahoo's quote endpoint accepts up to 50)
+QUOTE_BATCH_SIZE = int(os.getenv("QUOTE_BATCH_SIZE", "50"))
+# Most symbols kept in the in-process quote cache
+QUOTE_CACHE_MAX_SIZE = int(os.getenv("QUOTE_CACHE_MAX_SIZE", "2000"))
+
+
+class QuoteCache:
+    """Thread-safe LRU of raw quotes, each expiring at its own deadline"""
+
+    def __init__(self, max_size: int = QUOTE_CACHE_MAX_SIZE):
+        self.max_size = max(1, max_size)
+        self._lock = threading.Lock()
+        self._entries = OrderedDict()  # symbol → (quote, expires_at monotonic)
+        self._stats = {"hits": 0, "misses": 0, "expired": 0, "evictions": 0, "fresh_requests": 0}
+
+    def get(self, symbol: str):
+        with self._lock:
+            entry = self._entries.get(symbol)
+            if entry is not None and entry[1] <= time.monotonic():
+                del self._entries[symbol]
+                self._stats["expired"] += 1
+                entry = None
+            if entry is None:
+                self._stats["misses"] += 1
+                return None
+            self._entries.move_to_end(symbol)
+            self._stats["hits"] += 1
+            return entry[0]
+
+    def set(self, symbol: str, quote: Dict[str, Any], ttl: float):
+        with self._lock:
+            self._entries[symbol] = (quote, time.monotonic() + ttl)
+            self._entries.move_to_end(symbol)
+            while len(self._entries) > self.max_size:
+                self._entries.popitem(last=False)
+                self._stats["evictions"] += 1
+
+    def record_fresh_request(self, count: int):
+        with self._lock:
+            self._stats["fresh_requests"] += count
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+
+    def get_stats(self) -> Dict[str, Any]:
+        with self._lock:
+            stats = dict(self._stats)
+            stats.update({"size": len(self._entries), "max_size": self.max_size})
+        lookups = stats["hits"] + stats["misses"]
+        stats["hit_rate"] = stats["hits"] / lookups if lookups else 0.0
+        return stats
+
+
+_quote_cache = QuoteCache()
+
+
+def _headers() -> Dict[str, str]:
+    return {
+        "x-rapidapi-key": os.getenv("RAPIDAPI_KEY"),
+        "x-rapidapi-host": QUOTE_HOST
+    }
+
+
+def _unique(symbols: Iterable[str]) -> List[str]:
+    seen = set()
+    unique = []
+    for symbol in symbols:
+        if symbol and symbol not in seen:
+            seen.add(symbol)
+            unique.append(symbol)
+    return unique
+
+
+def _fetch_batch(batch: List[str], results: Dict[str, Dict[str, Any]]):
+    """Fetch one batch into results, isolating symbols that make the whole request fail"""
+    try:
+        response = http_client.get(
+            QUOTE_URL,
+            headers=_headers(),
+            params={"symbols": ",".join(batch), "fields": "quoteSummary"}
+        )
+    except requests.RequestException as e:
+        for symbol in batch:
+            results[symbol] = {"error": f"Request failed: {e}"}
+        return
+
+    if response.status_code in (400, 404) and len(batch) > 1:
+        # A single bad symbol can reject the request, so split until it is isolated
+        middle = len(batch) // 2
+        _fetch_batch(batch[:middle], results)
+        _fetch_batch(batch[middle:], results)
+        return
+
+    if response.status_code != 200:
+        for symbol in batch:
+            results[symbol] = {"error": f"API Error: {response.status_code}"}
+        return
+
+    try:
+        quotes = response.json()['quoteResponse']['result'] or []
+    except (ValueError, KeyError, TypeError):
+        quotes = []
+
+    # Match on the returned symbol, case-insensitively, since order isn't guaranteed
+    by_symbol = {str(quote.get("symbol", "")).upper(): quote for quote in quotes}
+    for symbol in batch:
+        quote = by_symbol.get(symbol.upper())
+        results[symbol] = quote if quote is not None else {"error": "Data unavailable"}
+
+
+def get_quotes(symbols: Iterable[str], fresh: bool = False) -> Dict[str, Dict[str, Any]]:
+    """
+    Get raw quote results for many symbols with as few requests as possible
+    Cached quotes are served unless fresh=True; only the misses are fetched.
+    Returns {symbol: quote}; a symbol that could not be fetched maps to {"error": ...}.
+    """
+    symbols = _unique(symbols)
+
+    results = {}
+    if fresh:
+        _quote_cache.record_fresh_request(len(symbols))
+        missing = symbols
+    else:
+        missing = []
+        for symbol in symbols:
+            quote = _quote_cache.get(symbol)
+            if quote is None:
+                missing.append(symbol)
+            else:
+                results[symbol] = quote
+
+    batch_size = max(1, QUOTE_BATCH_SIZE)
+    fetched = {}
+    for start in range(0, len(missing), batch_size):
+        _fetch_batch(missing[start:start + batch_size], fetched)
+
+    # Errors are not cached so the next caller tries again
+    ttl = get_quote_ttl()
+    for symbol, quote in fetched.items():
+        if "error" not in quote:
+            _quote_cache.set(symbol, quote, ttl)
+    results.update(fetched)
+
+    # Callers may modify what they get back, so never hand out the cached objects
+    return {symbol: copy.deepcopy(results[symbol]) for symbol in symbols}
+
+
+def summarize_quote(quote: Dict[str, Any]) -> Dict[str, Any]:
+    """Price, change and volume from a raw quote (errors pass through unchanged)"""
+    if "error" in quote:
+        return quote
+    return {
+        "price": quote.get("regularMarketPrice"),
+        "change": quote.get("regularMarketChangePercent"),
+        "volume": quote.get("regularMarketVolume")
+    }
+
+
+def get_quote_summaries(symbols: Iterable[str], fresh: bool = False) -> Dict[str, Dict[str, Any]]:
+    """Price, change and volume for each symbol, fetched in batches"""
+    return {symbol: summarize_quote(quote) for symbol, quote in get_quotes(symbols, fresh).items()}
+
+
+def get_quote_cache_stats() -> Dict[str, Any]:
+    """Hit, miss, expiry and eviction counters for this process's quote cache"""
+    return _quote_cache.get_stats()
@@ -4,6 +4,10 @@ from llm_model import call_gpt
 from prompt import get_plugin_system_prompt
 
 def summarise_result(command_name: str, raw_result: str) -> str:
+    return call_gpt(**build_summary_request(command_name, raw_result))
+
+def build_summary_request(command_name: str, raw_result: str) -> dict:
+    """call_gpt arguments for a storage summary, so it can also run through call_gpt_concurrently"""
     plugin_system_prompt = get_plugin_system_prompt()
     system_prompt = f"{plugin_system_prompt}\n\nYou are Portfolio AI's storage summarizer. Your role is to create brief, structured summaries for data storage and retrieval."
     
@@ -26,4 +30,5 @@ Raw Result: "Portfolio created with 40% equities, 40% bonds, and 20% gold..."
 Summary: "Created a diversified portfolio with equities, bonds, and gold."
 """
 
-    return call_gpt(system_prompt, prompt)
+    # A summary depends only on the command and its result
+    return {"system_prompt": system_prompt, "user_prompt": prompt, "cache_ttl": 86400}